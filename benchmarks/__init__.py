@@ -0,0 +1,2 @@
+# benchmarks/__init__.py
+# Performance suite for stego_tool, run with `python -m benchmarks.run`.
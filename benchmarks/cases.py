@@ -0,0 +1,206 @@
+# benchmarks/cases.py
+import io
+import os
+from collections import namedtuple
+from contextlib import contextmanager, redirect_stdout
+
+import cv2
+
+from stego_tool.audio_stego import AudioStego
+from stego_tool.image_stego import ImageStego
+from stego_tool.scan import probe
+from stego_tool.video_stego import VideoStego
+
+# A case times one public encode/decode path end to end with `run`; the
+# per-stage breakdown comes from the backends' own metrics events. `nbytes`
+# is the size of the decoded cover, used for MB/s. When `expected` is set, the
+# result of `run` must equal it, so a fast but broken path never passes.
+Case = namedtuple('Case', 'run nbytes expected')
+
+# The in-memory video cases hold decoded frames in a list, so they only use
+# the start of the cover to keep 4K runs within memory.
+MEMORY_FRAMES = 64
+
+
+@contextmanager
+def quiet():
+    """Silence the progress output of the file-based backend functions."""
+    with open(os.devnull, 'w') as devnull, redirect_stdout(devnull):
+        yield
+
+
+def _out(env, name):
+    return os.path.join(env.workdir, name)
+
+
+def _read(path):
+    with open(path, 'rb') as f:
+        return f.read()
+
+
+def _file_cases(backend, modality, extension):
+    """Encode/decode cases for the file API of one backend, legacy and compact."""
+    encode = getattr(backend, f'encode_{modality}')
+    decode = getattr(backend, f'decode_{modality}')
+
+    def make_encode(compact):
+        def case(env):
+            output = _out(env, f'{modality}_{"compact" if compact else "legacy"}{extension}')
+            cover, payload = getattr(env, modality), _payload(env, modality)
+
+            def run():
+                with quiet():
+                    return encode(cover, payload, output, env.key, compact=compact)
+
+            return Case(run, getattr(env, f'{modality}_bytes'), None)
+        return case
+
+    def make_decode(compact):
+        def case(env):
+            path = make_encode(compact)(env).run()
+
+            def run():
+                with quiet():
+                    return decode(path, env.key)
+
+            return Case(run, getattr(env, f'{modality}_bytes'), _payload(env, modality))
+        return case
+
+    def scan_case(env):
+        # The probe reads only the header region, so MB/s is relative to the whole cover
+        path = make_encode(True)(env).run()
+        return Case(lambda: probe(path)['hit'], getattr(env, f'{modality}_bytes'), True)
+
+    return {
+        f'{modality}.encode.legacy': make_encode(False),
+        f'{modality}.decode.legacy': make_decode(False),
+        f'{modality}.encode.compact': make_encode(True),
+        f'{modality}.decode.compact': make_decode(True),
+        f'{modality}.scan': scan_case,
+    }
+
+
+# The smooth synthetic image cover has few usable DCT coefficients, so the
+# JPEG cases hide only the start of the payload.
+JPEG_PAYLOAD = 1024
+
+
+def _jpeg_cases():
+    """Encode/decode cases for JPEG outputs, which embed in DCT coefficients."""
+    def encode_case(env):
+        output = _out(env, 'image_dct.jpg')
+
+        def run():
+            with quiet():
+                return ImageStego.encode_image(env.image, env.payload[:JPEG_PAYLOAD], output, env.key)
+
+        return Case(run, env.image_bytes, None)
+
+    def decode_case(env):
+        path = encode_case(env).run()
+
+        def run():
+            with quiet():
+                return ImageStego.decode_image(path, env.key)
+
+        return Case(run, env.image_bytes, env.payload[:JPEG_PAYLOAD])
+
+    return {'image.encode.jpeg': encode_case, 'image.decode.jpeg': decode_case}
+
+
+def _payload(env, modality):
+    return env.video_payload if modality == 'video' else env.payload
+
+
+def _bytes_cases(backend, modality):
+    """Cases for the in-memory bytes API of the image and audio backends."""
+    def encode_case(env):
+        data = _read(getattr(env, modality))
+        return Case(lambda: backend.encode_bytes(data, env.payload, env.key),
+                    getattr(env, f'{modality}_bytes'), None)
+
+    def decode_case(env):
+        data = encode_case(env).run()
+        return Case(lambda: backend.decode_bytes(data, env.key).decode(),
+                    getattr(env, f'{modality}_bytes'), env.payload)
+
+    return {
+        f'{modality}.encode_bytes': encode_case,
+        f'{modality}.decode_bytes': decode_case,
+    }
+
+
+def _memory_frames(env):
+    """The first MEMORY_FRAMES frames of the video cover, decoded into a list."""
+    cap = cv2.VideoCapture(env.video)
+    frames = []
+    while len(frames) < MEMORY_FRAMES:
+        ret, frame = cap.read()
+        if not ret:
+            break
+        frames.append(frame)
+    cap.release()
+    return frames
+
+
+def _memory_bytes(env):
+    return env.video_width * env.video_height * 3 * min(env.video_frames, MEMORY_FRAMES)
+
+
+def video_encode_frames(env):
+    frames = _memory_frames(env)
+    return Case(lambda: sum(1 for _ in VideoStego.encode_frames(frames, env.video_payload, env.key)),
+                _memory_bytes(env), None)
+
+
+def video_decode_frames(env):
+    frames = list(VideoStego.encode_frames(_memory_frames(env), env.video_payload, env.key))
+    return Case(lambda: VideoStego.decode_frames(frames, env.key).decode(),
+                _memory_bytes(env), env.video_payload)
+
+
+# The bundled sample clip, an XVID-compressed recording whose block diffs
+# drift with the scene; the synthetic cover is far easier to read back.
+SAMPLE_VIDEO = os.path.join(os.path.dirname(__file__), '..', 'video', 'test03.mp4')
+SAMPLE_PAYLOAD = b'The quick brown fox jumps over the lazy dog, twice!!'
+
+
+def _sample_cases():
+    """Round trips through the sample clip, checking the calibrated decode on real footage."""
+    def make_case(compression):
+        def case(env):
+            output = _out(env, f'sample_{compression or "compact"}.avi')
+            payload = SAMPLE_PAYLOAD * (3 if compression else 1)
+            cap = cv2.VideoCapture(SAMPLE_VIDEO)
+            nbytes = int(cap.get(cv2.CAP_PROP_FRAME_WIDTH) * cap.get(cv2.CAP_PROP_FRAME_HEIGHT)
+                         * cap.get(cv2.CAP_PROP_FRAME_COUNT)) * 3
+            cap.release()
+
+            def run():
+                with quiet():
+                    VideoStego.encode_video(SAMPLE_VIDEO, payload, output, compact=True,
+                                            compression=compression)
+                decoded = io.BytesIO()
+                VideoStego.decode_to_file(output, decoded)
+                return decoded.getvalue()
+
+            return Case(run, nbytes, payload)
+        return case
+
+    return {
+        'video.roundtrip.sample.compact': make_case(None),
+        'video.roundtrip.sample.zlib': make_case('zlib'),
+    }
+
+
+CASES = {
+    **_file_cases(ImageStego, 'image', '.png'),
+    **_bytes_cases(ImageStego, 'image'),
+    **_jpeg_cases(),
+    **_file_cases(AudioStego, 'audio', '.wav'),
+    **_bytes_cases(AudioStego, 'audio'),
+    **_file_cases(VideoStego, 'video', '.avi'),
+    'video.encode_frames': video_encode_frames,
+    'video.decode_frames': video_decode_frames,
+    **_sample_cases(),
+}
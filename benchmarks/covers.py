@@ -0,0 +1,75 @@
+# benchmarks/covers.py
+import os
+import wave
+
+import cv2
+import numpy as np
+from PIL import Image
+
+# Synthetic covers with smooth gradients plus sensor-like noise, so they
+# compress and decode like photos, recordings and footage rather than like
+# flat colour. Covers are cached in the work directory by size and reused
+# across runs.
+
+SEED = 1234
+
+
+def image_cover(workdir, width, height):
+    """Create (or reuse) a width x height RGB PNG cover and return its path."""
+    path = os.path.join(workdir, f'image_{width}x{height}.png')
+    if os.path.exists(path):
+        return path
+    rng = np.random.default_rng(SEED)
+    pixels = np.empty((height, width, 3), dtype=np.uint8)
+    x = np.linspace(0, 255, width, dtype=np.float32)
+    # Build the image in bands of rows to keep memory flat for large covers
+    for top in range(0, height, 512):
+        rows = min(512, height - top)
+        y = np.linspace(top, top + rows - 1, rows, dtype=np.float32)[:, None] * 255 / max(height - 1, 1)
+        noise = rng.integers(-8, 9, (rows, width, 3), dtype=np.int16)
+        band = np.stack([x[None, :] + 0 * y, y + 0 * x[None, :], (x[None, :] + y) / 2], axis=-1)
+        pixels[top:top + rows] = np.clip(band + noise, 0, 255).astype(np.uint8)
+    Image.fromarray(pixels).save(path)
+    return path
+
+
+def audio_cover(workdir, seconds, frame_rate=44100, channels=2):
+    """Create (or reuse) a 16-bit PCM WAV cover of the given duration and return its path."""
+    path = os.path.join(workdir, f'audio_{seconds}s_{frame_rate}hz_{channels}ch.wav')
+    if os.path.exists(path):
+        return path
+    rng = np.random.default_rng(SEED)
+    with wave.open(path, 'wb') as out:
+        out.setnchannels(channels)
+        out.setsampwidth(2)
+        out.setframerate(frame_rate)
+        # One second at a time, so hours-long covers never sit in memory
+        for second in range(seconds):
+            t = np.arange(frame_rate, dtype=np.float64) / frame_rate + second
+            tone = 6000 * np.sin(2 * np.pi * 220 * t) + 3000 * np.sin(2 * np.pi * 331 * t)
+            samples = tone[:, None] + rng.normal(0, 300, (frame_rate, channels))
+            out.writeframes(np.clip(samples, -32768, 32767).astype('<i2').tobytes())
+    return path
+
+
+def video_cover(workdir, width, height, frames, fps=30):
+    """Create (or reuse) an MJPG AVI cover and return its path."""
+    path = os.path.join(workdir, f'video_{width}x{height}_{frames}f.avi')
+    if os.path.exists(path):
+        return path
+    rng = np.random.default_rng(SEED)
+    writer = cv2.VideoWriter(path, cv2.VideoWriter_fourcc(*'MJPG'), fps, (width, height))
+    if not writer.isOpened():
+        raise RuntimeError(f"OpenCV cannot write {path}")
+    x = np.linspace(0, 160, width, dtype=np.float32)[None, :]
+    y = np.linspace(0, 60, height, dtype=np.float32)[:, None]
+    for index in range(frames):
+        # A slowly panning, low-saturation gradient so consecutive frames differ.
+        # The block-shift scheme reads red minus blue, so strongly tinted
+        # synthetic content would measure a path real footage never takes.
+        luma = 40 + (x + index * 2) % 160 + y
+        frame = np.repeat(luma[:, :, None], 3, axis=2)
+        frame += rng.integers(-6, 7, frame.shape).astype(np.float32)
+        writer.write(np.clip(frame, 0, 255).astype(np.uint8))
+    writer.release()
+    return path
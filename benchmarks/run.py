@@ -0,0 +1,242 @@
+# benchmarks/run.py
+import base64
+import json
+import multiprocessing
+import os
+import platform
+import subprocess
+import sys
+import tempfile
+import time
+import warnings
+from concurrent.futures import ProcessPoolExecutor
+from types import SimpleNamespace
+
+import click
+from cryptography.fernet import Fernet
+
+try:
+    import resource
+except ImportError:  # not available on Windows
+    resource = None
+
+# pydub warns about a missing ffmpeg on import; the WAV covers do not need it
+warnings.filterwarnings('ignore', message="Couldn't find ffmpeg", category=RuntimeWarning)
+
+REPO_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+# Cover sizes per preset. Payload sizes are in bytes; the video payload is
+# smaller because the block-shift scheme carries far fewer bits per frame.
+PRESETS = {
+    'quick': dict(image=(1280, 800), audio_seconds=60, video=(640, 360), frames=60,
+                  payload_size=4096, video_payload_size=48),
+    'standard': dict(image=(4000, 3000), audio_seconds=600, video=(1920, 1080), frames=120,
+                     payload_size=16384, video_payload_size=256),
+    'large': dict(image=(8000, 6000), audio_seconds=3600, video=(3840, 2160), frames=240,
+                  payload_size=65536, video_payload_size=1024),
+}
+
+# Importing the CLI must not pull these in (see the lazy imports in stego_tool/cli.py)
+HEAVY_MODULES = ('cv2', 'numpy', 'pydub', 'PIL', 'cryptography')
+
+STARTUP_CODE = (
+    "import sys, time\n"
+    "started = time.perf_counter()\n"
+    "import stego_tool.cli\n"
+    "print(time.perf_counter() - started)\n"
+    "print(','.join(name for name in {heavy!r} if name in sys.modules))\n"
+)
+
+
+def _peak_rss_mb():
+    """Peak resident set size of this process in MiB, or None if unknown."""
+    if resource is None:
+        return None
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # ru_maxrss is in KiB on Linux and in bytes on macOS
+    return round(peak / (1 << 20 if sys.platform == 'darwin' else 1 << 10), 1)
+
+
+def _payload(size):
+    """Random printable text payload of `size` characters."""
+    return base64.b64encode(os.urandom(size))[:size].decode('ascii')
+
+
+def _measure(name, env, repeat):
+    """Run one case in a fresh worker process and return its result record."""
+    from stego_tool import metrics
+    from .cases import CASES
+
+    try:
+        case = CASES[name](env)
+        best = None
+        timings = []
+        for _ in range(repeat):
+            registry = metrics.add_sink(metrics.CounterRegistry())
+            try:
+                started = time.perf_counter()
+                result = case.run()
+                timings.append(time.perf_counter() - started)
+            finally:
+                metrics.remove_sink(registry)
+            if best is None or timings[-1] <= min(timings):
+                best = registry
+    except Exception as e:
+        return {'ok': False, 'error': f"{type(e).__name__}: {e}", 'peak_rss_mb': _peak_rss_mb()}
+    seconds = min(timings)
+    record = {
+        'ok': case.expected is None or result == case.expected,
+        'seconds': round(seconds, 6),
+        'mean_seconds': round(sum(timings) / len(timings), 6),
+        'mb_per_s': round(case.nbytes / seconds / 1e6, 2),
+        'cover_mb': round(case.nbytes / 1e6, 2),
+        'peak_rss_mb': _peak_rss_mb(),
+        # Stage times of the fastest run, as reported by the backends
+        'stages': {row[2]: round(row[4], 6) for row in best.summary() if row[2] != 'total'},
+    }
+    if not record['ok']:
+        record['error'] = 'decoded payload does not match the encoded one'
+    return record
+
+
+def _measure_startup(repeat):
+    """Time `import stego_tool.cli` in fresh interpreters."""
+    code = STARTUP_CODE.format(heavy=HEAVY_MODULES)
+    timings = []
+    for _ in range(repeat):
+        output = subprocess.run([sys.executable, '-c', code], cwd=REPO_ROOT, check=True,
+                                capture_output=True, text=True).stdout.split('\n')
+        timings.append(float(output[0]))
+    heavy = [name for name in output[1].split(',') if name]
+    record = {'ok': not heavy, 'seconds': round(min(timings), 6), 'stages': {}}
+    if heavy:
+        record['error'] = f"importing the CLI loads {', '.join(heavy)}"
+    return record
+
+
+def compare(results, baseline, tolerance):
+    """List the cases whose time or peak RSS exceeds the baseline by more than `tolerance`."""
+    regressions = []
+    for name, current in results['cases'].items():
+        previous = baseline.get('cases', {}).get(name)
+        if not previous or not previous.get('ok') or not current.get('ok'):
+            continue
+        for metric in ('seconds', 'peak_rss_mb'):
+            old, new = previous.get(metric), current.get(metric)
+            if old and new and new > old * (1 + tolerance):
+                regressions.append(f"{name}: {metric} {old} -> {new} (+{(new / old - 1) * 100:.0f}%)")
+    return regressions
+
+
+def _size(value):
+    width, _, height = value.lower().partition('x')
+    return int(width), int(height)
+
+
+@click.command()
+@click.option('--preset', type=click.Choice(list(PRESETS)), default='quick', show_default=True,
+              help='Cover sizes to generate')
+@click.option('--image', 'image_size', help='Image cover size as WIDTHxHEIGHT (overrides the preset)')
+@click.option('--audio-seconds', type=int, help='Audio cover duration (overrides the preset)')
+@click.option('--video', 'video_size', help='Video cover size as WIDTHxHEIGHT (overrides the preset)')
+@click.option('--frames', type=int, help='Video cover length in frames (overrides the preset)')
+@click.option('--payload-size', type=int, help='Image/audio payload size in bytes')
+@click.option('--video-payload-size', type=int, help='Video payload size in bytes')
+@click.option('--cases', 'selected', help='Comma-separated case name prefixes, e.g. "image,video.decode"')
+@click.option('--repeat', type=int, default=3, show_default=True, help='Timed runs per case (the fastest counts)')
+@click.option('--workdir', type=click.Path(file_okay=False), help='Where covers and outputs are kept')
+@click.option('--output', '-o', type=click.Path(dir_okay=False), help='Write the JSON report here (default: stdout)')
+@click.option('--baseline', '-b', type=click.Path(exists=True, dir_okay=False),
+              help='Previous JSON report to compare against')
+@click.option('--tolerance', type=float, default=0.10, show_default=True,
+              help='Allowed slowdown/RSS growth relative to the baseline (0.10 = 10%)')
+def main(preset, image_size, audio_seconds, video_size, frames, payload_size, video_payload_size,
+         selected, repeat, workdir, output, baseline, tolerance):
+    """Benchmark every encode/decode path on synthetic covers."""
+    from .cases import CASES
+    from .covers import audio_cover, image_cover, video_cover
+
+    config = dict(PRESETS[preset])
+    if image_size:
+        config['image'] = _size(image_size)
+    if video_size:
+        config['video'] = _size(video_size)
+    for name, value in (('audio_seconds', audio_seconds), ('frames', frames),
+                        ('payload_size', payload_size), ('video_payload_size', video_payload_size)):
+        if value is not None:
+            config[name] = value
+
+    names = ['startup'] + list(CASES)
+    if selected:
+        prefixes = [prefix.strip() for prefix in selected.split(',') if prefix.strip()]
+        names = [name for name in names if name.startswith(tuple(prefixes))]
+    modalities = {name.split('.')[0] for name in names}
+
+    workdir = workdir or os.path.join(tempfile.gettempdir(), 'stego-bench')
+    os.makedirs(workdir, exist_ok=True)
+    env = SimpleNamespace(workdir=workdir, key=Fernet.generate_key(),
+                          payload=_payload(config['payload_size']),
+                          video_payload=_payload(config['video_payload_size']))
+    click.echo("Preparing covers...", err=True)
+    if 'image' in modalities:
+        width, height = config['image']
+        env.image = image_cover(workdir, width, height)
+        env.image_bytes = width * height * 3
+    if 'audio' in modalities:
+        env.audio = audio_cover(workdir, config['audio_seconds'])
+        env.audio_bytes = config['audio_seconds'] * 44100 * 2 * 2
+    if 'video' in modalities:
+        env.video_width, env.video_height = config['video']
+        env.video_frames = config['frames']
+        env.video = video_cover(workdir, env.video_width, env.video_height, env.video_frames)
+        env.video_bytes = env.video_width * env.video_height * 3 * env.video_frames
+
+    results = {
+        'meta': {
+            'preset': preset,
+            'config': {name: list(value) if isinstance(value, tuple) else value
+                       for name, value in config.items()},
+            'repeat': repeat,
+            'python': platform.python_version(),
+            'platform': platform.platform(),
+            'cpu_count': os.cpu_count(),
+            'timestamp': time.strftime('%Y-%m-%dT%H:%M:%S'),
+        },
+        'cases': {},
+    }
+    # Every case gets a fresh spawned process so peak RSS belongs to that case alone
+    context = multiprocessing.get_context('spawn')
+    for name in names:
+        click.echo(f"  {name}...", err=True, nl=False)
+        if name == 'startup':
+            record = _measure_startup(max(repeat, 5))
+        else:
+            with ProcessPoolExecutor(max_workers=1, mp_context=context) as pool:
+                record = pool.submit(_measure, name, env, repeat).result()
+        results['cases'][name] = record
+        if record['ok']:
+            click.echo(f" {record['seconds']:.3f} s" +
+                       (f", {record['mb_per_s']} MB/s" if 'mb_per_s' in record else ''), err=True)
+        else:
+            click.echo(f" FAILED: {record['error']}", err=True)
+
+    report = json.dumps(results, indent=2)
+    if output:
+        with open(output, 'w') as f:
+            f.write(report + '\n')
+    else:
+        click.echo(report)
+
+    failed = [name for name, record in results['cases'].items() if not record['ok']]
+    regressions = []
+    if baseline:
+        with open(baseline) as f:
+            regressions = compare(results, json.load(f), tolerance)
+    for line in regressions:
+        click.echo(f"Regression: {line}", err=True)
+    if failed or regressions:
+        sys.exit(1)
+
+
+if __name__ == '__main__':
+    main()
@@ -3,18 +3,31 @@ from tkinter import ttk, filedialog, messagebox
 from stego_tool.image_stego import ImageStego
 from stego_tool.audio_stego import AudioStego
 from stego_tool.video_stego import VideoStego
+from stego_tool.progress import OperationCancelled, Progress, tracking
 from cryptography.fernet import Fernet
+from concurrent.futures import ThreadPoolExecutor
 import logging
-import cv2
+import queue
 import base64
 
+POLL_INTERVAL_MS = 50  # how often the Tk thread picks up worker events
+
 class StegoGUI:
     def __init__(self, root):
         self.root = root
         self.root.title('Steganography Tool')
+        # Encoding and decoding run on worker threads so the window never
+        # freezes. Workers hand progress and results back to the Tk thread
+        # through a queue, since Tk widgets may only be touched from there.
+        self.executor = ThreadPoolExecutor(max_workers=3)  # one operation per tab
+        self.events = queue.Queue()
+        self.jobs = {}  # tab name -> Progress of its running operation
+        self.progress_widgets = {}
         self.create_widgets()
         self.setup_logging()
         self.encryption_key = None
+        self.root.protocol('WM_DELETE_WINDOW', self.on_close)
+        self.root.after(POLL_INTERVAL_MS, self.process_events)
 
     def setup_logging(self):
         logging.basicConfig(
@@ -52,10 +65,10 @@ class StegoGUI:
         tab_control.add(self.audio_tab, text='Audio')
         self.create_audio_tab()
 
-        # # Video tab
-        # self.video_tab = ttk.Frame(tab_control)
-        # tab_control.add(self.video_tab, text='Video')
-        # self.create_video_tab()
+        # Video tab
+        self.video_tab = ttk.Frame(tab_control)
+        tab_control.add(self.video_tab, text='Video')
+        self.create_video_tab()
 
         tab_control.pack(expand=1, fill='both')
 
@@ -92,6 +105,7 @@ class StegoGUI:
         # Encode and Decode buttons
         ttk.Button(self.image_tab, text='Encode', command=self.encode_image).pack()
         ttk.Button(self.image_tab, text='Decode', command=self.decode_image).pack()
+        self.create_progress_widgets(self.image_tab, 'image')
 
     def on_key_change(self, string_var, tab_name):
         """Validates the key whenever it changes"""
@@ -121,12 +135,12 @@ class StegoGUI:
             messagebox.showerror("Error", f"Key generation failed: {str(e)}")
 
     def select_image_input(self):
-        file_path = filedialog.askopenfilename(filetypes=[('Image Files', '*.png;*.jpg;*.jpeg;*.bmp;*.tiff')])
+        file_path = filedialog.askopenfilename(filetypes=[('Image Files', '*.png;*.apng;*.jpg;*.jpeg;*.bmp;*.tif;*.tiff;*.gif')])
         if file_path:
             self.image_input_path.set(file_path)
 
     def select_image_output(self):
-        file_path = filedialog.asksaveasfilename(defaultextension='.png', filetypes=[('PNG Files', '*.png')])
+        file_path = filedialog.asksaveasfilename(defaultextension='.png', filetypes=[('PNG Files', '*.png'), ('JPEG Files', '*.jpg;*.jpeg'), ('GIF Files', '*.gif'), ('TIFF Files', '*.tif;*.tiff')])
         if file_path:
             self.image_output_path.set(file_path)
 
@@ -142,13 +156,9 @@ class StegoGUI:
             return
         
         if input_path and output_path and secret_data:
-            try:
-                ImageStego.encode_image(input_path, secret_data, output_path, key)
-                messagebox.showinfo('Success', f'Data encoded and saved to {output_path}')
-                self.clear_image_fields()
-            except Exception as e:
-                logging.error("Image encoding failed: %s", str(e))
-                messagebox.showerror('Error', f'Encoding failed: {str(e)}')
+            self.run_in_background('image', 'Image encoding', ImageStego.encode_image,
+                                   (input_path, secret_data, output_path, key),
+                                   lambda saved_path: self.on_encoded(saved_path, self.clear_image_fields))
         else:
             messagebox.showwarning('Warning', 'Please fill all fields')
 
@@ -162,13 +172,8 @@ class StegoGUI:
             return
             
         if input_path:
-            try:
-                secret_data = ImageStego.decode_image(input_path, key)
-                messagebox.showinfo('Decoded Data', f'Decoded data: {secret_data}')
-                self.clear_image_fields()
-            except Exception as e:
-                logging.error("Image decoding failed: %s", str(e))
-                messagebox.showerror('Error', f'Decoding failed: {str(e)}')
+            self.run_in_background('image', 'Image decoding', ImageStego.decode_image, (input_path, key),
+                                   lambda secret_data: self.on_decoded(secret_data, self.clear_image_fields))
         else:
             messagebox.showwarning('Warning', 'Please select an input file')
 
@@ -211,6 +216,7 @@ class StegoGUI:
         # Encode and Decode buttons
         ttk.Button(self.audio_tab, text='Encode', command=self.encode_audio).pack()
         ttk.Button(self.audio_tab, text='Decode', command=self.decode_audio).pack()
+        self.create_progress_widgets(self.audio_tab, 'audio')
 
     def generate_audio_key(self):
         try:
@@ -242,13 +248,9 @@ class StegoGUI:
             return
         
         if input_path and output_path and secret_data:
-            try:
-                AudioStego.encode_audio(input_path, secret_data, output_path, key)
-                messagebox.showinfo('Success', f'Data encoded and saved to {output_path}')
-                self.clear_audio_fields()
-            except Exception as e:
-                logging.error("Audio encoding failed: %s", str(e))
-                messagebox.showerror('Error', f'Encoding failed: {str(e)}')
+            self.run_in_background('audio', 'Audio encoding', AudioStego.encode_audio,
+                                   (input_path, secret_data, output_path, key),
+                                   lambda saved_path: self.on_encoded(saved_path, self.clear_audio_fields))
         else:
             messagebox.showwarning('Warning', 'Please fill all fields')
 
@@ -262,13 +264,8 @@ class StegoGUI:
             return
             
         if input_path:
-            try:
-                secret_data = AudioStego.decode_audio(input_path, key)
-                messagebox.showinfo('Decoded Data', f'Decoded data: {secret_data}')
-                self.clear_audio_fields()
-            except Exception as e:
-                logging.error("Audio decoding failed: %s", str(e))
-                messagebox.showerror('Error', f'Decoding failed: {str(e)}')
+            self.run_in_background('audio', 'Audio decoding', AudioStego.decode_audio, (input_path, key),
+                                   lambda secret_data: self.on_decoded(secret_data, self.clear_audio_fields))
         else:
             messagebox.showwarning('Warning', 'Please select an input file')
 
@@ -278,149 +275,209 @@ class StegoGUI:
         self.audio_secret_data.set('')
         # Don't clear the key
 
-    # def create_video_tab(self):
-    #     ttk.Label(self.video_tab, text='Video Encoding/Decoding').pack()
+    def create_video_tab(self):
+        ttk.Label(self.video_tab, text='Video Encoding/Decoding').pack()
         
-    #     # Encryption Section
-    #     ttk.Label(self.video_tab, text='Encryption Key:').pack()
-    #     self.video_key_var = tk.StringVar()
-    #     self.video_key_var.trace("w", lambda name, index, mode, sv=self.video_key_var: self.on_key_change(sv, "video"))
-    #     ttk.Entry(self.video_tab, textvariable=self.video_key_var, width=50).pack()
-    #     ttk.Button(self.video_tab, text='Generate Key', command=self.generate_video_key).pack()
-    #     self.video_key_status = ttk.Label(self.video_tab, text="")
-    #     self.video_key_status.pack()
-
-    #     # Input file selection
-    #     ttk.Label(self.video_tab, text='Select Input Video:').pack()
-    #     self.video_input_path = tk.StringVar()
-    #     ttk.Entry(self.video_tab, textvariable=self.video_input_path, width=50).pack()
-    #     ttk.Button(self.video_tab, text='Browse', command=self.select_video_input).pack()
-
-    #     # Output file selection
-    #     ttk.Label(self.video_tab, text='Select Output Video:').pack()
-    #     self.video_output_path = tk.StringVar()
-    #     ttk.Entry(self.video_tab, textvariable=self.video_output_path, width=50).pack()
-    #     ttk.Button(self.video_tab, text='Browse', command=self.select_video_output).pack()
-
-    #     # Secret message entry
-    #     ttk.Label(self.video_tab, text='Enter Secret Message:').pack()
-    #     self.video_secret_data = tk.StringVar()
-    #     ttk.Entry(self.video_tab, textvariable=self.video_secret_data, width=50).pack()
-
-    #     # Encode and Decode buttons
-    #     ttk.Button(self.video_tab, text='Encode', command=self.encode_video).pack()
-    #     ttk.Button(self.video_tab, text='Decode', command=self.decode_video).pack()
-
-    # def select_video_input(self):
-    #     file_path = filedialog.askopenfilename(filetypes=[('Video Files', '*.mp4;*.avi')])
-    #     if file_path:
-    #         self.video_input_path.set(file_path)
-
-    # def select_video_output(self):
-    #     file_path = filedialog.asksaveasfilename(defaultextension='.mp4', filetypes=[('MP4 Files', '*.mp4')])
-    #     if file_path:
-    #         self.video_output_path.set(file_path)
-
-    # def generate_video_key(self):
-    #     try:
-    #         key = VideoStego.generate_key().decode()
-    #         self.video_key_var.set(key)
-    #         messagebox.showinfo("Success", "New encryption key generated and set!")
-    #     except Exception as e:
-    #         messagebox.showerror("Error", f"Key generation failed: {str(e)}")
-
-    # def check_video_duration(self, video_path):
-    #     try:
-    #         cap = cv2.VideoCapture(video_path)
-    #         if not cap.isOpened():
-    #             messagebox.showerror('Error', f"Could not open video file {video_path}")
-    #             return False
-                
-    #         # Get video properties
-    #         fps = cap.get(cv2.CAP_PROP_FPS)
-    #         frame_count = int(cap.get(cv2.CAP_PROP_FRAME_COUNT))
-            
-    #         # Calculate duration in seconds
-    #         duration = frame_count / fps if fps > 0 else 0
-            
-    #         # Release the capture object
-    #         cap.release()
-            
-    #         # Check if video exceeds 11 seconds
-    #         if duration >= 10.7:
-    #             messagebox.showerror('Error', 
-    #                                  f"Video is too long ({duration:.2f} seconds). " +
-    #                                  "Please use a video shorter than 11 seconds.")
-    #             return False
-                
-    #         return True
-    #     except Exception as e:
-    #         messagebox.showerror('Error', f"Error checking video duration: {str(e)}")
-    #         return False
-
-    # def encode_video(self):
-    #     input_path = self.video_input_path.get()
-    #     output_path = self.video_output_path.get()
-    #     secret_data = self.video_secret_data.get()
-    #     key = self.video_key_var.get() if self.video_key_var.get() else None
+        # Encryption Section
+        ttk.Label(self.video_tab, text='Encryption Key:').pack()
+        self.video_key_var = tk.StringVar()
+        self.video_key_var.trace("w", lambda name, index, mode, sv=self.video_key_var: self.on_key_change(sv, "video"))
+        ttk.Entry(self.video_tab, textvariable=self.video_key_var, width=50).pack()
+        ttk.Button(self.video_tab, text='Generate Key', command=self.generate_video_key).pack()
+        self.video_key_status = ttk.Label(self.video_tab, text="")
+        self.video_key_status.pack()
+
+        # Input file selection
+        ttk.Label(self.video_tab, text='Select Input Video:').pack()
+        self.video_input_path = tk.StringVar()
+        ttk.Entry(self.video_tab, textvariable=self.video_input_path, width=50).pack()
+        ttk.Button(self.video_tab, text='Browse', command=self.select_video_input).pack()
+
+        # Output file selection
+        ttk.Label(self.video_tab, text='Select Output Video:').pack()
+        self.video_output_path = tk.StringVar()
+        ttk.Entry(self.video_tab, textvariable=self.video_output_path, width=50).pack()
+        ttk.Button(self.video_tab, text='Browse', command=self.select_video_output).pack()
+
+        # Secret message entry
+        ttk.Label(self.video_tab, text='Enter Secret Message:').pack()
+        self.video_secret_data = tk.StringVar()
+        ttk.Entry(self.video_tab, textvariable=self.video_secret_data, width=50).pack()
+
+        # Encode and Decode buttons
+        ttk.Button(self.video_tab, text='Encode', command=self.encode_video).pack()
+        ttk.Button(self.video_tab, text='Decode', command=self.decode_video).pack()
+        self.create_progress_widgets(self.video_tab, 'video')
+
+    def select_video_input(self):
+        file_path = filedialog.askopenfilename(filetypes=[('Video Files', '*.mp4;*.avi;*.mkv')])
+        if file_path:
+            self.video_input_path.set(file_path)
+
+    def select_video_output(self):
+        file_path = filedialog.asksaveasfilename(defaultextension='.mp4', filetypes=[('MP4 Files', '*.mp4')])
+        if file_path:
+            self.video_output_path.set(file_path)
+
+    def generate_video_key(self):
+        try:
+            key = VideoStego.generate_key().decode()
+            self.video_key_var.set(key)
+            messagebox.showinfo("Success", "New encryption key generated and set!")
+        except Exception as e:
+            messagebox.showerror("Error", f"Key generation failed: {str(e)}")
+
+    def encode_video(self):
+        input_path = self.video_input_path.get()
+        output_path = self.video_output_path.get()
+        secret_data = self.video_secret_data.get()
+        key = self.video_key_var.get() if self.video_key_var.get() else None
         
-    #     # Validate key if provided
-    #     if key and not self.validate_fernet_key(key):
-    #         messagebox.showerror('Error', 'Please enter a valid Fernet encryption key')
-    #         return
-            
-    #     if not all([input_path, output_path, secret_data]):
-    #         messagebox.showwarning('Warning', 'Please fill all required fields')
-    #         return
+        # Validate key if provided
+        if key and not self.validate_fernet_key(key):
+            messagebox.showerror('Error', 'Please enter a valid Fernet encryption key')
+            return
             
-    #     # Check video duration before encoding
-    #     if not self.check_video_duration(input_path):
-    #         return
+        if not all([input_path, output_path, secret_data]):
+            messagebox.showwarning('Warning', 'Please fill all required fields')
+            return
 
-    #     try:
-    #         # Use the static method directly
-    #         VideoStego.encode_video(input_path, secret_data, output_path, key)
-            
-    #         messagebox.showinfo('Success', f'Data encoded and saved to {output_path}')
-    #         self.clear_video_fields()
-            
-    #     except Exception as e:
-    #         logging.error("Encoding failed: %s", str(e))
-    #         messagebox.showerror('Error', f'Encoding failed: {str(e)}')
+        # Long videos no longer need a duration limit: the work runs in the
+        # background and can be cancelled
+        self.run_in_background('video', 'Video encoding', VideoStego.encode_video,
+                               (input_path, secret_data, output_path, key),
+                               lambda saved_path: self.on_encoded(saved_path, self.clear_video_fields))
 
-    # def decode_video(self):
-    #     input_path = self.video_input_path.get()
-    #     key = self.video_key_var.get() if self.video_key_var.get() else None
+    def decode_video(self):
+        input_path = self.video_input_path.get()
+        key = self.video_key_var.get() if self.video_key_var.get() else None
         
-    #     # Validate key if provided
-    #     if key and not self.validate_fernet_key(key):
-    #         messagebox.showerror('Error', 'Please enter a valid Fernet encryption key')
-    #         return
+        # Validate key if provided
+        if key and not self.validate_fernet_key(key):
+            messagebox.showerror('Error', 'Please enter a valid Fernet encryption key')
+            return
             
-    #     if not input_path:
-    #         messagebox.showwarning('Warning', 'Please select an input file')
-    #         return
+        if not input_path:
+            messagebox.showwarning('Warning', 'Please select an input file')
+            return
 
-    #     try:
-    #         # Use the static method directly
-    #         secret_data = VideoStego.decode_video(input_path, key)
-            
-    #         if secret_data:
-    #             messagebox.showinfo('Decoded Data', f'Decoded data: {secret_data}')
-    #         else:
-    #             messagebox.showinfo('Decoded Data', 'No hidden message found or decryption failed')
-                
-    #         self.clear_video_fields()
-            
-    #     except Exception as e:
-    #         logging.error("Decoding failed: %s", str(e))
-    #         messagebox.showerror('Error', f'Decoding failed: {str(e)}')
-
-    # def clear_video_fields(self):
-    #     self.video_input_path.set('')
-    #     self.video_output_path.set('')
-    #     self.video_secret_data.set('')
-    #     # Don't clear the encryption key
+        self.run_in_background('video', 'Video decoding', VideoStego.decode_video, (input_path, key),
+                               lambda secret_data: self.on_decoded(secret_data, self.clear_video_fields))
+
+    def clear_video_fields(self):
+        self.video_input_path.set('')
+        self.video_output_path.set('')
+        self.video_secret_data.set('')
+        # Don't clear the encryption key
+
+    def create_progress_widgets(self, tab, tab_name):
+        """Progress bar, status line and Cancel button shown under a tab's actions."""
+        bar = ttk.Progressbar(tab, length=300)
+        bar.pack()
+        status = ttk.Label(tab, text='')
+        status.pack()
+        cancel = ttk.Button(tab, text='Cancel', state='disabled', command=lambda: self.cancel_operation(tab_name))
+        cancel.pack()
+        self.progress_widgets[tab_name] = (tab, bar, status, cancel)
+
+    def run_in_background(self, tab_name, title, func, args, on_success):
+        """Run a backend call on the worker pool; `on_success` gets its result on the Tk thread."""
+        if tab_name in self.jobs:
+            return
+        progress = Progress(lambda stage, done, total: self.events.put(('progress', tab_name, stage, done, total)))
+        self.jobs[tab_name] = progress
+        self.set_busy(tab_name, True)
+
+        def work():
+            with tracking(progress):
+                return func(*args)
+
+        future = self.executor.submit(work)
+        future.add_done_callback(lambda done: self.events.put(('done', tab_name, title, done, on_success)))
+
+    def set_busy(self, tab_name, busy):
+        """Disable a tab's buttons (except Cancel) while its operation runs."""
+        tab, bar, status, cancel = self.progress_widgets[tab_name]
+        for widget in tab.winfo_children():
+            if isinstance(widget, ttk.Button) and widget is not cancel:
+                widget.config(state='disabled' if busy else 'normal')
+        cancel.config(state='normal' if busy else 'disabled')
+        if busy:
+            bar.config(mode='indeterminate', value=0)
+            status.config(text='Working...')
+        else:
+            bar.stop()
+            bar.config(mode='determinate', value=0)
+
+    def process_events(self):
+        """Apply progress updates and finished operations queued by the workers."""
+        try:
+            while True:
+                event = self.events.get_nowait()
+                if event[0] == 'progress':
+                    self.show_progress(*event[1:])
+                else:
+                    self.finish_operation(*event[1:])
+        except queue.Empty:
+            pass
+        self.root.after(POLL_INTERVAL_MS, self.process_events)
+
+    def show_progress(self, tab_name, stage, done, total):
+        tab, bar, status, cancel = self.progress_widgets[tab_name]
+        if tab_name not in self.jobs or self.jobs[tab_name].cancelled:
+            return
+        if total:
+            bar.config(mode='determinate', maximum=total, value=done)
+            status.config(text=f'{stage.capitalize()}: {done}/{total}')
+        else:
+            bar.config(mode='indeterminate')
+            bar.step(5)
+            status.config(text=f'{stage.capitalize()}...')
+
+    def finish_operation(self, tab_name, title, future, on_success):
+        self.jobs.pop(tab_name, None)
+        self.set_busy(tab_name, False)
+        status = self.progress_widgets[tab_name][2]
+        try:
+            result = future.result()
+        except OperationCancelled:
+            status.config(text='Cancelled')
+            return
+        except Exception as e:
+            status.config(text='Failed')
+            logging.error("%s failed: %s", title, str(e))
+            messagebox.showerror('Error', f'{title} failed: {str(e)}')
+            return
+        status.config(text='Done')
+        on_success(result)
+
+    def on_encoded(self, saved_path, clear_fields):
+        # The backends return the written path, or None after reporting an error
+        if saved_path is None:
+            messagebox.showerror('Error', 'Encoding failed, see the console output for details')
+            return
+        messagebox.showinfo('Success', f'Data encoded and saved to {saved_path}')
+        clear_fields()
+
+    def on_decoded(self, secret_data, clear_fields):
+        if secret_data:
+            messagebox.showinfo('Decoded Data', f'Decoded data: {secret_data}')
+        else:
+            messagebox.showinfo('Decoded Data', 'No hidden message found or decryption failed')
+        clear_fields()
+
+    def cancel_operation(self, tab_name):
+        progress = self.jobs.get(tab_name)
+        if progress:
+            progress.cancel()
+            self.progress_widgets[tab_name][2].config(text='Cancelling...')
+
+    def on_close(self):
+        # Stop running operations at their next checkpoint instead of waiting for them
+        for progress in self.jobs.values():
+            progress.cancel()
+        self.executor.shutdown(wait=False, cancel_futures=True)
+        self.root.destroy()
 
 if __name__ == '__main__':
     root = tk.Tk()
@@ -1,5 +1,22 @@
-# stego_tool/__init__.py
-from .image_stego import ImageStego
-from .audio_stego import AudioStego
-from .video_stego import VideoStego
-from .cli import cli
\ No newline at end of file
+# stego_tool/__init__.py
+import importlib
+from .cli import cli
+
+# Backends (and the decode dispatcher) are imported on first attribute access
+# so that importing the package (or the CLI) does not load OpenCV, pydub and
+# NumPy up front.
+_BACKENDS = {
+    'ImageStego': '.image_stego',
+    'AudioStego': '.audio_stego',
+    'VideoStego': '.video_stego',
+    'decode': '.dispatch',
+}
+
+__all__ = ['ImageStego', 'AudioStego', 'VideoStego', 'decode', 'cli']
+
+def __getattr__(name):
+    if name in _BACKENDS:
+        value = getattr(importlib.import_module(_BACKENDS[name], __name__), name)
+        globals()[name] = value
+        return value
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
\ No newline at end of file
@@ -1,146 +1,340 @@
-from pydub import AudioSegment
-import numpy as np
-from cryptography.fernet import Fernet
-import base64
-import re
-
-class AudioStego:
-    @staticmethod
-    def generate_key():
-        """Generate a Fernet encryption key."""
-        return Fernet.generate_key()
-        
-    @staticmethod
-    def encode_audio(audio_path, secret_data, output_path, key=None):
-        audio = AudioSegment.from_file(audio_path)
-        samples = np.array(audio.get_array_of_samples())
-        
-        # Encrypt the message if a key is provided
-        original_data = secret_data
-        if key:
-            try:
-                # Convert string key to bytes if needed
-                if isinstance(key, str):
-                    key = key.encode()
-                
-                # Initialize Fernet with the key
-                fernet = Fernet(key)
-                
-                # Encrypt the message
-                if isinstance(secret_data, str):
-                    secret_data = secret_data.encode()
-                encrypted_data = fernet.encrypt(secret_data)
-                
-                # Convert to base64 string for encoding
-                secret_data = base64.b64encode(encrypted_data).decode()
-                print(f"Message encrypted using Fernet (length: {len(secret_data)} characters)")
-            except Exception as e:
-                print(f"Encryption error: {str(e)}. Proceeding with plaintext.")
-                secret_data = original_data  # Revert to original data on error
-        
-        # Add termination marker
-        secret_data += '\x00\x00'
-        binary_data = ''.join(format(ord(char), '08b') for char in secret_data)
-        data_len = len(binary_data)
-        
-        idx = 0
-        for i in range(len(samples)):
-            if idx < data_len:
-                samples[i] = samples[i] & ~1 | int(binary_data[idx])
-                idx += 1
-        
-        encoded_audio = AudioSegment(
-            samples.tobytes(),
-            frame_rate=audio.frame_rate,
-            sample_width=audio.sample_width,
-            channels=audio.channels
-        )
-        
-        # Ensure the output path has a proper extension
-        if not output_path.lower().endswith(('.wav', '.mp3', '.ogg', '.flac')):
-            # Default to WAV format for lossless encoding
-            output_path = output_path + '.wav'
-            
-        encoded_audio.export(output_path, format="wav")
-        print(f"Data encoded and saved to {output_path}")
-        print(f"To decode this audio, run: python main.py decode-audio -i {output_path}" + 
-              (f" -k \"{key.decode() if isinstance(key, bytes) else key}\"" if key else ""))
-
-    @staticmethod
-    def decode_audio(audio_path, key=None):
-        audio = AudioSegment.from_file(audio_path)
-        samples = np.array(audio.get_array_of_samples())
-        
-        binary_data = ''
-        for sample in samples:
-            binary_data += str(sample & 1)
-        
-        # Extract message until termination marker
-        extracted_message = ''
-        for i in range(0, len(binary_data), 8):
-            if i + 8 <= len(binary_data):
-                byte = binary_data[i:i+8]
-                char = chr(int(byte, 2))
-                extracted_message += char
-                if extracted_message[-2:] == '\x00\x00':  # Null terminator
-                    extracted_message = extracted_message[:-2]  # Remove termination marker
-                    break
-                    
-        # Try to decrypt the message if a key was provided
-        if key and extracted_message:
-            try:
-                # Convert string key to bytes if needed
-                if isinstance(key, str):
-                    key = key.encode()
-                
-                # Initialize Fernet with the key
-                fernet = Fernet(key)
-                
-                # Prepare for base64 decoding
-                # Fix padding issues
-                extracted_message = AudioStego._fix_base64_padding(extracted_message)
-                
-                try:
-                    # Decode base64 and decrypt
-                    encrypted_data = base64.b64decode(extracted_message)
-                    decrypted_data = fernet.decrypt(encrypted_data)
-                    
-                    # Convert to string
-                    if isinstance(decrypted_data, bytes):
-                        extracted_message = decrypted_data.decode()
-                        
-                    print(f"Message successfully decrypted using Fernet")
-                except Exception as e:
-                    print(f"Primary decryption failed: {str(e)}. Trying alternative approaches...")
-                    
-                    # Try with different sections of the message (in case of alignment issues)
-                    for i in range(1, 4):
-                        try:
-                            # Try with slightly offset data
-                            test_message = extracted_message[i:]
-                            test_message = AudioStego._fix_base64_padding(test_message)
-                            encrypted_data = base64.b64decode(test_message)
-                            decrypted_data = fernet.decrypt(encrypted_data)
-                            extracted_message = decrypted_data.decode()
-                            print(f"Decryption successful with {i}-character offset")
-                            break
-                        except Exception:
-                            pass
-                    
-            except Exception as e:
-                print(f"Decryption error: {str(e)}. Returning raw extracted data.")
-        
-        return extracted_message
-        
-    @staticmethod
-    def _fix_base64_padding(data):
-        """Fix base64 padding issues by ensuring proper length."""
-        # Remove non-base64 characters
-        data = re.sub(r'[^A-Za-z0-9+/=]', '', data)
-        
-        # Add padding if needed
-        padding_needed = len(data) % 4
-        if padding_needed:
-            data += '=' * (4 - padding_needed)
-            
+from pydub import AudioSegment
+import numpy as np
+from cryptography.fernet import Fernet
+import base64
+import io
+import os
+import re
+import wave
+from . import metrics
+from .payload import build_frame, extract_frame_lsb, open_frame
+from .stream import FrameEncoder, atomic_output, embed_frame_lsb, extract_frame_lsb_to, is_stream
+
+class AudioStego:
+    @staticmethod
+    def generate_key():
+        """Generate a Fernet encryption key."""
+        return Fernet.generate_key()
+        
+    @staticmethod
+    def capacity(audio_path):
+        """Describe a cover audio file without decoding its samples.
+        
+        Returns a dict with the format, channels, sample rate and width, the
+        number of frames, `raw_bytes` (size of the decoded samples) and
+        `capacity`: the largest compact frame, in bytes, the audio can hold.
+        """
+        try:
+            with wave.open(audio_path, 'rb') as audio:
+                info = {'modality': 'audio', 'format': 'wav', 'channels': audio.getnchannels(),
+                        'frame_rate': audio.getframerate(), 'sample_width': audio.getsampwidth(),
+                        'frames': audio.getnframes()}
+        except (wave.Error, EOFError):
+            # Only ffmpeg can tell the length of compressed formats, so decode them
+            segment = AudioSegment.from_file(audio_path)
+            info = {'modality': 'audio', 'format': os.path.splitext(audio_path)[1].lstrip('.').lower(),
+                    'channels': segment.channels, 'frame_rate': segment.frame_rate,
+                    'sample_width': segment.sample_width, 'frames': int(segment.frame_count())}
+        samples = info['frames'] * info['channels']
+        info['raw_bytes'] = samples * info['sample_width']
+        # One bit per sample
+        info['capacity'] = samples // 8
+        return info
+        
+    @staticmethod
+    @metrics.operation('audio', 'encode')
+    def encode_audio(audio_path, secret_data, output_path, key=None, compact=False, cipher='aesgcm',
+                     compression=None, level=None, passphrase=None, salt=None):
+        with metrics.stage('load'):
+            audio = AudioStego._load_segment(audio_path)
+        with metrics.stage('convert'):
+            samples = np.array(audio.get_array_of_samples())
+        
+        if compact or compression or passphrase or is_stream(secret_data):
+            # Compact mode: raw ciphertext inside a binary frame, no base64
+            if is_stream(secret_data):
+                # Files and iterators are framed chunk by chunk while they are embedded
+                frame = FrameEncoder(secret_data, key, cipher, compression, level, passphrase, salt)
+            else:
+                frame = build_frame(secret_data, key, cipher, compression, level, passphrase, salt)
+                print(f"Payload framed in compact mode (length: {len(frame)} bytes)")
+            try:
+                embed_frame_lsb(samples, frame)
+            except ValueError as e:
+                print(f"Error: {str(e)}")
+                return
+            if is_stream(secret_data):
+                print(f"Payload streamed in compact mode (length: {frame.size} bytes)")
+        else:
+            AudioStego._embed_legacy(samples, secret_data, key)
+        
+        encoded_audio = AudioSegment(
+            samples.tobytes(),
+            frame_rate=audio.frame_rate,
+            sample_width=audio.sample_width,
+            channels=audio.channels
+        )
+        
+        if hasattr(output_path, 'write'):
+            # pydub seeks in the file it exports to, which stdout does not allow
+            buffer = io.BytesIO()
+            with metrics.stage('write'):
+                encoded_audio.export(buffer, format='wav')
+                output_path.write(buffer.getvalue())
+            print("Data encoded and written to the output stream")
+            return output_path
+
+        # Ensure the output path has a proper extension
+        if not output_path.lower().endswith(('.wav', '.mp3', '.ogg', '.flac')):
+            # Default to WAV format for lossless encoding
+            output_path = output_path + '.wav'
+            
+        with metrics.stage('write'):
+            encoded_audio.export(output_path, format="wav")
+        print(f"Data encoded and saved to {output_path}")
+        print(f"To decode this audio, run: python main.py decode-audio -i {output_path}" + 
+              (f" -k \"{key.decode() if isinstance(key, bytes) else key}\"" if key else ""))
+        return output_path
+
+    @staticmethod
+    def _embed_legacy(samples, secret_data, key):
+        """Hide a message as base64 text with a null terminator (original format)."""
+        # Encrypt the message if a key is provided
+        original_data = secret_data
+        if key:
+            try:
+                # Convert string key to bytes if needed
+                if isinstance(key, str):
+                    key = key.encode()
+                
+                # Initialize Fernet with the key
+                fernet = Fernet(key)
+                
+                # Encrypt the message
+                if isinstance(secret_data, str):
+                    secret_data = secret_data.encode()
+                with metrics.stage('encrypt'):
+                    encrypted_data = fernet.encrypt(secret_data)
+                    # Convert to base64 string for encoding
+                    secret_data = base64.b64encode(encrypted_data).decode()
+                print(f"Message encrypted using Fernet (length: {len(secret_data)} characters)")
+            except Exception as e:
+                print(f"Encryption error: {str(e)}. Proceeding with plaintext.")
+                secret_data = original_data  # Revert to original data on error
+        
+        # Add termination marker
+        secret_data += '\x00\x00'
+        binary_data = ''.join(format(ord(char), '08b') for char in secret_data)
+        
+        # Set the LSB of one sample per bit; data beyond the last sample is dropped
+        with metrics.stage('embed'):
+            bits = np.frombuffer(binary_data.encode('ascii'), dtype=np.uint8)[:len(samples)] - ord('0')
+            samples[:len(bits)] = samples[:len(bits)] & ~1 | bits
+
+    @staticmethod
+    @metrics.operation('audio', 'decode')
+    def decode_audio(audio_path, key=None, passphrase=None):
+        with metrics.stage('load'):
+            audio = AudioStego._load_segment(audio_path)
+        with metrics.stage('convert'):
+            samples = np.array(audio.get_array_of_samples())
+        
+        # Audio written in compact mode starts with a binary payload frame
+        with metrics.stage('extract'):
+            frame = extract_frame_lsb(samples)
+        if frame is not None:
+            return AudioStego._open_compact(frame, key, passphrase)
+        
+        # Extract message until termination marker
+        with metrics.stage('extract'):
+            extracted_message = AudioStego._extract_legacy(samples).decode('latin-1')
+                    
+        # Try to decrypt the message if a key was provided
+        if key and extracted_message:
+            try:
+                with metrics.stage('decrypt'):
+                    extracted_message = AudioStego._decrypt_legacy(extracted_message, key).decode()
+                print(f"Message successfully decrypted using Fernet")
+            except Exception as e:
+                print(f"Decryption error: {str(e)}. Returning raw extracted data.")
+        
+        return extracted_message
+        
+    @staticmethod
+    @metrics.operation('audio', 'encode')
+    def encode_array(samples, payload, key=None, cipher='aesgcm', compression=None, level=None,
+                     passphrase=None, salt=None):
+        """Hide a payload in an array of interleaved PCM samples and return the modified copy.
+        
+        Works entirely in memory with no file I/O or console output. The payload
+        is always written as a compact frame.
+        
+        Args:
+            samples: Integer sample array (as from `AudioSegment.get_array_of_samples`)
+            payload: Message as str or bytes, or a binary file object or iterator
+                of bytes chunks to stream
+            key, cipher, compression, level, passphrase, salt: See `build_frame`
+        """
+        samples = np.array(samples)
+        if is_stream(payload):
+            frame = FrameEncoder(payload, key, cipher, compression, level, passphrase, salt)
+        else:
+            frame = build_frame(payload, key, cipher, compression, level, passphrase, salt)
+        embed_frame_lsb(samples.reshape(-1), frame)
+        return samples
+        
+    @staticmethod
+    @metrics.operation('audio', 'decode')
+    def decode_array(samples, key=None, passphrase=None):
+        """Recover the payload bytes hidden in an array of PCM samples.
+        
+        Reads compact frames as well as the original base64 format. Raises
+        ValueError (or a cryptography exception) if the payload cannot be decrypted.
+        """
+        samples = np.ascontiguousarray(samples).reshape(-1)
+        with metrics.stage('extract'):
+            frame = extract_frame_lsb(samples)
+        if frame is not None:
+            return open_frame(frame, key, passphrase)
+        with metrics.stage('extract'):
+            message = AudioStego._extract_legacy(samples)
+        if key and message:
+            with metrics.stage('decrypt'):
+                return AudioStego._decrypt_legacy(message.decode('latin-1'), key)
+        return message
+        
+    @staticmethod
+    @metrics.operation('audio', 'encode')
+    def encode_bytes(audio, payload, key=None, cipher='aesgcm', compression=None, level=None,
+                     passphrase=None, salt=None, format='wav'):
+        """Hide a payload in encoded audio and return a WAV file as bytes.
+        
+        Args:
+            audio: Audio file contents as bytes, or a readable file-like object
+            payload: Message as str or bytes, or a binary file object or iterator to stream
+            format: Input container format (WAV needs no ffmpeg)
+        """
+        with metrics.stage('load'):
+            segment = AudioStego._load_segment(audio, format)
+        samples = AudioStego.encode_array(segment.get_array_of_samples(), payload, key, cipher,
+                                          compression, level, passphrase, salt)
+        encoded_audio = AudioSegment(
+            samples.tobytes(),
+            frame_rate=segment.frame_rate,
+            sample_width=segment.sample_width,
+            channels=segment.channels
+        )
+        buffer = io.BytesIO()
+        with metrics.stage('write'):
+            encoded_audio.export(buffer, format='wav')
+        return buffer.getvalue()
+        
+    @staticmethod
+    @metrics.operation('audio', 'decode')
+    def decode_bytes(audio, key=None, passphrase=None, format='wav'):
+        """Recover the payload bytes from audio file contents or a file-like object."""
+        with metrics.stage('load'):
+            segment = AudioStego._load_segment(audio, format)
+        return AudioStego.decode_array(segment.get_array_of_samples(), key, passphrase)
+        
+    @staticmethod
+    @metrics.operation('audio', 'decode')
+    def decode_to_file(audio_path, output_path, key=None, passphrase=None):
+        """Write the payload hidden in an audio file to a file and return its size in bytes.
+        
+        Compact payloads are streamed through decryption and decompression, and
+        the file only appears once the payload has been verified. Raises
+        ValueError (or a cryptography exception) if it cannot be read.
+        """
+        with metrics.stage('load'):
+            audio = AudioStego._load_segment(audio_path)
+        with metrics.stage('convert'):
+            samples = np.array(audio.get_array_of_samples())
+        with atomic_output(output_path) as out:
+            written = extract_frame_lsb_to(samples, out, key, passphrase)
+            if written is None:
+                # Original format: a short base64 message, read in one go
+                written = out.write(AudioStego.decode_array(samples, key, passphrase))
+        return written
+        
+    @staticmethod
+    def _load_segment(audio, format=None):
+        """Open an audio path, bytes or a file-like object with pydub.
+        
+        Without a format, WAV files and file-like objects are recognised by
+        their RIFF header, so they load without ffmpeg whatever their name.
+        """
+        if isinstance(audio, (bytes, bytearray, memoryview)):
+            audio = io.BytesIO(audio)
+        if format is None:
+            if hasattr(audio, 'read'):
+                start = audio.tell()
+                head = audio.read(4)
+                audio.seek(start)
+            else:
+                with open(audio, 'rb') as f:
+                    head = f.read(4)
+            if head == b'RIFF':
+                format = 'wav'
+        return AudioSegment.from_file(audio, format=format)
+        
+    @staticmethod
+    def _extract_legacy(samples):
+        """Read a message in the original format: LSB bytes up to the first null pair."""
+        step = 1 << 16  # bytes per chunk
+        message = b''
+        for start in range(0, len(samples) // 8, step):
+            chunk = (samples[start * 8:(start + step) * 8] & 1).astype(np.uint8)
+            message += np.packbits(chunk[:len(chunk) - len(chunk) % 8]).tobytes()
+            # Search from one byte back so a terminator across chunks is still found
+            end = message.find(b'\x00\x00', max(start - 1, 0))
+            if end != -1:
+                return message[:end]
+        return message
+        
+    @staticmethod
+    def _decrypt_legacy(message, key):
+        """Decrypt a base64 Fernet message from the original format."""
+        # Convert string key to bytes if needed
+        if isinstance(key, str):
+            key = key.encode()
+        fernet = Fernet(key)
+        
+        # Fix padding issues, then decode base64 and decrypt
+        message = AudioStego._fix_base64_padding(message)
+        try:
+            return fernet.decrypt(base64.b64decode(message))
+        except Exception:
+            # Try with different sections of the message (in case of alignment issues)
+            for i in range(1, 4):
+                try:
+                    test_message = AudioStego._fix_base64_padding(message[i:])
+                    return fernet.decrypt(base64.b64decode(test_message))
+                except Exception:
+                    pass
+            raise
+        
+    @staticmethod
+    def _open_compact(frame, key, passphrase=None):
+        """Verify and decrypt a compact payload frame."""
+        try:
+            message = open_frame(frame, key, passphrase)
+            if key or passphrase:
+                print(f"Message successfully decrypted from compact frame")
+            return message.decode(errors='replace')
+        except Exception as e:
+            print(f"Decryption error: {str(e)}. Compact payload could not be read.")
+            return ''
+        
+    @staticmethod
+    def _fix_base64_padding(data):
+        """Fix base64 padding issues by ensuring proper length."""
+        # Remove non-base64 characters
+        data = re.sub(r'[^A-Za-z0-9+/=]', '', data)
+        
+        # Add padding if needed
+        padding_needed = len(data) % 4
+        if padding_needed:
+            data += '=' * (4 - padding_needed)
+            
         return data
\ No newline at end of file
@@ -0,0 +1,165 @@
+# stego_tool/batch.py
+import contextlib
+import io
+import json
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor, as_completed
+
+from . import metrics
+from .utils import detect_modality, init_worker, read_manifest, take_worker_log
+
+# Manifest rows describe one job each:
+#
+#   id        Optional job id (defaults to the row number)
+#   op        'encode' or 'decode'
+#   input     Cover (encode) or stego file (decode)
+#   output    Output path (for decode, the payload is written there instead of
+#             being returned in the result)
+#   data      Secret message (encode only)
+#   file      Treat `data` as a path to read the payload from
+#   modality  'image', 'audio' or 'video' (detected from `input` if omitted)
+#   key, passphrase, cipher, compress, level, compact, salt, quality,
+#   png_level, png_filter, png_strategy, png_threads, yuv, lossless, hybrid
+#             Same meaning as the matching encode/decode CLI options (quality
+#             and the png ones for images only, yuv, lossless and hybrid for
+#             videos only)
+#
+# Results, with each job's wall time and per-stage seconds, are streamed to a
+# JSON Lines file as jobs finish. Jobs whose id is already recorded there with
+# status 'ok' are skipped, so an interrupted run resumes where it stopped.
+
+TRUE_VALUES = ('1', 'true', 'yes', 'on')
+
+
+def _flag(value):
+    """Interpret a manifest value (JSON bool or CSV string) as a boolean."""
+    if isinstance(value, str):
+        return value.strip().lower() in TRUE_VALUES
+    return bool(value)
+
+
+def _int(value):
+    """Interpret an optional numeric manifest value (blank in CSV means unset)."""
+    return int(value) if value not in (None, '') else None
+
+
+def _run_job(job):
+    """Run a single manifest job in a worker process and return its result record."""
+    from .image_stego import ImageStego
+    from .audio_stego import AudioStego
+    from .video_stego import VideoStego
+
+    backends = {'image': ImageStego, 'audio': AudioStego, 'video': VideoStego}
+    started = time.perf_counter()
+    result = {'id': job['id'], 'op': job.get('op', 'encode'), 'input': job.get('input')}
+    take_worker_log()
+    registry = metrics.add_sink(metrics.CounterRegistry())
+    try:
+        modality = job.get('modality') or detect_modality(job['input'])
+        backend = backends[modality]
+        key = job.get('key') or None
+        passphrase = job.get('passphrase') or None
+        extra = {'yuv': _flag(job.get('yuv'))} if modality == 'video' else {}
+        if result['op'] == 'decode' and job.get('output'):
+            result['bytes'] = backend.decode_to_file(job['input'], job['output'], key, passphrase, **extra)
+            result['output'] = job['output']
+        elif result['op'] == 'decode':
+            # decode_to_file raises when there is no payload, where decode_<modality>
+            # prints the error and returns it as the message
+            buffer = io.BytesIO()
+            backend.decode_to_file(job['input'], buffer, key, passphrase, **extra)
+            result['data'] = buffer.getvalue().decode(errors='replace')
+        elif result['op'] == 'encode':
+            compression = job.get('compress') or None
+            level = _int(job.get('level'))
+            salt = bytes.fromhex(job['salt']) if job.get('salt') else None
+            if modality == 'image':
+                extra['quality'] = _int(job.get('quality'))
+                extra['png_options'] = {'level': _int(job.get('png_level')),
+                                        'filter': job.get('png_filter') or None,
+                                        'strategy': job.get('png_strategy') or None,
+                                        # Jobs already run in parallel
+                                        'threads': _int(job.get('png_threads')) or 1}
+            elif modality == 'video':
+                extra['lossless'] = _flag(job.get('lossless'))
+                extra['hybrid'] = _flag(job.get('hybrid'))
+            with contextlib.ExitStack() as stack:
+                data = job['data']
+                if _flag(job.get('file')):
+                    # Streamed chunk by chunk into the carrier
+                    data = stack.enter_context(open(data, 'rb'))
+                output = getattr(backend, f'encode_{modality}')(
+                    job['input'], data, job['output'], key, _flag(job.get('compact')),
+                    job.get('cipher') or 'aesgcm', None if compression == 'none' else compression,
+                    level, passphrase, salt, **extra)
+            if output is None or not os.path.exists(output):
+                raise RuntimeError("Encoding failed, see log")
+            result['output'] = output
+        else:
+            raise ValueError(f"Unknown op: {result['op']}")
+        result['status'] = 'ok'
+    except Exception as e:
+        result['status'] = 'error'
+        result['error'] = f"{type(e).__name__}: {e}"
+    finally:
+        metrics.remove_sink(registry)
+    result['seconds'] = round(time.perf_counter() - started, 4)
+    result['stages'] = {row[2]: round(row[4], 4) for row in registry.summary() if row[2] != 'total'}
+    result['log'] = take_worker_log()
+    return result
+
+
+def completed_ids(results_path):
+    """Ids of the jobs already recorded as successful in a results file."""
+    done = set()
+    if not os.path.exists(results_path):
+        return done
+    with open(results_path, encoding='utf-8') as f:
+        for line in f:
+            try:
+                record = json.loads(line)
+            except ValueError:
+                continue  # a partially written last line from an interrupted run
+            if record.get('status') == 'ok':
+                done.add(str(record['id']))
+    return done
+
+
+def run_batch(manifest_path, results_path=None, workers=None, on_result=None):
+    """Run every job of a manifest in a process pool.
+
+    Args:
+        manifest_path: CSV or JSONL job manifest
+        results_path: JSONL file results are appended to (default: <manifest>.results.jsonl)
+        workers: Number of worker processes (default: CPU count)
+        on_result: Optional callback invoked with each result record
+
+    Returns:
+        Counts of 'ok', 'error' and 'skipped' jobs.
+    """
+    if results_path is None:
+        results_path = os.path.splitext(manifest_path)[0] + '.results.jsonl'
+    jobs = []
+    for index, row in enumerate(read_manifest(manifest_path), start=1):
+        row = dict(row)
+        row['id'] = str(row.get('id') or index)
+        jobs.append(row)
+
+    done = completed_ids(results_path)
+    pending = [job for job in jobs if job['id'] not in done]
+    counts = {'ok': 0, 'error': 0, 'skipped': len(jobs) - len(pending)}
+    if not pending:
+        return counts
+
+    with open(results_path, 'a', encoding='utf-8') as out, \
+            ProcessPoolExecutor(max_workers=workers, initializer=init_worker) as pool:
+        futures = [pool.submit(_run_job, job) for job in pending]
+        for future in as_completed(futures):
+            result = future.result()
+            out.write(json.dumps(result) + '\n')
+            out.flush()
+            counts[result['status']] += 1
+            if on_result:
+                on_result(result)
+    return counts
@@ -1,11 +1,103 @@
 # stego_tool/cli.py
 import click
+import io
 import os
-import cv2
-from .image_stego import ImageStego
-from .audio_stego import AudioStego
-from .video_stego import VideoStego
-from cryptography.fernet import Fernet
+import shutil
+import sys
+import tempfile
+from contextlib import ExitStack, contextmanager, redirect_stdout
+
+# Backends and their heavy dependencies (OpenCV, pydub, NumPy, cryptography)
+# are imported inside the commands that need them, so e.g. `generate-key` or
+# `decode-image` never load OpenCV.
+
+def _parse_salt(ctx, param, value):
+    """Convert a hex salt option into bytes."""
+    if value is None:
+        return None
+    try:
+        salt = bytes.fromhex(value)
+    except ValueError:
+        raise click.BadParameter('salt must be hex encoded')
+    if len(salt) != 16:
+        raise click.BadParameter('salt must be 16 bytes (32 hex characters)')
+    return salt
+
+# '-' for --input/--output (and --data) stands for stdin/stdout
+STDIO = '-'
+
+@contextmanager
+def _payload(data, file):
+    """The payload of an encode command: the data string, an open file streamed with --file, or stdin for '-'."""
+    if data == STDIO:
+        yield click.get_binary_stream('stdin')
+        return
+    if not file:
+        yield data
+        return
+    try:
+        f = open(data, 'rb')
+    except OSError as e:
+        raise click.FileError(data, hint=str(e))
+    with f:
+        yield f
+
+@contextmanager
+def _temp_path(suffix):
+    """A temporary file name, removed afterwards."""
+    fd, path = tempfile.mkstemp(suffix=suffix)
+    os.close(fd)
+    try:
+        yield path
+    finally:
+        if os.path.exists(path):
+            os.remove(path)
+
+@contextmanager
+def _stdio(input, output=None, data=None, spool=None):
+    """Map '-' for --input and --output to stdin and stdout.
+
+    Pillow and pydub read and write in-memory buffers. OpenCV only opens
+    video files, so with `spool` (a file suffix) stdin and stdout are copied
+    through temporary files instead. While stdout carries the output, console
+    messages go to stderr.
+    """
+    if input == STDIO and data == STDIO:
+        raise click.UsageError('Standard input can carry the cover or the payload, not both')
+    with ExitStack() as stack:
+        if input == STDIO:
+            carrier = click.get_binary_stream('stdin').read()
+            if spool:
+                input = stack.enter_context(_temp_path(spool))
+                with open(input, 'wb') as f:
+                    f.write(carrier)
+            else:
+                input = io.BytesIO(carrier)
+        stdout = None
+        if output == STDIO:
+            stdout = click.get_binary_stream('stdout')
+            output = stack.enter_context(_temp_path(spool)) if spool else stdout
+            stack.enter_context(redirect_stdout(sys.stderr))
+        yield input, output
+        if spool and stdout is not None:
+            with open(output, 'rb') as f:
+                shutil.copyfileobj(f, stdout)
+            stdout.flush()
+
+def _check_encoded(written, name):
+    """Fail the command when a backend returned None: it printed the error and wrote nothing."""
+    if written is None:
+        raise click.ClickException(f"Nothing was encoded into {name}")
+
+def _decode_to_file(backend, input, output, key, passphrase, name, **options):
+    """Stream a decoded payload into `output` (the decode commands' --output), or to stdout for '-'."""
+    to_stdout = output == STDIO
+    try:
+        written = backend.decode_to_file(input, click.get_binary_stream('stdout') if to_stdout else output,
+                                         key, passphrase, **options)
+    except Exception as e:
+        raise click.ClickException(f"Could not decode a payload from {name}: {str(e) or type(e).__name__}")
+    click.echo(f"Decoded {written} bytes into {'standard output' if to_stdout else output}", err=to_stdout)
 
 HELP_TEXT = """
 Steganography Tool - Hide secret messages in media files
@@ -23,6 +115,52 @@ Examples:
   # Decode an encrypted message from an image:
   python main.py decode-image -i picture/encoded.png -k "your-encryption-key"
 
+  # Write a JPEG instead of a PNG (the message goes into the DCT coefficients):
+  python main.py encode-image -i picture/original.png -o picture/encoded.jpg -d "Secret message" --quality 90
+
+  # Trade PNG size for encode speed on a large cover:
+  python main.py encode-image -i picture/large.png -o picture/encoded.png -d "Secret message" --png-level 1 --png-strategy huffman
+
+  # Hide an encrypted message in compact binary mode (fewer pixels/samples/frames):
+  python main.py encode-image -i picture/original.png -o picture/encoded.png -d "Secret message" -k "your-encryption-key" --compact
+
+  # Use a passphrase instead of a generated key:
+  python main.py encode-image -i picture/original.png -o picture/encoded.png -d "Secret message" -p "correct horse battery staple"
+  python main.py decode-image -i picture/encoded.png -p "correct horse battery staple"
+
+  # Encode one payload per recipient into copies of the same cover:
+  python main.py fan-out -i picture/original.png -m recipients.csv -k "your-encryption-key"
+
+  # Split a payload too large for one cover across several covers, then put it back together:
+  python main.py shard picture/a.png audio/b.wav video/c.avi -o shards/ -d archive.zip --file -k "your-encryption-key"
+  python main.py unshard shards/ -o archive.zip -k "your-encryption-key"
+
+  # Run a manifest of encode/decode jobs in parallel (resumable):
+  python main.py batch -m jobs.jsonl -w 8
+
+  # Find which files in a directory tree carry a payload:
+  python main.py scan picture/ audio/ video/
+
+  # Index a cover library, then pick the smallest image that fits a 2 KB payload:
+  python main.py index covers/
+  python main.py pick-cover --size 2048 --modality image
+
+  # Keep warm workers resident and send commands to them:
+  python main.py serve --workers 4
+  python -m stego_tool.daemon decode-image -i picture/encoded.png
+
+  # Hide a file of any size (streamed chunk by chunk), then extract it again:
+  python main.py encode-image -i picture/original.png -o picture/encoded.png -d report.pdf --file -k "your-encryption-key"
+  python main.py decode-image -i picture/encoded.png -k "your-encryption-key" -o report.pdf
+
+  # Use the tool in a pipeline: "-" reads the cover from stdin and writes the result to stdout
+  curl -s https://example.com/cover.png | python main.py encode-image -i - -o - -d "Secret message" > encoded.png
+  tar c docs/ | python main.py encode-audio -i audio/original.wav -o encoded.wav -d - -k "your-encryption-key"
+  python main.py decode-audio -i - -o - -k "your-encryption-key" < encoded.wav | tar x
+
+  # Compress the message before encrypting it (the smallest codec is picked automatically):
+  python main.py encode-image -i picture/original.png -o picture/encoded.png -d "Secret message" -k "your-encryption-key" --compress auto
+
   # Hide a message in an audio file:
   python main.py encode-audio -i audio/original.wav -o audio/encoded.wav -d "Secret message"
 
@@ -49,64 +187,141 @@ Examples:
 
   # Decode a message from a video file (without encryption):
   python main.py decode-video -i video/encoded.mp4
+
+  # Decode any file without naming its type (detected from the file's first bytes):
+  python main.py decode -i incoming/unknown.bin -k "your-encryption-key"
+
+  # Embed in the YUV chroma planes through ffmpeg, without converting frames to BGR:
+  python main.py encode-video -i video/original.mp4 -o video/encoded.mp4 -d "Secret message" --yuv
+  python main.py decode-video -i video/encoded.mp4 --yuv
+
+  # Split a payload between the audio track and the frames of a video:
+  python main.py encode-video -i video/original.mp4 -o video/encoded.mp4 -d notes.txt --file --hybrid -k "your-encryption-key"
+
+  # Hide a large file in a lossless FFV1 video (the LSBs of whole frames):
+  python main.py encode-video -i video/original.mp4 -o video/archive.mkv -d report.pdf --file --lossless -k "your-encryption-key"
+
+  # See where the time goes (per-stage breakdown on stderr):
+  python main.py --profile encode-image -i picture/original.png -o picture/encoded.png -d "Secret message"
 """
 
 @click.group(help=HELP_TEXT)
-def cli():
+@click.option('--profile', is_flag=True, help='Print how long each stage (load, encrypt, embed, write, ...) took')
+@click.option('--metrics-file', envvar='STEGO_METRICS', type=click.Path(dir_okay=False),
+              help='Append per-stage timing events to this JSON Lines file')
+@click.pass_context
+def cli(ctx, profile, metrics_file):
     """Steganography Tool - Hide secret messages in media files (images, audio, video)."""
-    pass
+    if not (profile or metrics_file):
+        return
+    from . import metrics
+
+    if metrics_file:
+        sink = metrics.add_sink(metrics.JsonLinesSink(metrics_file))
+        ctx.call_on_close(sink.close)
+        ctx.call_on_close(lambda: metrics.remove_sink(sink))
+    if profile:
+        registry = metrics.add_sink(metrics.CounterRegistry())
+        ctx.call_on_close(lambda: click.echo(registry.format_profile(), err=True))
+        ctx.call_on_close(lambda: metrics.remove_sink(registry))
 
 @cli.command()
-@click.option('--input', '-i', required=True, help='Input image file')
-@click.option('--output', '-o', required=True, help='Output image file')
-@click.option('--data', '-d', required=True, help='Secret data to encode')
+@click.option('--input', '-i', required=True, help='Input image file ("-" for stdin)')
+@click.option('--output', '-o', required=True, help='Output image file ("-" for stdout)')
+@click.option('--data', '-d', required=True, help='Secret data to encode ("-" reads it from stdin)')
+@click.option('--file', '-f', is_flag=True, help='Treat data as a file path; the file is streamed in compact mode')
 @click.option('--key', '-k', help='Encryption key (base64)')
-def encode_image(input, output, data, key):
-    """Encode a secret message into an image using LSB steganography."""
-    ImageStego.encode_image(input, data, output, key)
+@click.option('--compact', is_flag=True, help='Embed raw ciphertext in a binary frame (about 45% smaller than the base64 mode)')
+@click.option('--cipher', type=click.Choice(['aesgcm', 'fernet']), default='aesgcm', show_default=True, help='Cipher used with --compact')
+@click.option('--compress', type=click.Choice(['none', 'zlib', 'lzma', 'zstd', 'auto']), default='none', show_default=True, callback=lambda ctx, param, value: None if value == 'none' else value, help='Compress the payload before encryption (implies --compact)')
+@click.option('--level', type=int, help='Compression level (codec default if omitted)')
+@click.option('--passphrase', '-p', envvar='STEGO_PASSPHRASE', help='Derive the key from a passphrase (implies --compact)')
+@click.option('--salt', callback=_parse_salt, help='16-byte hex KDF salt, share one across a batch to reuse derived keys')
+@click.option('--quality', '-q', type=click.IntRange(1, 100), help='JPEG quality for .jpg/.jpeg outputs (default 85); with "-o -" it writes a JPEG')
+@click.option('--png-level', type=click.IntRange(0, 9), help='PNG compression level, 0 (fastest) to 9 (default 6)')
+@click.option('--png-filter', type=click.Choice(['none', 'sub', 'up', 'average', 'paeth', 'adaptive']), help='PNG row filter (default adaptive)')
+@click.option('--png-strategy', type=click.Choice(['default', 'filtered', 'rle', 'huffman']), help='zlib strategy for PNG outputs (default filtered); rle and huffman are fast and compact on stego outputs')
+@click.option('--png-threads', type=click.IntRange(1), help='Threads compressing PNG outputs (default: CPU count)')
+def encode_image(input, output, data, file, key, compact, cipher, compress, level, passphrase, salt, quality,
+                 png_level, png_filter, png_strategy, png_threads):
+    """Encode a secret message into an image using LSB steganography.
+
+    A .jpg/.jpeg output hides the message in the JPEG's DCT coefficients instead.
+    """
+    from .image_stego import ImageStego
+    with _stdio(input, output, data) as (cover, target), _payload(data, file) as secret_data:
+        png_options = {'level': png_level, 'filter': png_filter, 'strategy': png_strategy,
+                       'threads': png_threads}
+        written = ImageStego.encode_image(cover, secret_data, target, key, compact, cipher,
+                                          compress, level, passphrase, salt, quality, png_options)
+        _check_encoded(written, output)
     
-    # Provide appropriate feedback
-    if key:
-        click.echo(f"Secret encrypted data encoded into {output}")
-        click.echo(f"Use the same key with decode-image to retrieve your message")
-    else:
-        click.echo(f"Secret data encoded into {output}")
+        # Provide appropriate feedback
+        if key:
+            click.echo(f"Secret encrypted data encoded into {output}")
+            click.echo(f"Use the same key with decode-image to retrieve your message")
+        else:
+            click.echo(f"Secret data encoded into {output}")
 
 @cli.command()
-@click.option('--input', '-i', required=True, help='Input image file')
+@click.option('--input', '-i', required=True, help='Input image file ("-" for stdin)')
 @click.option('--key', '-k', help='Encryption key (base64)')
-def decode_image(input, key):
+@click.option('--passphrase', '-p', envvar='STEGO_PASSPHRASE', help='Passphrase used when encoding')
+@click.option('--output', '-o', help='Write the payload to this file instead of printing it ("-" for stdout)')
+def decode_image(input, key, passphrase, output):
     """Decode a secret message from an image encoded with LSB steganography."""
-    secret_data = ImageStego.decode_image(input, key)
+    from .image_stego import ImageStego
+    with _stdio(input) as (carrier, _):
+        if output:
+            return _decode_to_file(ImageStego, carrier, output, key, passphrase, input)
+        secret_data = ImageStego.decode_image(carrier, key, passphrase)
     click.echo(f"Decoded data: {secret_data}")
 
 @cli.command()
-@click.option('--input', '-i', required=True, help='Input audio file')
-@click.option('--output', '-o', required=True, help='Output audio file')
-@click.option('--data', '-d', required=True, help='Secret data to encode')
+@click.option('--input', '-i', required=True, help='Input audio file ("-" for stdin)')
+@click.option('--output', '-o', required=True, help='Output audio file ("-" for stdout)')
+@click.option('--data', '-d', required=True, help='Secret data to encode ("-" reads it from stdin)')
+@click.option('--file', '-f', is_flag=True, help='Treat data as a file path; the file is streamed in compact mode')
 @click.option('--key', '-k', help='Encryption key (base64)')
-def encode_audio(input, output, data, key):
+@click.option('--compact', is_flag=True, help='Embed raw ciphertext in a binary frame (about 45% smaller than the base64 mode)')
+@click.option('--cipher', type=click.Choice(['aesgcm', 'fernet']), default='aesgcm', show_default=True, help='Cipher used with --compact')
+@click.option('--compress', type=click.Choice(['none', 'zlib', 'lzma', 'zstd', 'auto']), default='none', show_default=True, callback=lambda ctx, param, value: None if value == 'none' else value, help='Compress the payload before encryption (implies --compact)')
+@click.option('--level', type=int, help='Compression level (codec default if omitted)')
+@click.option('--passphrase', '-p', envvar='STEGO_PASSPHRASE', help='Derive the key from a passphrase (implies --compact)')
+@click.option('--salt', callback=_parse_salt, help='16-byte hex KDF salt, share one across a batch to reuse derived keys')
+def encode_audio(input, output, data, file, key, compact, cipher, compress, level, passphrase, salt):
     """Encode a secret message into an audio file using LSB steganography."""
-    AudioStego.encode_audio(input, data, output, key)
+    from .audio_stego import AudioStego
+    with _stdio(input, output, data) as (cover, target), _payload(data, file) as secret_data:
+        written = AudioStego.encode_audio(cover, secret_data, target, key, compact, cipher,
+                                          compress, level, passphrase, salt)
+        _check_encoded(written, output)
     
-    # Provide appropriate feedback
-    if key:
-        click.echo(f"Secret encrypted data encoded into {output}")
-        click.echo(f"Use the same key with decode-audio to retrieve your message")
-    else:
-        click.echo(f"Secret data encoded into {output}")
+        # Provide appropriate feedback
+        if key:
+            click.echo(f"Secret encrypted data encoded into {output}")
+            click.echo(f"Use the same key with decode-audio to retrieve your message")
+        else:
+            click.echo(f"Secret data encoded into {output}")
 
 @cli.command()
-@click.option('--input', '-i', required=True, help='Input audio file')
+@click.option('--input', '-i', required=True, help='Input audio file ("-" for stdin)')
 @click.option('--key', '-k', help='Encryption key (base64)')
-def decode_audio(input, key):
+@click.option('--passphrase', '-p', envvar='STEGO_PASSPHRASE', help='Passphrase used when encoding')
+@click.option('--output', '-o', help='Write the payload to this file instead of printing it ("-" for stdout)')
+def decode_audio(input, key, passphrase, output):
     """Decode a secret message from an audio file encoded with LSB steganography."""
-    secret_data = AudioStego.decode_audio(input, key)
+    from .audio_stego import AudioStego
+    with _stdio(input) as (carrier, _):
+        if output:
+            return _decode_to_file(AudioStego, carrier, output, key, passphrase, input)
+        secret_data = AudioStego.decode_audio(carrier, key, passphrase)
     click.echo(f"Decoded data: {secret_data}")
 
 @cli.command()
 def generate_key():
     """Generate a new Fernet encryption key for steganography."""
+    from cryptography.fernet import Fernet
     key = Fernet.generate_key()
     key_str = key.decode() if isinstance(key, bytes) else key
     click.echo(f"Generated encryption key: {key_str}")
@@ -114,64 +329,322 @@ def generate_key():
     return key_str
 
 @cli.command()
-@click.option('--input', '-i', required=True, help='Input video file')
-@click.option('--output', '-o', required=True, help='Output video file')
-@click.option('--data', '-d', required=True, help='Secret data to encode')
-@click.option('--file', '-f', is_flag=True, help='Treat data as a file path instead of a string')
+@click.option('--input', '-i', required=True, help='Input video file ("-" for stdin)')
+@click.option('--output', '-o', required=True, help='Output video file ("-" for stdout)')
+@click.option('--data', '-d', required=True, help='Secret data to encode ("-" reads it from stdin)')
+@click.option('--file', '-f', is_flag=True, help='Treat data as a file path; the file is streamed in compact mode')
 @click.option('--key', '-k', help='Encryption key (base64)')
-def encode_video(input, output, data, file, key):
+@click.option('--compact', is_flag=True, help='Embed raw ciphertext in a binary frame (about 45% smaller than the base64 mode)')
+@click.option('--cipher', type=click.Choice(['aesgcm', 'fernet']), default='aesgcm', show_default=True, help='Cipher used with --compact')
+@click.option('--compress', type=click.Choice(['none', 'zlib', 'lzma', 'zstd', 'auto']), default='none', show_default=True, callback=lambda ctx, param, value: None if value == 'none' else value, help='Compress the payload before encryption (implies --compact)')
+@click.option('--level', type=int, help='Compression level (codec default if omitted)')
+@click.option('--passphrase', '-p', envvar='STEGO_PASSPHRASE', help='Derive the key from a passphrase (implies --compact)')
+@click.option('--salt', callback=_parse_salt, help='16-byte hex KDF salt, share one across a batch to reuse derived keys')
+@click.option('--yuv', is_flag=True, help='Embed in the YUV chroma planes through ffmpeg pipes, skipping BGR conversion (needs ffmpeg)')
+@click.option('--lossless', is_flag=True, help='Write lossless FFV1 video (.mkv) and hide the payload in the LSBs of whole frames')
+@click.option('--hybrid', is_flag=True, help='Also hide the payload in the audio track, re-encoded losslessly (needs ffmpeg)')
+def encode_video(input, output, data, file, key, compact, cipher, compress, level, passphrase, salt, yuv, lossless,
+                 hybrid):
     """Encode a message into a video with advanced steganography."""
-    # Check video duration
-    cap = cv2.VideoCapture(input)
-    if not cap.isOpened():
-        click.echo(f"Error: Could not open video file {input}")
-        return
+    import cv2
+    from .video_stego import LOSSLESS_EXTENSION, VideoStego
+    if yuv and lossless:
+        raise click.UsageError("--yuv and --lossless cannot be combined")
+    spool = LOSSLESS_EXTENSION if lossless else '.avi'
+    with _stdio(input, output, data, spool=spool) as (cover, target), _payload(data, file) as secret_data:
+        # Check video duration
+        cap = cv2.VideoCapture(cover)
+        if not cap.isOpened():
+            click.echo(f"Error: Could not open video file {input}")
+            return
+            
+        # Get video properties
+        fps = cap.get(cv2.CAP_PROP_FPS)
+        frame_count = int(cap.get(cv2.CAP_PROP_FRAME_COUNT))
         
-    # Get video properties
-    fps = cap.get(cv2.CAP_PROP_FPS)
-    frame_count = int(cap.get(cv2.CAP_PROP_FRAME_COUNT))
-    
-    # Calculate duration in seconds
-    duration = frame_count / fps if fps > 0 else 0
-    
-    # Release the capture object
-    cap.release()
+        # Calculate duration in seconds
+        duration = frame_count / fps if fps > 0 else 0
+        
+        # Release the capture object
+        cap.release()
+        
+        # Check if video exceeds 15 seconds
+        if duration > 20:
+            click.echo(f"Error: Video is too long ({duration:.2f} seconds). Please use a video shorter than 15 seconds.")
+            return
+        
+        # Call the static method with the key parameter
+        written = VideoStego.encode_video(cover, secret_data, target, key, compact, cipher, compress, level,
+                                          passphrase, salt, yuv=yuv, lossless=lossless, hybrid=hybrid)
+        _check_encoded(written, output)
+        
+        # Provide appropriate feedback
+        if key:
+            click.echo(f"Secret encrypted data encoded into {output}")
+            click.echo(f"Use the same key with decode-video to retrieve your message")
+        else:
+            click.echo(f"Secret data encoded into {output}")
+
+@cli.command()
+@click.option('--input', '-i', required=True, help='Input video file ("-" for stdin)')
+@click.option('--key', '-k', help='Encryption key (base64)')
+@click.option('--passphrase', '-p', envvar='STEGO_PASSPHRASE', help='Passphrase used when encoding')
+@click.option('--output', '-o', help='Write the payload to this file instead of printing it ("-" for stdout)')
+@click.option('--yuv', is_flag=True, help='Read the chroma planes of raw YUV frames through ffmpeg (for videos encoded with --yuv)')
+def decode_video(input, key, passphrase, output, yuv):
+    """Decode a message from a video with advanced steganography."""
+    from .video_stego import VideoStego
+    with _stdio(input, spool='.avi') as (carrier, _):
+        if output:
+            return _decode_to_file(VideoStego, carrier, output, key, passphrase, input, yuv=yuv)
+        # Call the static method with the key parameter
+        secret_data = VideoStego.decode_video(carrier, key, passphrase, yuv=yuv)
     
-    # Check if video exceeds 15 seconds
-    if duration > 20:
-        click.echo(f"Error: Video is too long ({duration:.2f} seconds). Please use a video shorter than 15 seconds.")
-        return
+    click.echo(f"Decoded data: {secret_data}")
+
+@cli.command()
+@click.option('--input', '-i', required=True, help='Input image, audio or video file ("-" for stdin)')
+@click.option('--key', '-k', help='Encryption key (base64)')
+@click.option('--passphrase', '-p', envvar='STEGO_PASSPHRASE', help='Passphrase used when encoding')
+@click.option('--output', '-o', help='Write the payload to this file instead of printing it ("-" for stdout)')
+@click.option('--yuv', is_flag=True, help='For videos, read the chroma planes of raw YUV frames through ffmpeg')
+def decode(input, key, passphrase, output, yuv):
+    """Decode a message from any supported file, detecting its type from its contents."""
+    from .dispatch import backend_for, decode
+    from .utils import detect_modality
+    with _stdio(input) as (carrier, _), ExitStack() as stack:
+        try:
+            modality = detect_modality(carrier)
+        except ValueError as e:
+            raise click.ClickException(str(e))
+        if modality == 'video' and not isinstance(carrier, str):
+            # OpenCV only opens video files
+            path = stack.enter_context(_temp_path('.avi'))
+            with open(path, 'wb') as f:
+                f.write(carrier.getbuffer())
+            carrier = path
+        click.echo(f"Detected {modality} input", err=True)
+        if output:
+            extra = {'yuv': yuv} if modality == 'video' else {}
+            return _decode_to_file(backend_for(modality), carrier, output, key, passphrase, input, **extra)
+        secret_data = decode(carrier, key, passphrase, yuv=yuv, modality=modality)
+    click.echo(f"Decoded data: {secret_data}")
+
+@cli.command()
+@click.option('--input', '-i', required=True, help='Cover image or audio file')
+@click.option('--manifest', '-m', required=True, help='CSV or JSONL file with "output" and "data" fields, one variant per row')
+@click.option('--key', '-k', help='Encryption key (base64)')
+@click.option('--cipher', type=click.Choice(['aesgcm', 'fernet']), default='aesgcm', show_default=True, help='Cipher used with --key')
+@click.option('--compress', type=click.Choice(['none', 'zlib', 'lzma', 'zstd', 'auto']), default='none', show_default=True, callback=lambda ctx, param, value: None if value == 'none' else value, help='Compress each payload before encryption')
+@click.option('--level', type=int, help='Compression level (codec default if omitted)')
+@click.option('--passphrase', '-p', envvar='STEGO_PASSPHRASE', help='Derive the key from a passphrase')
+@click.option('--salt', callback=_parse_salt, help='16-byte hex KDF salt (one random salt per run if omitted)')
+@click.option('--workers', '-w', type=int, help='Number of parallel writers')
+def fan_out(input, manifest, key, cipher, compress, level, passphrase, salt, workers):
+    """Encode one payload per manifest row into copies of a single cover.
     
-    # Handle data input
-    if file:
+    The cover is decoded once; each variant only patches the payload region
+    and the outputs are written in parallel. Payloads use compact frames.
+    """
+    from .fanout import FanOut
+    from .utils import read_manifest
+
+    jobs = [(row['output'], row['data']) for row in read_manifest(manifest)]
+    try:
+        outputs = FanOut(input).encode_many(jobs, workers, key=key, cipher=cipher, compression=compress,
+                                            level=level, passphrase=passphrase, salt=salt)
+    except ValueError as e:
+        raise click.ClickException(str(e))
+    click.echo(f"Encoded {len(outputs)} variants of {input}")
+
+@cli.command()
+@click.argument('covers', nargs=-1, required=True, type=click.Path(exists=True, dir_okay=False))
+@click.option('--output-dir', '-o', required=True, type=click.Path(file_okay=False), help='Directory the shards are written to (same names, PNG/WAV for images/audio)')
+@click.option('--data', '-d', required=True, help='Secret data to encode ("-" reads it from stdin)')
+@click.option('--file', '-f', is_flag=True, help='Treat data as a file path')
+@click.option('--key', '-k', help='Encryption key (base64)')
+@click.option('--cipher', type=click.Choice(['aesgcm', 'fernet']), default='aesgcm', show_default=True, help='Cipher used with --key')
+@click.option('--compress', type=click.Choice(['none', 'zlib', 'lzma', 'zstd', 'auto']), default='none', show_default=True, callback=lambda ctx, param, value: None if value == 'none' else value, help='Compress the whole payload before it is split')
+@click.option('--level', type=int, help='Compression level (codec default if omitted)')
+@click.option('--passphrase', '-p', envvar='STEGO_PASSPHRASE', help='Derive the key from a passphrase')
+@click.option('--salt', callback=_parse_salt, help='16-byte hex KDF salt (one random salt per run if omitted)')
+@click.option('--workers', '-w', type=int, help='Number of worker processes (default: CPU count)')
+def shard(covers, output_dir, data, file, key, cipher, compress, level, passphrase, salt, workers):
+    """Split one payload across several COVERS of any media type.
+
+    Each cover receives a piece sized to its capacity, tagged with its index,
+    the shard count and the payload CRC32. Covers are encoded in parallel.
+    """
+    from .shard import encode_shards, shard_output
+
+    jobs = [(cover, shard_output(cover, output_dir)) for cover in covers]
+    if len({output for _, output in jobs}) < len(jobs):
+        raise click.UsageError('Two covers would be written to the same output file')
+    if any(os.path.abspath(cover) == os.path.abspath(output) for cover, output in jobs):
+        raise click.UsageError('The output directory must not be the directory of a cover')
+    os.makedirs(output_dir, exist_ok=True)
+    with _payload(data, file) as payload:
         try:
-            with open(data, 'rb') as f:
-                secret_data = f.read()
-        except Exception as e:
-            click.echo(f"Error reading file: {e}")
-            return
-    else:
-        secret_data = data
+            outputs = encode_shards(payload, jobs, key, cipher, compress, level, passphrase, salt, workers)
+        except (ValueError, RuntimeError) as e:
+            raise click.ClickException(str(e))
+    for output in outputs:
+        click.echo(f"Shard written to {output}")
+    click.echo(f"Payload split across {len(outputs)} carriers; decode them all with unshard")
+
+@cli.command()
+@click.argument('paths', nargs=-1, required=True, type=click.Path(exists=True))
+@click.option('--output', '-o', required=True, help='File the reassembled payload is written to ("-" for stdout)')
+@click.option('--key', '-k', help='Encryption key (base64)')
+@click.option('--passphrase', '-p', envvar='STEGO_PASSPHRASE', help='Passphrase used when encoding')
+@click.option('--workers', '-w', type=int, help='Number of worker processes (default: CPU count)')
+def unshard(paths, output, key, passphrase, workers):
+    """Reassemble a payload from the shards hidden in PATHS, in any order.
+
+    Directories are searched recursively; every media file found must carry
+    a shard of the same payload.
+    """
+    from .shard import decode_shards
+    from .stream import atomic_output
+
+    try:
+        data = decode_shards(paths, key, passphrase, workers)
+    except Exception as e:
+        raise click.ClickException(f"Could not reassemble the payload: {str(e) or type(e).__name__}")
+    to_stdout = output == STDIO
+    with atomic_output(click.get_binary_stream('stdout') if to_stdout else output) as out:
+        out.write(data)
+    click.echo(f"Reassembled {len(data)} bytes into {'standard output' if to_stdout else output}", err=to_stdout)
+
+@cli.command()
+@click.option('--manifest', '-m', required=True, help='CSV or JSONL file describing encode/decode jobs')
+@click.option('--results', '-r', help='JSONL file results are appended to (default: <manifest>.results.jsonl)')
+@click.option('--workers', '-w', type=int, help='Number of worker processes (default: CPU count)')
+def batch(manifest, results, workers):
+    """Run many encode/decode jobs from a manifest in parallel.
     
-    # Call the static method with the key parameter
-    VideoStego.encode_video(input, secret_data, output, key)
+    Results stream to the results file as jobs finish. Re-running the same
+    command skips the jobs that already succeeded.
+    """
+    from .batch import run_batch
+
+    def report(result):
+        target = result.get('output') or result.get('input')
+        if result['status'] == 'ok':
+            click.echo(f"[ok] {result['id']}: {result['op']} {target} ({result['seconds']:.2f}s)")
+        else:
+            click.echo(f"[error] {result['id']}: {result['op']} {target}: {result['error']}")
+
+    counts = run_batch(manifest, results, workers, on_result=report)
+    click.echo(f"Done: {counts['ok']} succeeded, {counts['error']} failed, {counts['skipped']} skipped")
+
+@cli.command()
+@click.argument('paths', nargs=-1, required=True, type=click.Path(exists=True))
+@click.option('--workers', '-w', type=int, help='Number of worker processes (default: CPU count)')
+@click.option('--verify', is_flag=True, help='Also read each compact payload in full and check its CRC32')
+@click.option('--json', 'as_json', is_flag=True, help='Print one JSON record per file, misses included')
+def scan(paths, workers, verify, as_json):
+    """Find the files that carry a payload, reading only their first pixels/samples/frames.
     
-    # Provide appropriate feedback
-    if key:
-        click.echo(f"Secret encrypted data encoded into {output}")
-        click.echo(f"Use the same key with decode-video to retrieve your message")
-    else:
-        click.echo(f"Secret data encoded into {output}")
+    Directories are searched recursively. Compact payloads are detected by
+    their frame header, legacy ones only when they were encrypted.
+    """
+    import json
+    import time
+    from .scan import scan as scan_files
+
+    started = time.perf_counter()
+    counts = {'files': 0, 'hits': 0, 'errors': 0}
+    for result in scan_files(paths, workers, verify):
+        counts['files'] += 1
+        counts['hits'] += result['hit']
+        counts['errors'] += 'error' in result
+        if as_json:
+            click.echo(json.dumps(result))
+        elif 'error' in result:
+            click.echo(f"[error] {result['path']}: {result['error']}")
+        elif result.get('verified') is False:
+            click.echo(f"[corrupt] {result['path']}: compact header found but the payload CRC32 does not match")
+        elif result['hit'] and result['format'] == 'compact':
+            details = f"{result['payload_bytes']} bytes, cipher {result['cipher']}, codec {result['codec']}"
+            click.echo(f"[hit] {result['path']}: compact payload, {details}" + (", passphrase" if result['kdf'] else ""))
+        elif result['hit']:
+            click.echo(f"[hit] {result['path']}: legacy encrypted payload")
+    seconds = time.perf_counter() - started
+    click.echo(f"Scanned {counts['files']} files in {seconds:.2f}s: {counts['hits']} with a payload, "
+               f"{counts['errors']} unreadable", err=as_json)
 
 @cli.command()
-@click.option('--input', '-i', required=True, help='Input video file')
-@click.option('--key', '-k', help='Encryption key (base64)')
-def decode_video(input, key):
-    """Decode a message from a video with advanced steganography."""
-    # Call the static method with the key parameter
-    secret_data = VideoStego.decode_video(input, key)
+@click.argument('paths', nargs=-1, required=True, type=click.Path(exists=True))
+@click.option('--db', envvar='STEGO_COVER_DB', default='covers.db', show_default=True, help='SQLite cover index')
+@click.option('--workers', '-w', type=int, help='Number of threads reading metadata and hashing files')
+def index(paths, db, workers):
+    """Record the capacity, format and content hash of every cover under PATHS.
     
-    click.echo(f"Decoded data: {secret_data}")
+    Only files added or modified since the last run are read again; covers
+    that were deleted are dropped from the index.
+    """
+    from .cover_index import CoverIndex
+
+    with CoverIndex(db) as covers:
+        counts = covers.update(paths, workers,
+                               on_error=lambda path, error: click.echo(f"[error] {path}: {error}"))
+        click.echo(f"Indexed {len(covers)} covers: {counts['added']} added, {counts['updated']} updated, "
+                   f"{counts['unchanged']} unchanged, {counts['removed']} removed, {counts['error']} failed")
+
+@cli.command('pick-cover')
+@click.option('--size', '-s', type=int, required=True, help='Payload size in bytes (before encryption)')
+@click.option('--db', envvar='STEGO_COVER_DB', default='covers.db', show_default=True, help='SQLite cover index')
+@click.option('--modality', '-m', type=click.Choice(['image', 'audio', 'video']), help='Only pick covers of this type')
+@click.option('--cipher', type=click.Choice(['aesgcm', 'fernet', 'none']), default='aesgcm', show_default=True, help='Cipher the payload will use')
+@click.option('--passphrase', 'uses_passphrase', is_flag=True, help='The key will be derived from a passphrase')
+@click.option('--order', type=click.Choice(['smallest', 'fastest']), default='smallest', show_default=True, help='Tightest fit, or least media to process')
+@click.option('--count', '-n', type=int, default=1, show_default=True, help='Number of covers to list')
+def pick_cover(size, db, modality, cipher, uses_passphrase, order, count):
+    """Pick an indexed cover that can hold a compact payload of the given size."""
+    from .cover_index import CoverIndex
+    from .payload import frame_size
+
+    needed = frame_size(size, cipher, uses_passphrase)
+    with CoverIndex(db) as covers:
+        picks = covers.pick(needed, modality, order, count)
+    if not picks:
+        raise click.ClickException(f"No indexed cover can hold {needed} bytes")
+    for cover in picks:
+        click.echo(f"{cover['path']}\t{cover['modality']}\t{cover['capacity']} bytes")
+
+@cli.command()
+@click.option('--socket', 'socket_path', help='Unix socket to listen on (default: $STEGO_SOCKET or a socket in the temp dir)')
+@click.option('--port', type=int, help='Listen on 127.0.0.1:PORT instead of a Unix socket (requests need the token, see $STEGO_TOKEN)')
+@click.option('--workers', '-w', type=int, help='Number of warm worker processes (default: CPU count)')
+def serve(socket_path, port, workers):
+    """Run a resident daemon that executes commands in warm worker processes."""
+    import asyncio
+    from . import daemon
+
+    try:
+        asyncio.run(daemon.serve(socket_path, port, workers,
+                                 ready=lambda address: click.echo(f"Listening on {address}")))
+    except RuntimeError as e:
+        raise click.ClickException(str(e))
+    except KeyboardInterrupt:
+        click.echo("Daemon stopped")
+
+@cli.command(context_settings=dict(ignore_unknown_options=True, allow_interspersed_args=False))
+@click.option('--socket', 'socket_path', help='Unix socket of the daemon')
+@click.option('--port', type=int, help='TCP port of the daemon on 127.0.0.1')
+@click.argument('args', nargs=-1, type=click.UNPROCESSED)
+def remote(socket_path, port, args):
+    """Run a command on a running daemon, e.g. `remote decode-image -i picture/encoded.png`."""
+    from . import daemon
+
+    try:
+        exit_code, output = daemon.request(args, socket_path, port)
+    except RuntimeError as e:
+        raise click.ClickException(str(e))
+    click.echo(output, nl=False)
+    if exit_code:
+        raise SystemExit(exit_code)
 
 if __name__ == '__main__':
     cli()
\ No newline at end of file
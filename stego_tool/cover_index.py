@@ -0,0 +1,164 @@
+# stego_tool/cover_index.py
+import hashlib
+import os
+import sqlite3
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from .utils import guess_modality, iter_media
+
+# A cover index is a SQLite file with one row per cover. Each row holds the
+# cover's capacity (largest compact frame in bytes), format, dimensions and a
+# SHA-256 of its contents. The capacity comes from the backends' `capacity`
+# methods, which only read metadata.
+#
+# `CoverIndex.update` re-reads only the files whose mtime or size changed
+# since the last run, and drops rows of files that disappeared. `pick`
+# answers "which cover fits N bytes" from the index alone.
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS covers (
+    path TEXT PRIMARY KEY,
+    modality TEXT NOT NULL,
+    format TEXT,
+    width INTEGER,
+    height INTEGER,
+    frames INTEGER,
+    channels INTEGER,
+    capacity INTEGER NOT NULL,
+    raw_bytes INTEGER NOT NULL,
+    size INTEGER NOT NULL,
+    mtime REAL NOT NULL,
+    sha256 TEXT NOT NULL,
+    indexed REAL NOT NULL
+);
+CREATE INDEX IF NOT EXISTS covers_by_capacity ON covers (modality, capacity);
+"""
+
+COLUMNS = ('path', 'modality', 'format', 'width', 'height', 'frames', 'channels',
+           'capacity', 'raw_bytes', 'size', 'mtime', 'sha256', 'indexed')
+
+# smallest: the tightest fit, so large covers stay free for large payloads.
+# fastest: the least decoded media to load and write back.
+ORDERS = {'smallest': 'capacity', 'fastest': 'raw_bytes'}
+
+
+def _file_hash(path):
+    digest = hashlib.sha256()
+    with open(path, 'rb') as f:
+        for chunk in iter(lambda: f.read(1 << 20), b''):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+def describe(path):
+    """Index row for one cover: its capacity metadata, file stats and content hash."""
+    from .image_stego import ImageStego
+    from .audio_stego import AudioStego
+    from .video_stego import VideoStego
+
+    backends = {'image': ImageStego, 'audio': AudioStego, 'video': VideoStego}
+    stat = os.stat(path)
+    info = backends[guess_modality(path)].capacity(path)
+    row = {column: info.get(column) for column in COLUMNS}
+    row.update(path=path, size=stat.st_size, mtime=stat.st_mtime, sha256=_file_hash(path),
+               indexed=time.time())
+    return row
+
+
+def _describe_or_error(path):
+    try:
+        return describe(path), None
+    except Exception as e:
+        return None, f"{type(e).__name__}: {e}"
+
+
+def _under(path, roots):
+    return any(path == root or path.startswith(root.rstrip(os.sep) + os.sep) for root in roots)
+
+
+class CoverIndex:
+    """A cover library's capacities, kept in a SQLite file."""
+
+    def __init__(self, db_path):
+        self.db_path = db_path
+        self.db = sqlite3.connect(db_path)
+        self.db.row_factory = sqlite3.Row
+        self.db.executescript(SCHEMA)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+    def close(self):
+        self.db.close()
+
+    def update(self, paths, workers=None, on_error=None):
+        """Index the covers under `paths` (files and/or directories).
+
+        Files whose mtime and size match their row are skipped. The others are
+        described in a thread pool. Rows of files under `paths` that no longer
+        exist are removed.
+
+        Args:
+            paths: Files and/or directories (searched recursively)
+            workers: Number of threads reading metadata and hashing files
+            on_error: Optional callback invoked with (path, error message)
+
+        Returns:
+            Counts of 'added', 'updated', 'unchanged', 'removed' and 'error' covers.
+        """
+        roots = [os.path.abspath(path) for path in paths]
+        known = {row['path']: (row['mtime'], row['size'])
+                 for row in self.db.execute('SELECT path, mtime, size FROM covers')}
+        seen = set()
+        changed = []
+        for path in iter_media(roots):
+            stat = os.stat(path)
+            seen.add(path)
+            if known.get(path) != (stat.st_mtime, stat.st_size):
+                changed.append(path)
+
+        counts = {'added': 0, 'updated': 0, 'unchanged': len(seen) - len(changed), 'removed': 0, 'error': 0}
+        insert = f"INSERT OR REPLACE INTO covers ({', '.join(COLUMNS)}) VALUES ({', '.join('?' * len(COLUMNS))})"
+        with ThreadPoolExecutor(max_workers=workers) as pool:
+            for path, (row, error) in zip(changed, pool.map(_describe_or_error, changed)):
+                if error:
+                    counts['error'] += 1
+                    if on_error:
+                        on_error(path, error)
+                    continue
+                self.db.execute(insert, [row[column] for column in COLUMNS])
+                counts['updated' if path in known else 'added'] += 1
+
+        removed = [(path,) for path in known if path not in seen and _under(path, roots)]
+        self.db.executemany('DELETE FROM covers WHERE path = ?', removed)
+        counts['removed'] = len(removed)
+        self.db.commit()
+        return counts
+
+    def pick(self, needed, modality=None, order='smallest', limit=1):
+        """Covers that hold a compact frame of `needed` bytes, best first.
+
+        Args:
+            needed: Frame size in bytes (see `payload.frame_size`)
+            modality: Only consider 'image', 'audio' or 'video' covers
+            order: 'smallest' (tightest fit) or 'fastest' (least media to process)
+            limit: Maximum number of covers returned
+
+        Returns:
+            A list of index rows as dicts.
+        """
+        query = 'SELECT * FROM covers WHERE capacity >= ?'
+        params = [needed]
+        if modality:
+            query += ' AND modality = ?'
+            params.append(modality)
+        query += f' ORDER BY {ORDERS[order]}, path LIMIT ?'
+        params.append(limit)
+        return [dict(row) for row in self.db.execute(query, params)]
+
+    def __len__(self):
+        return self.db.execute('SELECT COUNT(*) FROM covers').fetchone()[0]
@@ -0,0 +1,258 @@
+# stego_tool/daemon.py
+import contextlib
+import hmac
+import io
+import json
+import os
+import secrets
+import socket
+import stat
+import sys
+import tempfile
+
+# A resident service that keeps worker processes with every backend imported.
+# Clients send one JSON line per request and receive one JSON line back:
+#
+#   -> {"argv": ["decode-image", "-i", "picture/encoded.png"], "cwd": "/work", "env": {...}}
+#   <- {"exit_code": 0, "output": "Decoded data: ..."}
+#
+# Requests run with the daemon's file permissions, so only its owner may
+# send them. The Unix socket is created mode 0600. Any local user can
+# connect to a TCP port, so in TCP mode every request also carries a
+# "token": STEGO_TOKEN, or a random one the daemon writes to TOKEN_FILE
+# (mode 0600) for clients to read.
+#
+# `argv` uses the normal CLI syntax. The client half of this module only needs
+# the standard library, so it starts without loading OpenCV, pydub or NumPy;
+# asyncio and multiprocessing are only imported by the server half.
+
+DEFAULT_SOCKET = os.environ.get('STEGO_SOCKET') or os.path.join(tempfile.gettempdir(), 'stego-tools.sock')
+TOKEN_FILE = os.environ.get('STEGO_TOKEN_FILE') or os.path.join(os.path.expanduser('~'), '.stego-tools.token')
+FORWARDED_ENV = ('STEGO_PASSPHRASE',)
+LOCAL_COMMANDS = ('serve', 'remote')
+
+
+def _init_worker():
+    """Import the CLI and every backend once per worker process."""
+    from . import cli, image_stego, audio_stego, video_stego  # noqa: F401
+
+
+def _ping():
+    return os.getpid()
+
+
+def run_cli(argv, cwd=None, env=None):
+    """Run one CLI invocation in this process and capture its output.
+
+    Returns:
+        (exit_code, output)
+    """
+    import click
+    from .cli import cli
+
+    output = io.StringIO()
+    previous_cwd = os.getcwd()
+    previous_env = {name: os.environ.get(name) for name in FORWARDED_ENV}
+    try:
+        if cwd:
+            os.chdir(cwd)
+        for name in FORWARDED_ENV:
+            os.environ.pop(name, None)
+            if env and env.get(name) is not None:
+                os.environ[name] = env[name]
+        with contextlib.redirect_stdout(output), contextlib.redirect_stderr(output):
+            try:
+                result = cli.main(args=list(argv), prog_name='main.py', standalone_mode=False)
+                exit_code = result if isinstance(result, int) else 0
+            except click.ClickException as e:
+                e.show()
+                exit_code = e.exit_code
+            except click.Abort:
+                exit_code = 1
+            except SystemExit as e:
+                # sys.exit() semantics: None is success, a string is printed and fails
+                if e.code is None or isinstance(e.code, int):
+                    exit_code = e.code or 0
+                else:
+                    print(e.code)
+                    exit_code = 1
+            except Exception as e:
+                print(f"Error: {type(e).__name__}: {e}")
+                exit_code = 1
+    finally:
+        os.chdir(previous_cwd)
+        for name, value in previous_env.items():
+            if value is None:
+                os.environ.pop(name, None)
+            else:
+                os.environ[name] = value
+    return exit_code, output.getvalue()
+
+
+async def _handle(reader, writer, pool, token=None):
+    import asyncio
+
+    loop = asyncio.get_running_loop()
+    try:
+        while True:
+            line = await reader.readline()
+            if not line:
+                break
+            try:
+                request = json.loads(line)
+                argv = list(request.get('argv', []))
+            except ValueError as e:
+                response = {'exit_code': 2, 'output': f"Error: malformed request: {e}\n"}
+            else:
+                if token is not None and not hmac.compare_digest(str(request.get('token', '')).encode(),
+                                                                 token.encode()):
+                    writer.write(json.dumps({'exit_code': 2, 'output': "Error: invalid daemon token\n"}).encode()
+                                 + b'\n')
+                    await writer.drain()
+                    break
+                if argv and argv[0] in LOCAL_COMMANDS:
+                    response = {'exit_code': 2, 'output': f"Error: '{argv[0]}' cannot run inside the daemon\n"}
+                else:
+                    try:
+                        exit_code, output = await loop.run_in_executor(
+                            pool, run_cli, argv, request.get('cwd'), request.get('env'))
+                    except Exception as e:
+                        # One request must never bring the daemon down
+                        exit_code, output = 1, f"Error: {type(e).__name__}: {e}\n"
+                    response = {'exit_code': exit_code, 'output': output}
+            writer.write(json.dumps(response).encode() + b'\n')
+            await writer.drain()
+    finally:
+        writer.close()
+
+
+def _remove_stale_socket(socket_path):
+    """Remove a socket left behind by a daemon that is gone; refuse to touch anything else."""
+    try:
+        mode = os.lstat(socket_path).st_mode
+    except FileNotFoundError:
+        return
+    if not stat.S_ISSOCK(mode):
+        raise RuntimeError(f"{socket_path} exists and is not a socket")
+    probe = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+    try:
+        probe.connect(socket_path)
+    except (ConnectionRefusedError, FileNotFoundError):
+        os.remove(socket_path)
+    else:
+        raise RuntimeError(f"A daemon is already listening on {socket_path}")
+    finally:
+        probe.close()
+
+
+def _write_token(token):
+    """Write the TCP token to TOKEN_FILE, readable by its owner only."""
+    fd = os.open(TOKEN_FILE, os.O_WRONLY | os.O_CREAT | os.O_TRUNC, 0o600)
+    os.fchmod(fd, 0o600)
+    with os.fdopen(fd, 'w') as f:
+        f.write(token)
+
+
+def _read_token():
+    token = os.environ.get('STEGO_TOKEN')
+    if token:
+        return token
+    try:
+        with open(TOKEN_FILE) as f:
+            return f.read().strip()
+    except FileNotFoundError:
+        raise RuntimeError(f"No daemon token: set STEGO_TOKEN or start the daemon to write {TOKEN_FILE}") from None
+
+
+async def serve(socket_path=None, port=None, workers=None, ready=None):
+    """Serve CLI requests until cancelled.
+
+    Args:
+        socket_path: Unix socket to listen on (default: DEFAULT_SOCKET)
+        port: Listen on 127.0.0.1:port instead of a Unix socket; requests
+            must then carry the token (STEGO_TOKEN, or a random one written
+            to TOKEN_FILE)
+        workers: Number of worker processes (default: CPU count)
+        ready: Optional callback invoked with the listening address
+
+    Raises RuntimeError if something other than a stale socket is in the way.
+    """
+    import asyncio
+    from concurrent.futures import ProcessPoolExecutor
+
+    workers = workers or os.cpu_count() or 1
+    if port is None:
+        socket_path = socket_path or DEFAULT_SOCKET
+        _remove_stale_socket(socket_path)
+    with ProcessPoolExecutor(max_workers=workers, initializer=_init_worker) as pool:
+        # Start every worker up front so the first requests are already warm
+        loop = asyncio.get_running_loop()
+        await asyncio.gather(*(loop.run_in_executor(pool, _ping) for _ in range(workers)))
+
+        token = None
+        if port is not None:
+            token = os.environ.get('STEGO_TOKEN')
+            if not token:
+                token = secrets.token_urlsafe(32)
+                _write_token(token)
+            handler = lambda reader, writer: _handle(reader, writer, pool, token)
+            server = await asyncio.start_server(handler, '127.0.0.1', port)
+            address = f"127.0.0.1:{port}"
+        else:
+            handler = lambda reader, writer: _handle(reader, writer, pool)
+            # Created 0600 from the start, so no one else can connect in between
+            umask = os.umask(0o177)
+            try:
+                server = await asyncio.start_unix_server(handler, socket_path)
+            finally:
+                os.umask(umask)
+            os.chmod(socket_path, 0o600)
+            address = socket_path
+        if ready:
+            ready(address)
+        try:
+            async with server:
+                await server.serve_forever()
+        finally:
+            if port is None and os.path.exists(socket_path):
+                os.remove(socket_path)
+            elif token is not None and not os.environ.get('STEGO_TOKEN') and os.path.exists(TOKEN_FILE):
+                os.remove(TOKEN_FILE)
+
+
+def request(argv, socket_path=None, port=None):
+    """Send one CLI invocation to a running daemon.
+
+    Returns:
+        (exit_code, output)
+    """
+    if port is not None:
+        conn = socket.create_connection(('127.0.0.1', port))
+    else:
+        conn = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        conn.connect(socket_path or DEFAULT_SOCKET)
+    payload = {
+        'argv': list(argv),
+        'cwd': os.getcwd(),
+        'env': {name: os.environ[name] for name in FORWARDED_ENV if name in os.environ},
+    }
+    if port is not None:
+        payload['token'] = _read_token()
+    with conn, conn.makefile('rwb') as stream:
+        stream.write(json.dumps(payload).encode() + b'\n')
+        stream.flush()
+        response = json.loads(stream.readline())
+    return response['exit_code'], response['output']
+
+
+def main(argv=None):
+    """Thin client: `python -m stego_tool.daemon decode-image -i picture/encoded.png`."""
+    argv = sys.argv[1:] if argv is None else argv
+    port = os.environ.get('STEGO_PORT')
+    exit_code, output = request(argv, port=int(port) if port else None)
+    sys.stdout.write(output)
+    return exit_code
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,45 @@
+# stego_tool/dispatch.py
+from .utils import detect_modality
+
+# One decode entry point for every media type. The backend is picked from
+# the first bytes of the file (magic numbers and container headers, see
+# utils.sniff_modality), so a file is only ever loaded by the backend that
+# can read it, whatever its extension. Files with an unrecognised header
+# fall back to their extension.
+
+
+def backend_for(modality):
+    """The backend class for 'image', 'audio' or 'video', imported on first use."""
+    if modality == 'image':
+        from .image_stego import ImageStego
+        return ImageStego
+    if modality == 'audio':
+        from .audio_stego import AudioStego
+        return AudioStego
+    if modality == 'video':
+        from .video_stego import VideoStego
+        return VideoStego
+    raise ValueError(f"Unknown modality: {modality}")
+
+
+def decode(source, key=None, passphrase=None, output=None, yuv=False, modality=None):
+    """Decode a payload from an image, audio or video file, whichever it is.
+
+    Args:
+        source: Path or binary file object (videos must be paths)
+        key, passphrase: As for the backends' decode methods
+        output: Write the payload to this path or file object instead
+            (the backends' decode_to_file)
+        yuv: Read videos through ffmpeg's YUV path (ignored for images and audio)
+        modality: Skip detection and use this backend
+
+    Returns:
+        The decoded message, as decode_image/decode_audio/decode_video return
+        it, or the number of bytes written to `output`.
+    """
+    modality = modality or detect_modality(source)
+    backend = backend_for(modality)
+    extra = {'yuv': yuv} if modality == 'video' else {}
+    if output is not None:
+        return backend.decode_to_file(source, output, key, passphrase, **extra)
+    return getattr(backend, f'decode_{modality}')(source, key, passphrase, **extra)
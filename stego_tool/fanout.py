@@ -0,0 +1,112 @@
+# stego_tool/fanout.py
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+import numpy as np
+from PIL import Image
+from pydub import AudioSegment
+
+from . import kdf, metrics
+from .payload import build_frame
+from .png import write_png
+from .stream import FrameEncoder, embed_frame_lsb, is_stream
+from .utils import guess_modality
+
+# Lossless formats a variant may be written in, per cover modality
+OUTPUT_EXTENSIONS = {'image': ('.png', '.bmp', '.tif', '.tiff'), 'audio': ('.wav',)}
+
+
+class FanOut:
+    """Encode many payloads into one cover that is decoded only once.
+
+    The decoded cover stays pinned in memory, read-only. Every worker thread
+    keeps a private copy of it; a variant only patches the payload region of
+    that copy, writes the output file and restores the region from the cover.
+    """
+
+    def __init__(self, cover_path, modality=None):
+        self.modality = modality or guess_modality(cover_path)
+        if self.modality == 'image':
+            self.carrier = np.array(Image.open(cover_path).convert('RGB'), dtype=np.uint8)
+        elif self.modality == 'audio':
+            self.audio = AudioSegment.from_file(cover_path)
+            self.carrier = np.array(self.audio.get_array_of_samples())
+        else:
+            raise ValueError(f"Fan-out supports image and audio covers, not {self.modality}")
+        self.carrier.flags.writeable = False
+        self._local = threading.local()
+
+    @metrics.operation('fanout', 'encode')
+    def encode(self, payload, output_path, key=None, cipher='aesgcm', compression=None, level=None,
+               passphrase=None, salt=None):
+        """Write one variant of the cover carrying `payload`; return the output path.
+
+        `payload` may also be a binary file object or an iterator of bytes chunks,
+        which is streamed into the carrier. Raises ValueError if `output_path`
+        is not a lossless file of the cover's modality (see OUTPUT_EXTENSIONS).
+        """
+        self._check_output(output_path)
+        buffer = getattr(self._local, 'buffer', None)
+        if buffer is None:
+            buffer = self._local.buffer = self.carrier.copy()
+        flat = buffer.reshape(-1)
+        if is_stream(payload):
+            frame = FrameEncoder(payload, key, cipher, compression, level, passphrase, salt)
+        else:
+            frame = build_frame(payload, key, cipher, compression, level, passphrase, salt)
+        try:
+            end = embed_frame_lsb(flat, frame)
+        except ValueError:
+            # A payload too large for the cover may have patched part of it already
+            flat[:] = self.carrier.reshape(-1)
+            raise
+        try:
+            with metrics.stage('write'):
+                return self._write(buffer, output_path)
+        finally:
+            # Restore the patched region so the buffer matches the cover again
+            flat[:end] = self.carrier.reshape(-1)[:end]
+
+    def encode_many(self, jobs, workers=None, passphrase=None, salt=None, **options):
+        """Encode every (output_path, payload) job, writing outputs in parallel.
+
+        With a passphrase and no salt, one random salt is shared by the whole
+        run so the key is derived only once.
+
+        Raises ValueError if an output path does not suit the cover, before
+        any variant is written.
+
+        Returns:
+            The output paths, in job order.
+        """
+        jobs = list(jobs)
+        for output_path, _ in jobs:
+            self._check_output(output_path)
+        if passphrase and salt is None:
+            salt = kdf.generate_salt()
+        with ThreadPoolExecutor(max_workers=workers) as pool:
+            futures = [pool.submit(self.encode, payload, output_path, passphrase=passphrase,
+                                   salt=salt, **options)
+                       for output_path, payload in jobs]
+            return [future.result() for future in futures]
+
+    def _check_output(self, output_path):
+        """Raise ValueError unless `output_path` names a lossless file of the cover's modality."""
+        if not output_path.lower().endswith(OUTPUT_EXTENSIONS[self.modality]):
+            raise ValueError(f"Output {output_path} is not an {self.modality} path "
+                             f"({', '.join(OUTPUT_EXTENSIONS[self.modality])})")
+
+    def _write(self, buffer, output_path):
+        if self.modality == 'image':
+            if output_path.lower().endswith('.png'):
+                write_png(buffer, output_path)
+            else:
+                Image.fromarray(buffer).save(output_path)
+        else:
+            AudioSegment(
+                buffer.tobytes(),
+                frame_rate=self.audio.frame_rate,
+                sample_width=self.audio.sample_width,
+                channels=self.audio.channels
+            ).export(output_path, format='wav')
+        return output_path
@@ -1,164 +1,425 @@
-from PIL import Image
-import numpy as np
-from cryptography.fernet import Fernet
-import base64
-import re
-
-class ImageStego:
-    @staticmethod
-    def generate_key():
-        """Generate a Fernet encryption key."""
-        return Fernet.generate_key()
-        
-    @staticmethod
-    def encode_image(image_path, secret_data, output_path, key=None):
-        img = Image.open(image_path)
-        img = img.convert('RGB')
-        pixels = np.array(img, dtype=np.uint8)  # Ensure pixels are uint8
-        
-        # Encrypt the message if a key is provided
-        original_data = secret_data
-        if key:
-            try:
-                # Convert string key to bytes if needed
-                if isinstance(key, str):
-                    key = key.encode()
-                
-                # Initialize Fernet with the key
-                fernet = Fernet(key)
-                
-                # Encrypt the message
-                if isinstance(secret_data, str):
-                    secret_data = secret_data.encode()
-                encrypted_data = fernet.encrypt(secret_data)
-                
-                # Convert to base64 string for encoding
-                secret_data = base64.b64encode(encrypted_data).decode()
-                print(f"Message encrypted using Fernet (length: {len(secret_data)} characters)")
-            except Exception as e:
-                print(f"Encryption error: {str(e)}. Proceeding with plaintext.")
-                secret_data = original_data  # Revert to original data on error
-        
-        # Add a termination marker to the secret data
-        secret_data += '\x00\x00'
-        binary_data = ''.join(format(ord(char), '08b') for char in secret_data)
-        data_len = len(binary_data)
-        
-        idx = 0
-        for i in range(pixels.shape[0]):
-            for j in range(pixels.shape[1]):
-                for k in range(3):  # RGB channels
-                    if idx < data_len:
-                        # Clear the LSB and set it to the binary data bit
-                        pixels[i, j, k] = (pixels[i, j, k] & 0xFE) | int(binary_data[idx])
-                        idx += 1
-                    else:
-                        break
-                else:
-                    continue
-                break
-            else:
-                continue
-            break
-        
-        # Ensure the output path has a proper extension
-        if not output_path.lower().endswith(('.png', '.jpg', '.jpeg', '.bmp', '.tiff')):
-            # Default to PNG format for best quality without compression artifacts
-            output_path = output_path + '.png'
-            
-        encoded_img = Image.fromarray(pixels)
-        encoded_img.save(output_path)
-        print(f"Data encoded and saved to {output_path}")
-        print(f"To decode this image, run: python main.py decode-image -i {output_path}" + 
-              (f" -k \"{key.decode() if isinstance(key, bytes) else key}\"" if key else ""))
-
-    @staticmethod
-    def decode_image(image_path, key=None):
-        img = Image.open(image_path)
-        img = img.convert('RGB')
-        pixels = np.array(img, dtype=np.uint8)
-        
-        binary_data = ''
-        for i in range(pixels.shape[0]):
-            for j in range(pixels.shape[1]):
-                for k in range(3):  # RGB channels
-                    # Extract the LSB
-                    binary_data += str(pixels[i, j, k] & 1)
-                    # Check for the termination marker every 16 bits (2 bytes)
-                    if len(binary_data) >= 16:
-                        # Convert the last 16 bits to characters
-                        last_chars = ''.join(chr(int(binary_data[m:m+8], 2)) for m in range(len(binary_data)-16, len(binary_data), 8))
-                        if last_chars == '\x00\x00':
-                            # Remove the termination marker and return the decoded data
-                            extracted_message = ''.join(chr(int(binary_data[n:n+8], 2)) for n in range(0, len(binary_data)-16, 8))
-                            
-                            # Try to decrypt the message if a key was provided
-                            if key and extracted_message:
-                                try:
-                                    # Convert string key to bytes if needed
-                                    if isinstance(key, str):
-                                        key = key.encode()
-                                    
-                                    # Initialize Fernet with the key
-                                    fernet = Fernet(key)
-                                    
-                                    # Prepare for base64 decoding
-                                    # Fix padding issues
-                                    extracted_message = ImageStego._fix_base64_padding(extracted_message)
-                                    
-                                    # Decode base64 and decrypt
-                                    encrypted_data = base64.b64decode(extracted_message)
-                                    decrypted_data = fernet.decrypt(encrypted_data)
-                                    
-                                    # Convert to string
-                                    if isinstance(decrypted_data, bytes):
-                                        extracted_message = decrypted_data.decode()
-                                        
-                                    print(f"Message successfully decrypted using Fernet")
-                                except Exception as e:
-                                    print(f"Decryption error: {str(e)}. Returning raw extracted data.")
-                            
-                            return extracted_message
-        
-        # If no termination marker is found, return all decoded data
-        extracted_message = ''.join(chr(int(binary_data[m:m+8], 2)) for m in range(0, len(binary_data), 8))
-        
-        # Try to decrypt the message if a key was provided
-        if key and extracted_message:
-            try:
-                # Convert string key to bytes if needed
-                if isinstance(key, str):
-                    key = key.encode()
-                
-                # Initialize Fernet with the key
-                fernet = Fernet(key)
-                
-                # Prepare for base64 decoding
-                extracted_message = ImageStego._fix_base64_padding(extracted_message)
-                
-                # Decode base64 and decrypt
-                encrypted_data = base64.b64decode(extracted_message)
-                decrypted_data = fernet.decrypt(encrypted_data)
-                
-                # Convert to string
-                if isinstance(decrypted_data, bytes):
-                    extracted_message = decrypted_data.decode()
-                    
-                print(f"Message successfully decrypted using Fernet")
-            except Exception as e:
-                print(f"Decryption error: {str(e)}. Returning raw extracted data.")
-                
-        return extracted_message
-        
-    @staticmethod
-    def _fix_base64_padding(data):
-        """Fix base64 padding issues by ensuring proper length."""
-        # Remove non-base64 characters
-        data = re.sub(r'[^A-Za-z0-9+/=]', '', data)
-        
-        # Add padding if needed
-        padding_needed = len(data) % 4
-        if padding_needed:
-            data += '=' * (4 - padding_needed)
-            
+from PIL import Image
+import numpy as np
+from cryptography.fernet import Fernet
+import base64
+import io
+import re
+from . import jpeg, metrics, multiframe
+from .png import write_png
+from .payload import build_frame, extract_frame_lsb, open_frame
+from .stream import FrameEncoder, atomic_output, embed_frame_lsb, extract_frame_lsb_to, is_stream
+
+class ImageStego:
+    @staticmethod
+    def generate_key():
+        """Generate a Fernet encryption key."""
+        return Fernet.generate_key()
+        
+    @staticmethod
+    def capacity(image_path):
+        """Describe a cover image without decoding its pixels.
+        
+        Returns a dict with the format, mode, dimensions and frame count,
+        `raw_bytes` (size of the decoded RGB pixels of all frames) and
+        `capacity`: the largest compact frame, in bytes, the image can hold in
+        its own format.
+        """
+        with Image.open(image_path) as img:
+            width, height = img.size
+            frames = multiframe.frame_count(img)
+            info = {'modality': 'image', 'format': img.format, 'mode': img.mode,
+                    'width': width, 'height': height, 'frames': frames}
+            info['raw_bytes'] = width * height * 3 * frames
+            if multiframe.is_multiframe(img):
+                info['capacity'] = multiframe.capacity(img)
+                return info
+        # Covers are converted to RGB before embedding, one bit per channel value
+        info['capacity'] = info['raw_bytes'] // 8
+        return info
+        
+    @staticmethod
+    @metrics.operation('image', 'encode')
+    def encode_image(image_path, secret_data, output_path, key=None, compact=False, cipher='aesgcm',
+                     compression=None, level=None, passphrase=None, salt=None, quality=None,
+                     png_options=None):
+        """Hide a message in an image file.
+        
+        A .jpg/.jpeg output embeds in DCT coefficients at `quality` (see the
+        jpeg module). A .gif output, or a TIFF/PNG output of a multi-frame
+        cover, spreads the payload across frames (see the multiframe module).
+        PNG outputs are written by `png.write_png`, which takes `png_options`
+        (level, filter, strategy, threads).
+        """
+        with metrics.stage('load'):
+            img = Image.open(image_path)
+            img.load()
+        format = None if ImageStego._is_jpeg(output_path, quality) else multiframe.output_format(img, output_path)
+        if format:
+            return ImageStego._encode_frames(img, secret_data, output_path, format, key, cipher,
+                                             compression, level, passphrase, salt)
+        with metrics.stage('convert'):
+            img = img.convert('RGB')
+            pixels = np.array(img, dtype=np.uint8)  # Ensure pixels are uint8
+        
+        if ImageStego._is_jpeg(output_path, quality):
+            return ImageStego._encode_jpeg(pixels, secret_data, output_path, key, cipher, compression,
+                                           level, passphrase, salt, quality)
+        
+        if compact or compression or passphrase or is_stream(secret_data):
+            # Compact mode: raw ciphertext inside a binary frame, no base64
+            if is_stream(secret_data):
+                # Files and iterators are framed chunk by chunk while they are embedded
+                frame = FrameEncoder(secret_data, key, cipher, compression, level, passphrase, salt)
+            else:
+                frame = build_frame(secret_data, key, cipher, compression, level, passphrase, salt)
+                print(f"Payload framed in compact mode (length: {len(frame)} bytes)")
+            try:
+                embed_frame_lsb(pixels.reshape(-1), frame)
+            except ValueError as e:
+                print(f"Error: {str(e)}")
+                return
+            if is_stream(secret_data):
+                print(f"Payload streamed in compact mode (length: {frame.size} bytes)")
+        else:
+            ImageStego._embed_legacy(pixels, secret_data, key)
+
+        if hasattr(output_path, 'write'):
+            # Output streams (e.g. stdout) always get a PNG
+            with metrics.stage('write'):
+                write_png(pixels, output_path, **(png_options or {}))
+            print("Data encoded and written to the output stream")
+            return output_path
+
+        # Ensure the output path has a proper extension
+        if not output_path.lower().endswith(('.png', '.jpg', '.jpeg', '.bmp', '.tiff', '.tif')):
+            # Default to PNG format for best quality without compression artifacts
+            output_path = output_path + '.png'
+            
+        with metrics.stage('write'):
+            if output_path.lower().endswith('.png'):
+                write_png(pixels, output_path, **(png_options or {}))
+            else:
+                Image.fromarray(pixels).save(output_path)
+        print(f"Data encoded and saved to {output_path}")
+        print(f"To decode this image, run: python main.py decode-image -i {output_path}" + 
+              (f" -k \"{key.decode() if isinstance(key, bytes) else key}\"" if key else ""))
+        return output_path
+
+    @staticmethod
+    def _is_jpeg(output_path, quality):
+        """Whether an output gets a JPEG: .jpg/.jpeg paths, or a stream with a quality given."""
+        if hasattr(output_path, 'write'):
+            return quality is not None
+        return output_path.lower().endswith(('.jpg', '.jpeg'))
+
+    @staticmethod
+    def _frame_bytes(payload, key, cipher, compression, level, passphrase, salt):
+        """The whole compact frame of a payload, for carriers that are not written LSB by LSB."""
+        if is_stream(payload):
+            return FrameEncoder(payload, key, cipher, compression, level, passphrase, salt).to_bytes()
+        return build_frame(payload, key, cipher, compression, level, passphrase, salt)
+
+    @staticmethod
+    def _encode_jpeg(pixels, secret_data, output_path, key, cipher, compression, level, passphrase,
+                     salt, quality):
+        """Write a JPEG with the payload in its DCT coefficients (always a compact frame)."""
+        quality = quality or jpeg.DEFAULT_QUALITY
+        frame = ImageStego._frame_bytes(secret_data, key, cipher, compression, level, passphrase, salt)
+        print(f"Payload framed in compact mode (length: {len(frame)} bytes)")
+        try:
+            with metrics.stage('embed'):
+                data = jpeg.encode(pixels, frame, quality)
+        except ValueError as e:
+            print(f"Error: {str(e)}")
+            return
+        with metrics.stage('write'):
+            if hasattr(output_path, 'write'):
+                output_path.write(data)
+            else:
+                with open(output_path, 'wb') as f:
+                    f.write(data)
+        print(f"Data encoded into a JPEG at quality {quality} and saved to "
+              f"{output_path if isinstance(output_path, str) else 'the output stream'}")
+        return output_path
+
+    @staticmethod
+    def _encode_frames(img, secret_data, output_path, format, key, cipher, compression, level,
+                       passphrase, salt):
+        """Write a TIFF, APNG or GIF with the payload spread across its frames (always a compact frame)."""
+        frame = ImageStego._frame_bytes(secret_data, key, cipher, compression, level, passphrase, salt)
+        print(f"Payload framed in compact mode (length: {len(frame)} bytes)")
+        try:
+            with metrics.stage('embed'):
+                multiframe.encode(img, frame, output_path, format)
+        except ValueError as e:
+            print(f"Error: {str(e)}")
+            return
+        print(f"Data encoded across {multiframe.frame_count(img)} frame(s) of a {format} and saved to "
+              f"{output_path if isinstance(output_path, str) else 'the output stream'}")
+        return output_path
+
+    @staticmethod
+    def _carrier_frame(img):
+        """The payload frame of an opened JPEG (DCT coefficients) or multi-frame image, or None.
+
+        Must be called before the image is loaded. Other images return None.
+        """
+        if img.format == 'JPEG':
+            with metrics.stage('extract'):
+                return jpeg.extract_frame(img)
+        if multiframe.is_multiframe(img):
+            with metrics.stage('extract'):
+                frame = multiframe.extract_frame(img)
+            # Anything else is read from the first frame
+            img.seek(0)
+            return frame
+        return None
+
+    @staticmethod
+    def _embed_legacy(pixels, secret_data, key):
+        """Hide a message as base64 text with a null terminator (original format)."""
+        # Encrypt the message if a key is provided
+        original_data = secret_data
+        if key:
+            try:
+                # Convert string key to bytes if needed
+                if isinstance(key, str):
+                    key = key.encode()
+                
+                # Initialize Fernet with the key
+                fernet = Fernet(key)
+                
+                # Encrypt the message
+                if isinstance(secret_data, str):
+                    secret_data = secret_data.encode()
+                with metrics.stage('encrypt'):
+                    encrypted_data = fernet.encrypt(secret_data)
+                    # Convert to base64 string for encoding
+                    secret_data = base64.b64encode(encrypted_data).decode()
+                print(f"Message encrypted using Fernet (length: {len(secret_data)} characters)")
+            except Exception as e:
+                print(f"Encryption error: {str(e)}. Proceeding with plaintext.")
+                secret_data = original_data  # Revert to original data on error
+        
+        # Add a termination marker to the secret data
+        secret_data += '\x00\x00'
+        binary_data = ''.join(format(ord(char), '08b') for char in secret_data)
+        
+        # Clear the LSBs of the first pixels (row by row, RGB order) and set the data bits.
+        # Anything beyond the image capacity is dropped, as before.
+        flat = pixels.reshape(-1)
+        with metrics.stage('embed'):
+            bits = np.frombuffer(binary_data.encode('ascii'), dtype=np.uint8)[:flat.size] - ord('0')
+            flat[:len(bits)] = (flat[:len(bits)] & 0xFE) | bits
+
+    @staticmethod
+    @metrics.operation('image', 'decode')
+    def decode_image(image_path, key=None, passphrase=None):
+        with metrics.stage('load'):
+            img = Image.open(image_path)
+            frame = ImageStego._carrier_frame(img)
+            if frame is not None:
+                return ImageStego._open_compact(frame, key, passphrase)
+            img.load()
+        with metrics.stage('convert'):
+            img = img.convert('RGB')
+            pixels = np.array(img, dtype=np.uint8)
+        
+        # Images written in compact mode start with a binary payload frame
+        with metrics.stage('extract'):
+            frame = extract_frame_lsb(pixels.reshape(-1))
+        if frame is not None:
+            return ImageStego._open_compact(frame, key, passphrase)
+        
+        with metrics.stage('extract'):
+            extracted_message = ImageStego._extract_legacy(pixels.reshape(-1)).decode('latin-1')
+        
+        # Try to decrypt the message if a key was provided
+        if key and extracted_message:
+            try:
+                with metrics.stage('decrypt'):
+                    extracted_message = ImageStego._decrypt_legacy(extracted_message, key).decode()
+                print(f"Message successfully decrypted using Fernet")
+            except Exception as e:
+                print(f"Decryption error: {str(e)}. Returning raw extracted data.")
+                
+        return extracted_message
+        
+    @staticmethod
+    @metrics.operation('image', 'encode')
+    def encode_array(pixels, payload, key=None, cipher='aesgcm', compression=None, level=None,
+                     passphrase=None, salt=None):
+        """Hide a payload in a pixel array and return the modified copy.
+        
+        Works entirely in memory with no file I/O or console output. The payload
+        is always written as a compact frame.
+        
+        Args:
+            pixels: uint8 array, e.g. HxWx3 RGB
+            payload: Message as str or bytes, or a binary file object or iterator
+                of bytes chunks to stream
+            key, cipher, compression, level, passphrase, salt: See `build_frame`
+        """
+        pixels = np.array(pixels, dtype=np.uint8)
+        if is_stream(payload):
+            frame = FrameEncoder(payload, key, cipher, compression, level, passphrase, salt)
+        else:
+            frame = build_frame(payload, key, cipher, compression, level, passphrase, salt)
+        embed_frame_lsb(pixels.reshape(-1), frame)
+        return pixels
+        
+    @staticmethod
+    @metrics.operation('image', 'decode')
+    def decode_array(pixels, key=None, passphrase=None):
+        """Recover the payload bytes hidden in a pixel array.
+        
+        Reads compact frames as well as the original base64 format. Raises
+        ValueError (or a cryptography exception) if the payload cannot be decrypted.
+        """
+        flat = np.ascontiguousarray(pixels, dtype=np.uint8).reshape(-1)
+        with metrics.stage('extract'):
+            frame = extract_frame_lsb(flat)
+        if frame is not None:
+            return open_frame(frame, key, passphrase)
+        with metrics.stage('extract'):
+            message = ImageStego._extract_legacy(flat)
+        if key and message:
+            with metrics.stage('decrypt'):
+                return ImageStego._decrypt_legacy(message.decode('latin-1'), key)
+        return message
+        
+    @staticmethod
+    @metrics.operation('image', 'encode')
+    def encode_bytes(image, payload, key=None, cipher='aesgcm', compression=None, level=None,
+                     passphrase=None, salt=None, format='PNG', quality=None, png_options=None):
+        """Hide a payload in an encoded image and return the new image file as bytes.
+        
+        Args:
+            image: Image file contents as bytes, or a readable file-like object
+            payload: Message as str or bytes, or a binary file object or iterator to stream
+            format: Output format understood by Pillow (lossless), or 'JPEG' to
+                embed in the DCT coefficients instead of the pixels. 'GIF', and
+                'TIFF' or 'PNG' for a multi-frame cover, spread the payload
+                across frames
+            quality: JPEG quality, 1-100 (default 85)
+            png_options: Options for `png.write_png` (level, filter, strategy, threads)
+        """
+        if isinstance(image, (bytes, bytearray, memoryview)):
+            image = io.BytesIO(image)
+        with metrics.stage('load'):
+            img = Image.open(image)
+            img.load()
+        if format.upper() == 'GIF' or (format.upper() in ('TIFF', 'PNG') and multiframe.frame_count(img) > 1):
+            frame = ImageStego._frame_bytes(payload, key, cipher, compression, level, passphrase, salt)
+            buffer = io.BytesIO()
+            with metrics.stage('embed'):
+                multiframe.encode(img, frame, buffer, format.upper())
+            return buffer.getvalue()
+        with metrics.stage('convert'):
+            pixels = np.array(img.convert('RGB'), dtype=np.uint8)
+        if format.upper() in ('JPEG', 'JPG'):
+            frame = ImageStego._frame_bytes(payload, key, cipher, compression, level, passphrase, salt)
+            with metrics.stage('embed'):
+                return jpeg.encode(pixels, frame, quality or jpeg.DEFAULT_QUALITY)
+        pixels = ImageStego.encode_array(pixels, payload, key, cipher, compression, level, passphrase, salt)
+        buffer = io.BytesIO()
+        with metrics.stage('write'):
+            if format.upper() == 'PNG':
+                write_png(pixels, buffer, **(png_options or {}))
+            else:
+                Image.fromarray(pixels).save(buffer, format=format)
+        return buffer.getvalue()
+        
+    @staticmethod
+    @metrics.operation('image', 'decode')
+    def decode_bytes(image, key=None, passphrase=None):
+        """Recover the payload bytes from image file contents or a file-like object."""
+        if isinstance(image, (bytes, bytearray, memoryview)):
+            image = io.BytesIO(image)
+        with metrics.stage('load'):
+            img = Image.open(image)
+            frame = ImageStego._carrier_frame(img)
+            if frame is not None:
+                return open_frame(frame, key, passphrase)
+            pixels = np.array(img.convert('RGB'), dtype=np.uint8)
+        return ImageStego.decode_array(pixels, key, passphrase)
+        
+    @staticmethod
+    @metrics.operation('image', 'decode')
+    def decode_to_file(image_path, output_path, key=None, passphrase=None):
+        """Write the payload hidden in an image to a file and return its size in bytes.
+        
+        Compact payloads are streamed through decryption and decompression, and
+        the file only appears once the payload has been verified. Raises
+        ValueError (or a cryptography exception) if it cannot be read.
+        """
+        with metrics.stage('load'):
+            img = Image.open(image_path)
+            frame = ImageStego._carrier_frame(img)
+            if frame is not None:
+                # JPEG carriers are read in one pass; the frame is then decoded in full
+                with atomic_output(output_path) as out:
+                    return out.write(open_frame(frame, key, passphrase))
+            img.load()
+        with metrics.stage('convert'):
+            flat = np.array(img.convert('RGB'), dtype=np.uint8).reshape(-1)
+        with atomic_output(output_path) as out:
+            written = extract_frame_lsb_to(flat, out, key, passphrase)
+            if written is None:
+                # Original format: a short base64 message, read in one go
+                written = out.write(ImageStego.decode_array(flat, key, passphrase))
+        return written
+        
+    @staticmethod
+    def _extract_legacy(flat):
+        """Read a message in the original format: LSBs up to the first 16 zero bits."""
+        end = flat.size
+        step = 1 << 16
+        for start in range(0, flat.size, step):
+            # Windows overlap by 15 bits so a terminator across chunks is still found
+            bits = (flat[start:start + step + 15] & 1).astype(np.int32)
+            ones = np.concatenate(([0], np.cumsum(bits)))
+            hits = np.flatnonzero(ones[16:] == ones[:-16])
+            if hits.size:
+                end = start + int(hits[0])
+                break
+        # Like the original reader, a partial last byte is read in full
+        bits = (flat[:-(-end // 8) * 8] & 1).astype(np.uint8)
+        return np.packbits(bits).tobytes()
+        
+    @staticmethod
+    def _decrypt_legacy(message, key):
+        """Decrypt a base64 Fernet message from the original format."""
+        # Convert string key to bytes if needed
+        if isinstance(key, str):
+            key = key.encode()
+        fernet = Fernet(key)
+        
+        # Fix padding issues, then decode base64 and decrypt
+        message = ImageStego._fix_base64_padding(message)
+        return fernet.decrypt(base64.b64decode(message))
+        
+    @staticmethod
+    def _open_compact(frame, key, passphrase=None):
+        """Verify and decrypt a compact payload frame."""
+        try:
+            message = open_frame(frame, key, passphrase)
+            if key or passphrase:
+                print(f"Message successfully decrypted from compact frame")
+            return message.decode(errors='replace')
+        except Exception as e:
+            print(f"Decryption error: {str(e)}. Compact payload could not be read.")
+            return ''
+        
+    @staticmethod
+    def _fix_base64_padding(data):
+        """Fix base64 padding issues by ensuring proper length."""
+        # Remove non-base64 characters
+        data = re.sub(r'[^A-Za-z0-9+/=]', '', data)
+        
+        # Add padding if needed
+        padding_needed = len(data) % 4
+        if padding_needed:
+            data += '=' * (4 - padding_needed)
+            
         return data
\ No newline at end of file
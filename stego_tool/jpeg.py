@@ -0,0 +1,222 @@
+# stego_tool/jpeg.py
+import io
+
+import numpy as np
+from PIL import Image
+
+from .payload import HEADER_SIZE, parse_header
+
+# JPEG mode hides a compact frame in the quantized DCT coefficients of the
+# luma (Y) channel, so the output can be a JPEG instead of a PNG.
+#
+#   carriers  Nonzero AC coefficients at positions whose quantizer step is at
+#             least MIN_STEP. Smaller steps do not survive the rounding of
+#             the encoder and decoder. Blocks are read in row order, and the
+#             positions within a block in natural (row-major) order.
+#   bits      Coefficient magnitudes come in pairs (1, 2), (3, 4), ...; the
+#             first of a pair is a 0 bit, the second a 1 bit. A carrier never
+#             becomes zero, so the decoder finds the same carriers.
+#
+# Clipping at 0 or 255 would change coefficients behind the decoder's back.
+# So blocks that would clip have their DC coefficient moved until they fit.
+# Blocks with too much contrast to fit have their AC coefficients scaled
+# down and carry nothing. The output is then decoded again. Blocks that
+# still read back wrong lose their carriers, and the frame is embedded again
+# around them. Skipped blocks read back with no carriers, so the decoder
+# never needs to know which ones they were.
+#
+# All 8x8 transforms run on the whole image at once as matrix products.
+
+DEFAULT_QUALITY = 85
+MIN_STEP = 8
+MAX_PASSES = 10
+BLOCK = 8
+
+# IJG reference quantization tables (ITU T.81 Annex K), natural order
+LUMA_TABLE = np.array([
+    16, 11, 10, 16, 24, 40, 51, 61,
+    12, 12, 14, 19, 26, 58, 60, 55,
+    14, 13, 16, 24, 40, 57, 69, 56,
+    14, 17, 22, 29, 51, 87, 80, 62,
+    18, 22, 37, 56, 68, 109, 103, 77,
+    24, 35, 55, 64, 81, 104, 113, 92,
+    49, 64, 78, 87, 103, 121, 120, 101,
+    72, 92, 95, 98, 112, 100, 103, 99,
+])
+CHROMA_TABLE = np.array([
+    17, 18, 24, 47, 99, 99, 99, 99,
+    18, 21, 26, 66, 99, 99, 99, 99,
+    24, 26, 56, 99, 99, 99, 99, 99,
+    47, 66, 99, 99, 99, 99, 99, 99,
+    99, 99, 99, 99, 99, 99, 99, 99,
+    99, 99, 99, 99, 99, 99, 99, 99,
+    99, 99, 99, 99, 99, 99, 99, 99,
+    99, 99, 99, 99, 99, 99, 99, 99,
+])
+
+# Orthonormal 8-point DCT-II matrix: the transform JPEG defines
+_k = np.arange(BLOCK)
+DCT_MATRIX = np.sqrt(np.where(_k == 0, 1, 2) / BLOCK)[:, None] * \
+    np.cos((2 * _k[None, :] + 1) * _k[:, None] * np.pi / (2 * BLOCK))
+
+
+def quant_table(quality, table=LUMA_TABLE):
+    """Scale a reference table to a 1-100 quality the way libjpeg does."""
+    if not 1 <= quality <= 100:
+        raise ValueError("JPEG quality must be between 1 and 100")
+    scale = 5000 // quality if quality < 50 else 200 - 2 * quality
+    return np.clip((table * scale + 50) // 100, 1, 255)
+
+
+def carrier_positions(table):
+    """Coefficient positions (0-63) used as carriers for a luma quantization table."""
+    return np.flatnonzero(np.asarray(table)[1:] >= MIN_STEP) + 1
+
+
+def _to_blocks(plane):
+    """Split the whole 8x8 blocks of a plane into an (N, 8, 8) array, row by row."""
+    rows, cols = plane.shape[0] // BLOCK, plane.shape[1] // BLOCK
+    return plane[:rows * BLOCK, :cols * BLOCK].reshape(rows, BLOCK, cols, BLOCK).swapaxes(1, 2).reshape(-1, BLOCK, BLOCK)
+
+
+def _from_blocks(blocks, plane):
+    """Write (N, 8, 8) blocks back into the whole-block area of `plane`."""
+    rows, cols = plane.shape[0] // BLOCK, plane.shape[1] // BLOCK
+    plane[:rows * BLOCK, :cols * BLOCK] = blocks.reshape(rows, cols, BLOCK, BLOCK).swapaxes(1, 2).reshape(rows * BLOCK, cols * BLOCK)
+
+
+def _forward(blocks, table):
+    """Quantized DCT coefficients (N, 64) of level-shifted pixel blocks."""
+    coefficients = DCT_MATRIX @ (blocks.astype(np.float64) - 128) @ DCT_MATRIX.T
+    return np.rint(coefficients.reshape(-1, 64) / table).astype(np.int32)
+
+
+def _inverse(coefficients, table):
+    """Pixel blocks (N, 8, 8), unclipped, for quantized DCT coefficients."""
+    blocks = (coefficients * table).reshape(-1, BLOCK, BLOCK).astype(np.float64)
+    return DCT_MATRIX.T @ blocks @ DCT_MATRIX + 128
+
+
+def _read_bits(carriers, count):
+    """The first `count` bits carried by an (N, positions) coefficient array."""
+    values = carriers[carriers != 0][:count]
+    return ((np.abs(values) - 1) & 1).astype(np.uint8)
+
+
+def _embed_bits(carriers, bits):
+    """Set the bits of the first len(bits) carriers in place; False if there are too few."""
+    mask = carriers != 0
+    if np.count_nonzero(mask) < len(bits):
+        return False
+    # Boolean indexing walks the array in row order, like _read_bits
+    mask &= np.cumsum(mask, axis=None).reshape(mask.shape) <= len(bits)
+    values = carriers[mask]
+    carriers[mask] = np.sign(values) * ((np.abs(values) - 1) // 2 * 2 + 1 + bits)
+    return True
+
+
+def _fit_range(coefficients, table):
+    """Make the pixels of every block fit in 0..255, so that nothing clips.
+
+    Blocks with more contrast than that have their AC coefficients scaled
+    down first; the rest only have their DC moved. Returns the mask of the
+    scaled blocks, whose carriers no longer hold their bits.
+    """
+    scaled = np.zeros(len(coefficients), dtype=bool)
+    dc_step = table[0] / BLOCK  # pixel shift of one DC quantization step
+    for _ in range(4):
+        pixels = _inverse(coefficients, table).reshape(len(coefficients), -1)
+        low, high = pixels.min(axis=1), pixels.max(axis=1)
+        wide = high - low > 255 - dc_step
+        if not wide.any():
+            break
+        factor = 0.95 * (255 - dc_step) / (high - low)[wide]
+        coefficients[wide, 1:] = np.rint(coefficients[wide, 1:] * factor[:, None])
+        scaled |= wide
+    # Pixels are rounded afterwards, so -0.5 and 255.5 still land in range
+    up = np.ceil(np.maximum(-0.5 - low, 0) / dc_step)
+    down = np.ceil(np.maximum(high - 255.5, 0) / dc_step)
+    coefficients[:, 0] += (up - down).astype(np.int32)
+    return scaled
+
+
+def luma_coefficients(img):
+    """Quantized luma DCT coefficients (N, 64) and the luma table of a JPEG image.
+
+    The Y plane is decoded without the YCbCr to RGB conversion, so the
+    coefficients come back exactly as long as the plane does not clip.
+    """
+    img.draft('YCbCr', img.size)
+    table = np.array(img.quantization[0])
+    plane = np.asarray(img.convert('YCbCr') if img.mode not in ('YCbCr', 'L') else img)
+    luma = plane[..., 0] if plane.ndim == 3 else plane
+    return _forward(_to_blocks(luma), table), table
+
+
+def carrier_bits(img, count):
+    """The first `count` payload bits of a JPEG image opened with Pillow."""
+    coefficients, table = luma_coefficients(img)
+    return _read_bits(coefficients[:, carrier_positions(table)], count)
+
+
+def extract_frame(img):
+    """Read a payload frame from a JPEG image; None if it does not carry one."""
+    coefficients, table = luma_coefficients(img)
+    carriers = coefficients[:, carrier_positions(table)]
+    header = parse_header(np.packbits(_read_bits(carriers, HEADER_SIZE * 8)).tobytes())
+    if header is None:
+        return None
+    bits = _read_bits(carriers, (HEADER_SIZE + header.length) * 8)
+    return np.packbits(bits).tobytes()
+
+
+def capacity(pixels, quality=DEFAULT_QUALITY):
+    """Largest frame, in bytes, an RGB pixel array can carry as a JPEG of this quality."""
+    table = quant_table(quality)
+    luma = np.asarray(Image.fromarray(pixels).convert('YCbCr'))[..., 0]
+    coefficients = _forward(_to_blocks(luma), table)
+    skipped = _fit_range(coefficients.copy(), table)
+    # An upper bound: embedding may push a few more blocks over the edge
+    return int(np.count_nonzero(coefficients[~skipped][:, carrier_positions(table)])) // 8
+
+
+def encode(pixels, frame, quality=DEFAULT_QUALITY):
+    """Hide a frame in an RGB pixel array and return the JPEG file as bytes.
+
+    Raises ValueError if the image has too few carriers for the frame, or if
+    the frame cannot be made to read back exactly.
+    """
+    table = quant_table(quality)
+    chroma = quant_table(quality, CHROMA_TABLE)
+    qtables = [table.tolist(), chroma.tolist()]
+    ycbcr = np.array(Image.fromarray(pixels).convert('YCbCr'))
+    cover = _forward(_to_blocks(ycbcr[..., 0]), table)
+    positions = carrier_positions(table)
+    bits = np.unpackbits(np.frombuffer(bytes(frame), dtype=np.uint8))
+    # Blocks with too much contrast carry nothing (their carriers read back as zero)
+    skipped = _fit_range(cover.copy(), table)
+    for _ in range(MAX_PASSES):
+        coefficients = cover.copy()
+        carriers = coefficients[:, positions]
+        carriers[skipped] = 0
+        if not _embed_bits(carriers, bits):
+            raise ValueError(f"Payload needs {len(bits)} carrier coefficients, only "
+                             f"{np.count_nonzero(carriers)} available at quality {quality}")
+        coefficients[:, positions] = carriers
+        scaled = _fit_range(coefficients, table) & ~skipped
+        if scaled.any():
+            # Embedding pushed these blocks over the edge; embed again around them
+            skipped |= scaled
+            continue
+        blocks = np.clip(np.rint(_inverse(coefficients, table)), 0, 255).astype(np.uint8)
+        _from_blocks(blocks, ycbcr[..., 0])
+        buffer = io.BytesIO()
+        Image.fromarray(ycbcr, 'YCbCr').save(buffer, format='JPEG', qtables=qtables, subsampling=2)
+        # Decode the output again; blocks that do not read back are skipped next pass
+        with Image.open(io.BytesIO(buffer.getvalue())) as written:
+            readback = luma_coefficients(written)[0][:, positions]
+        wrong = (readback != carriers).any(axis=1)
+        if not wrong.any():
+            return buffer.getvalue()
+        skipped |= wrong
+    raise ValueError(f"Could not embed the payload reliably at quality {quality}; try a higher quality")
@@ -0,0 +1,69 @@
+# stego_tool/kdf.py
+import base64
+import os
+from functools import lru_cache
+
+from cryptography.hazmat.primitives.kdf.scrypt import Scrypt
+
+# Passphrase keys are derived with scrypt, a memory-hard KDF. The salt and the
+# cost parameters travel with every payload frame so decoding only needs the
+# passphrase.
+SALT_SIZE = 16
+DEFAULT_PARAMS = (15, 8, 1)  # log2(N), r, p -> about 32 MiB and 0.1 s per derivation
+
+# Decoders read the parameters from the (untrusted) frame, so a crafted carrier
+# could ask for minutes of CPU or gigabytes of memory. Anything outside these
+# bounds is refused before scrypt runs.
+LOG_N_RANGE = (1, 20)
+R_RANGE = (1, 32)
+P_RANGE = (1, 16)
+MAX_MEMORY = 1 << 30  # 128 * r * N bytes
+
+# Derived keys are memoized per process, keyed by (passphrase, salt, params).
+# A batch job that reuses one salt across many files pays for the KDF once.
+CACHE_SIZE = 256
+
+
+def generate_salt():
+    """Generate a random per-payload salt."""
+    return os.urandom(SALT_SIZE)
+
+
+@lru_cache(maxsize=CACHE_SIZE)
+def _derive(passphrase, salt, log_n, r, p):
+    kdf = Scrypt(salt=salt, length=32, n=2 ** log_n, r=r, p=p)
+    return base64.urlsafe_b64encode(kdf.derive(passphrase))
+
+
+def derive_key(passphrase, salt, params=DEFAULT_PARAMS):
+    """Derive a Fernet-compatible key from a passphrase.
+
+    Args:
+        passphrase: Passphrase as str or bytes
+        salt: Salt bytes (see `generate_salt`)
+        params: (log2(N), r, p) scrypt cost parameters
+
+    Returns:
+        A urlsafe base64 key usable anywhere a Fernet key is accepted.
+
+    Raises ValueError if the parameters are outside the bounds above.
+    """
+    if isinstance(passphrase, str):
+        passphrase = passphrase.encode()
+    log_n, r, p = params
+    for name, value, (low, high) in (('log2(N)', log_n, LOG_N_RANGE), ('r', r, R_RANGE), ('p', p, P_RANGE)):
+        if not low <= value <= high:
+            raise ValueError(f"scrypt {name}={value} is outside {low}..{high}")
+    if 128 * r * 2 ** log_n > MAX_MEMORY:
+        raise ValueError(f"scrypt parameters log2(N)={log_n}, r={r} need more than {MAX_MEMORY >> 20} MiB")
+    return _derive(passphrase, bytes(salt), log_n, r, p)
+
+
+def cache_info():
+    """Hit/miss statistics of the derived-key cache."""
+    return _derive.cache_info()
+
+
+def clear_cache():
+    """Drop every memoized derived key."""
+    _derive.cache_clear()
@@ -0,0 +1,210 @@
+# stego_tool/metrics.py
+import contextvars
+import functools
+import inspect
+import json
+import threading
+import time
+from collections import defaultdict
+from contextlib import contextmanager
+
+from . import progress
+
+# Backends time each stage of an operation and emit one event per stage:
+#
+#   {"backend": "image", "op": "encode", "stage": "embed", "seconds": 0.0012, "time": 1718000000.0}
+#
+# Stages: load, convert, compress, kdf, encrypt, frame, read, embed, write,
+# mux (encoding) and load, convert, read, extract, kdf, decrypt, decompress
+# (decoding). Each operation ends with a "total" event. Loops over video frames
+# report one event per stage with the summed time and a "calls" count.
+#
+# A sink is any callable taking the event dict. With no sinks registered
+# nothing is built or sent.
+
+_sinks = []
+_operation = contextvars.ContextVar('stego_operation', default=None)
+
+
+def add_sink(sink):
+    """Register a sink (any callable taking an event dict) and return it."""
+    _sinks.append(sink)
+    return sink
+
+
+def remove_sink(sink):
+    """Unregister a sink added with `add_sink`."""
+    if sink in _sinks:
+        _sinks.remove(sink)
+
+
+def _emit(tags, stage, seconds, fields):
+    backend, op = tags or (None, None)
+    event = {'backend': backend, 'op': op, 'stage': stage, 'seconds': seconds, 'time': time.time()}
+    event.update(fields)
+    for sink in list(_sinks):
+        sink(event)
+
+
+def record(stage, seconds, **fields):
+    """Emit an event for a stage timed by the caller, e.g. summed over a frame loop."""
+    if _sinks:
+        _emit(_operation.get(), stage, seconds, fields)
+
+
+@contextmanager
+def stage(name, **fields):
+    """Time the enclosed block as one stage of the current operation.
+
+    Entering a stage is also a progress checkpoint (see progress.report).
+    """
+    progress.report(name)
+    started = time.perf_counter()
+    try:
+        yield
+    finally:
+        record(name, time.perf_counter() - started, **fields)
+
+
+class StageTimer:
+    """Sum stage times over a loop and emit one event per stage on `flush`."""
+
+    def __init__(self):
+        self.seconds = defaultdict(float)
+        self.calls = defaultdict(int)
+
+    @contextmanager
+    def __call__(self, name):
+        started = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.add(name, time.perf_counter() - started)
+
+    def add(self, name, seconds):
+        self.seconds[name] += seconds
+        self.calls[name] += 1
+
+    def flush(self):
+        for name, seconds in self.seconds.items():
+            record(name, seconds, calls=self.calls[name])
+        self.seconds.clear()
+        self.calls.clear()
+
+
+def operation(backend, op):
+    """Decorator tagging every stage run inside a backend function.
+
+    Emits a final "total" event. Nested operations (encode_bytes calling
+    encode_array, for instance) report under the outermost one.
+    """
+    def decorator(func):
+        if inspect.isgeneratorfunction(func):
+            @functools.wraps(func)
+            def generator_wrapper(*args, **kwargs):
+                if _operation.get() is not None:
+                    return func(*args, **kwargs)
+                return _tagged_generator(func(*args, **kwargs), (backend, op))
+            return generator_wrapper
+
+        @functools.wraps(func)
+        def wrapper(*args, **kwargs):
+            if _operation.get() is not None:
+                return func(*args, **kwargs)
+            token = _operation.set((backend, op))
+            started = time.perf_counter()
+            try:
+                return func(*args, **kwargs)
+            finally:
+                record('total', time.perf_counter() - started)
+                _operation.reset(token)
+        return wrapper
+    return decorator
+
+
+def _tagged_generator(generator, tags):
+    """Run a generator with the operation tags set only while its own code runs."""
+    elapsed = 0.0
+    try:
+        while True:
+            token = _operation.set(tags)
+            started = time.perf_counter()
+            try:
+                item = next(generator)
+            except StopIteration:
+                return
+            finally:
+                elapsed += time.perf_counter() - started
+                _operation.reset(token)
+            yield item
+    finally:
+        generator.close()
+        if _sinks:
+            _emit(tags, 'total', elapsed, {})
+
+
+class JsonLinesSink:
+    """Append every event as one JSON line to a path or an open text stream."""
+
+    def __init__(self, target):
+        self._owned = isinstance(target, str)
+        self._stream = open(target, 'a', encoding='utf-8') if self._owned else target
+        self._lock = threading.Lock()
+
+    def __call__(self, event):
+        line = json.dumps(event) + '\n'
+        with self._lock:
+            self._stream.write(line)
+            self._stream.flush()
+
+    def close(self):
+        if self._owned:
+            self._stream.close()
+
+
+class CounterRegistry:
+    """Prometheus-style counters of calls and seconds per (backend, op, stage)."""
+
+    def __init__(self):
+        self._counters = defaultdict(lambda: [0, 0.0])
+        self._lock = threading.Lock()
+
+    def __call__(self, event):
+        labels = (event['backend'] or '', event['op'] or '', event['stage'])
+        with self._lock:
+            counter = self._counters[labels]
+            counter[0] += event.get('calls', 1)
+            counter[1] += event['seconds']
+
+    def summary(self):
+        """Rows of (backend, op, stage, calls, seconds), in first-seen order."""
+        with self._lock:
+            return [labels + tuple(counter) for labels, counter in self._counters.items()]
+
+    def render(self):
+        """The counters in the Prometheus text exposition format."""
+        lines = []
+        for metric, index, description in (
+                ('stego_stage_calls_total', 3, 'Number of times a stage ran'),
+                ('stego_stage_seconds_total', 4, 'Wall-clock seconds spent in a stage')):
+            lines.append(f'# HELP {metric} {description}')
+            lines.append(f'# TYPE {metric} counter')
+            for row in self.summary():
+                labels = f'backend="{row[0]}",op="{row[1]}",stage="{row[2]}"'
+                lines.append(f'{metric}{{{labels}}} {row[index]}')
+        return '\n'.join(lines) + '\n'
+
+    def format_profile(self):
+        """A human-readable per-stage breakdown, as printed by `--profile`."""
+        rows = self.summary()
+        totals = {(row[0], row[1]): row[4] for row in rows if row[2] == 'total'}
+        lines = ['Profile:']
+        for backend, op, stage_name, calls, seconds in rows:
+            if stage_name == 'total':
+                continue
+            total = totals.get((backend, op))
+            share = f"{seconds / total * 100:5.1f}%" if total else '     -'
+            lines.append(f"  {backend or '-':6} {op or '-':7} {stage_name:11} {seconds:9.4f} s  {share}  ({calls} calls)")
+        for (backend, op), seconds in totals.items():
+            lines.append(f"  {backend or '-':6} {op or '-':7} {'total':11} {seconds:9.4f} s")
+        return '\n'.join(lines)
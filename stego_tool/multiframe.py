@@ -0,0 +1,228 @@
+# stego_tool/multiframe.py
+import os
+from concurrent.futures import ThreadPoolExecutor
+
+import numpy as np
+from PIL import Image, ImageSequence
+
+from .payload import HEADER_SIZE, parse_header
+
+# Multi-frame carriers: multi-page TIFF, APNG and (animated) GIF.
+#
+# The payload is always a compact frame. Its bits run through the carrier
+# values frame after frame: all of the first frame, then the second, and so
+# on. A payload that fits in the first frame is laid out exactly like a
+# single image. Decoding reads frames lazily and stops where the payload
+# ends.
+#
+#   TIFF, APNG  LSBs of the RGB values of each frame (RGBA when the image
+#               has transparency)
+#   GIF         LSBs of the palette index of each pixel. The palette is
+#               sorted by luminance first, so flipping an index's LSB swaps
+#               a color for a similar one. It is shared by all frames and
+#               holds an even number of distinct colors, so that every index
+#               and its neighbour map to different colors.
+#
+# GIF frames are read back as RGB and mapped to palette indices, because
+# Pillow only keeps the first GIF frame in palette mode.
+
+# Output extensions that can hold several frames, and their Pillow format
+FORMATS = {'.tif': 'TIFF', '.tiff': 'TIFF', '.png': 'PNG', '.apng': 'PNG', '.gif': 'GIF'}
+
+MAX_COLORS = 256
+PALETTE_SAMPLE = 1 << 20  # pixels sampled to build a palette for many-colored covers
+
+
+def frame_count(img):
+    return getattr(img, 'n_frames', 1)
+
+
+def is_multiframe(img):
+    """Whether an opened image is read with this module: several frames, or any GIF."""
+    return frame_count(img) > 1 or img.format == 'GIF'
+
+
+def output_format(img, output_path):
+    """Pillow format to write a multi-frame carrier in, or None for a single-image output.
+
+    GIF outputs always use palette indices. TIFF and PNG outputs only span
+    frames when the cover has several. Streams keep the cover's format.
+    """
+    if hasattr(output_path, 'write'):
+        format = img.format if img.format in FORMATS.values() else None
+    else:
+        format = FORMATS.get(os.path.splitext(output_path)[1].lower())
+    if format == 'GIF' or (format and frame_count(img) > 1):
+        return format
+    return None
+
+
+def frame_mode(img):
+    """The mode frames are converted to: RGBA for images with transparency, else RGB."""
+    return 'RGBA' if img.mode in ('RGBA', 'LA', 'PA') or 'transparency' in img.info else 'RGB'
+
+
+def capacity(img):
+    """Largest compact frame, in bytes, an opened image can carry in its own format."""
+    if img.format == 'GIF':
+        values = img.width * img.height * frame_count(img)
+    elif img.format == 'TIFF':
+        # Pages may differ in size; seeking only reads each page's header
+        channels = len(frame_mode(img))
+        values = sum(page.width * page.height * channels for page in ImageSequence.Iterator(img))
+        img.seek(0)
+    else:
+        values = img.width * img.height * len(frame_mode(img)) * frame_count(img)
+    return values // 8
+
+
+def _pack(rgb):
+    rgb = rgb.astype(np.uint32)
+    return (rgb[..., 0] << 16) | (rgb[..., 1] << 8) | rgb[..., 2]
+
+
+def _unpack(packed):
+    return np.stack([(packed >> 16) & 0xFF, (packed >> 8) & 0xFF, packed & 0xFF], axis=-1).astype(np.uint8)
+
+
+def build_palette(frames):
+    """An even-sized palette (N, 3) of distinct colors for RGB frames, sorted by luminance."""
+    colors = np.unique(np.concatenate([_pack(frame).reshape(-1) for frame in frames]))
+    if len(colors) > MAX_COLORS:
+        # Too many colors: quantize a sample of every frame together
+        sample = np.concatenate([frame.reshape(-1, 3) for frame in frames])
+        sample = sample[::max(1, len(sample) // PALETTE_SAMPLE)]
+        quantized = Image.fromarray(sample[:, None, :]).quantize(MAX_COLORS, dither=Image.Dither.NONE)
+        palette = np.array(quantized.getpalette('RGB'), dtype=np.uint8).reshape(-1, 3)
+        colors = np.unique(_pack(palette[np.unique(np.asarray(quantized))]))
+    if len(colors) % 2:
+        # Pad with a color that is not in the palette yet
+        extra = int(colors[-1])
+        while extra in colors:
+            extra = (extra + 1) % (1 << 24)
+        colors = np.append(colors, extra)
+    rgb = _unpack(colors)
+    luminance = rgb.astype(np.uint32) @ np.array([299, 587, 114], dtype=np.uint32)
+    return rgb[np.lexsort((colors, luminance))]
+
+
+def _nearest(frame, palette):
+    """Palette indices (H, W) of the nearest palette color of every pixel."""
+    colors, inverse = np.unique(_pack(frame).reshape(-1), return_inverse=True)
+    rgb = _unpack(colors).astype(np.int32)
+    nearest = np.empty(len(colors), dtype=np.uint8)
+    for start in range(0, len(colors), 1 << 14):
+        distance = ((rgb[start:start + (1 << 14), None, :] - palette[None].astype(np.int32)) ** 2).sum(axis=2)
+        nearest[start:start + (1 << 14)] = distance.argmin(axis=1)
+    return nearest[inverse].reshape(frame.shape[:2])
+
+
+def _carriers(img):
+    """Yield the carrier values (flat uint8) of each frame in order, decoding frames lazily."""
+    if img.format == 'GIF':
+        img.seek(0)
+        palette = _pack(np.array(img.getpalette('RGB'), dtype=np.uint8).reshape(-1, 3))
+        # Pillow pads GIF palettes, so the first entry of each color is its index
+        colors, first = np.unique(palette, return_index=True)
+        for frame in ImageSequence.Iterator(img):
+            packed = _pack(np.asarray(frame.convert('RGB'))).reshape(-1)
+            position = np.minimum(np.searchsorted(colors, packed), len(colors) - 1)
+            yield first[position].astype(np.uint8)
+    else:
+        mode = frame_mode(img)
+        for frame in ImageSequence.Iterator(img):
+            yield np.asarray(frame.convert(mode)).reshape(-1)
+
+
+class _BitReader:
+    """Carrier LSBs, taken from frames only as they are needed."""
+
+    def __init__(self, img):
+        self.frames = _carriers(img)
+        self.bits = np.zeros(0, dtype=np.uint8)
+
+    def read(self, count):
+        """The first `count` bits, or fewer if the image ends first."""
+        chunks = [self.bits]
+        available = len(self.bits)
+        while available < count:
+            values = next(self.frames, None)
+            if values is None:
+                break
+            chunks.append(values & 1)
+            available += len(values)
+        self.bits = np.concatenate(chunks)
+        return self.bits[:count]
+
+
+def carrier_bits(img, count):
+    """The first `count` payload bits of an opened multi-frame image."""
+    return _BitReader(img).read(count)
+
+
+def extract_frame(img):
+    """Read a payload frame across the frames of an opened image; None if there is none."""
+    reader = _BitReader(img)
+    header = parse_header(np.packbits(reader.read(HEADER_SIZE * 8)).tobytes())
+    if header is None:
+        return None
+    bits = reader.read((HEADER_SIZE + header.length) * 8)
+    if len(bits) < (HEADER_SIZE + header.length) * 8:
+        return None
+    return np.packbits(bits).tobytes()
+
+
+def encode(img, frame, output, format, threads=None):
+    """Hide a payload frame across the frames of an opened image and save it.
+
+    Frames are converted, mapped to the palette (GIF) and embedded in
+    parallel. Raises ValueError if the frames cannot hold the payload.
+
+    Args:
+        img: Cover opened with Pillow, at its first frame
+        frame: Compact payload frame (bytes)
+        output: File path or binary file object
+        format: 'TIFF', 'PNG' (APNG) or 'GIF'
+        threads: Worker threads (default: CPU count)
+    """
+    mode = 'RGB' if format == 'GIF' else frame_mode(img)
+    loop = img.info.get('loop', 0)
+    covers = [cover.copy() for cover in ImageSequence.Iterator(img)]
+    durations = [cover.info.get('duration') for cover in covers]
+    bits = np.unpackbits(np.frombuffer(bytes(frame), dtype=np.uint8))
+
+    with ThreadPoolExecutor(max_workers=threads or os.cpu_count()) as pool:
+        carriers = list(pool.map(lambda cover: np.array(cover.convert(mode), dtype=np.uint8), covers))
+        if format == 'GIF':
+            palette = build_palette(carriers)
+            carriers = list(pool.map(lambda pixels: _nearest(pixels, palette), carriers))
+        starts = np.cumsum([0] + [carrier.size for carrier in carriers])
+        if len(bits) > starts[-1]:
+            raise ValueError(f"Payload needs {len(bits)} bits, the {len(carriers)} frames hold only {starts[-1]}")
+
+        def embed(index):
+            flat = carriers[index].reshape(-1)
+            chunk = bits[starts[index]:starts[index + 1]]
+            flat[:len(chunk)] = (flat[:len(chunk)] & 0xFE) | chunk
+
+        # Frames past the end of the payload are written unchanged
+        list(pool.map(embed, range(int(np.searchsorted(starts, len(bits))))))
+
+    if format == 'GIF':
+        images = []
+        for indices in carriers:
+            image = Image.fromarray(indices, 'P')
+            image.putpalette(palette.reshape(-1).tolist())
+            images.append(image)
+    else:
+        images = [Image.fromarray(pixels) for pixels in carriers]
+    options = {'save_all': True, 'append_images': images[1:]}
+    if format == 'TIFF':
+        options['compression'] = 'tiff_deflate'
+    else:
+        options['loop'] = loop
+        if None not in durations:
+            options['duration'] = durations
+        if format == 'GIF':
+            options['optimize'] = False
+    images[0].save(output, format=format, **options)
@@ -0,0 +1,320 @@
+# stego_tool/payload.py
+import base64
+import lzma
+import os
+import struct
+import zlib
+from collections import namedtuple
+
+from cryptography.fernet import Fernet
+from cryptography.hazmat.primitives.ciphers.aead import AESGCM
+
+from . import kdf, metrics
+from .utils import extract_lsb
+
+try:
+    import zstandard
+except ImportError:  # zstd support is optional
+    zstandard = None
+
+# Binary payload frame used by the compact mode of every backend.
+#
+#   magic(4) | version(1) | flags(1) | cipher(1) | codec(1) | length(4) | crc32(4) | header_crc(4)
+#
+# `length` and `crc32` describe the body that follows the header. The body is
+# raw ciphertext (or plaintext) bytes, so unlike the legacy mode nothing is
+# base64-encoded before it is hidden in the carrier.
+#
+# When the key was derived from a passphrase (FLAG_KDF), the body starts with
+# the scrypt salt and cost parameters, followed by the ciphertext.
+MAGIC = b'\x89STG'
+VERSION = 1
+HEADER = struct.Struct('>4sBBBBIII')
+HEADER_SIZE = HEADER.size
+
+CIPHER_NONE = 0
+CIPHER_FERNET = 1
+CIPHER_AESGCM = 2
+
+CIPHERS = {
+    'none': CIPHER_NONE,
+    'fernet': CIPHER_FERNET,
+    'aesgcm': CIPHER_AESGCM,
+}
+
+FLAG_KDF = 0x01
+
+KDF_PREAMBLE = struct.Struct('>16sBBB')  # salt, log2(N), r, p
+
+CODEC_NONE = 0
+CODEC_ZLIB = 1
+CODEC_LZMA = 2
+CODEC_ZSTD = 3
+
+CODECS = {
+    'none': CODEC_NONE,
+    'zlib': CODEC_ZLIB,
+    'lzma': CODEC_LZMA,
+    'zstd': CODEC_ZSTD,
+}
+
+NONCE_SIZE = 12
+
+FrameHeader = namedtuple('FrameHeader', 'version flags cipher codec length crc')
+
+
+def _key_bytes(key):
+    """Return a Fernet key as bytes, accepting str or bytes."""
+    if isinstance(key, str):
+        key = key.encode()
+    return key
+
+
+def _aad(flags, cipher, codec):
+    """Associated data that ties an AES-GCM body to its frame header."""
+    return MAGIC + bytes([VERSION, flags, cipher, codec])
+
+
+def encrypt(data, key, cipher, flags=0, codec=CODEC_NONE):
+    """Encrypt raw bytes with the given cipher id and return raw ciphertext."""
+    if cipher == CIPHER_NONE:
+        return data
+    key = _key_bytes(key)
+    if cipher == CIPHER_FERNET:
+        # A Fernet token is already base64url, store the decoded bytes instead
+        return base64.urlsafe_b64decode(Fernet(key).encrypt(data))
+    if cipher == CIPHER_AESGCM:
+        # AES-256-GCM keyed with the 32 bytes behind the Fernet key
+        nonce = os.urandom(NONCE_SIZE)
+        aesgcm = AESGCM(base64.urlsafe_b64decode(key))
+        return nonce + aesgcm.encrypt(nonce, data, _aad(flags, cipher, codec))
+    raise ValueError(f"Unknown cipher id: {cipher}")
+
+
+def decrypt(body, key, cipher, flags=0, codec=CODEC_NONE):
+    """Reverse `encrypt` for the given cipher id."""
+    if cipher == CIPHER_NONE:
+        return body
+    if not key:
+        raise ValueError("Payload is encrypted but no key was provided")
+    key = _key_bytes(key)
+    if cipher == CIPHER_FERNET:
+        return Fernet(key).decrypt(base64.urlsafe_b64encode(body))
+    if cipher == CIPHER_AESGCM:
+        aesgcm = AESGCM(base64.urlsafe_b64decode(key))
+        nonce, ciphertext = body[:NONCE_SIZE], body[NONCE_SIZE:]
+        return aesgcm.decrypt(nonce, ciphertext, _aad(flags, cipher, codec))
+    raise ValueError(f"Unknown cipher id: {cipher}")
+
+
+def available_codecs():
+    """Names of the compression codecs usable in this environment."""
+    return [name for name in CODECS if name != 'zstd' or zstandard is not None]
+
+
+def compress(data, codec, level=None):
+    """Compress raw bytes with the given codec id."""
+    if codec == CODEC_NONE:
+        return data
+    if codec == CODEC_ZLIB:
+        # Raw deflate stream, the frame already carries length and CRC32
+        compressor = zlib.compressobj(9 if level is None else level, zlib.DEFLATED, -15)
+        return compressor.compress(data) + compressor.flush()
+    if codec == CODEC_LZMA:
+        return lzma.compress(data, format=lzma.FORMAT_ALONE, preset=6 if level is None else level)
+    if codec == CODEC_ZSTD:
+        if zstandard is None:
+            raise ValueError("zstd compression requires the 'zstandard' package")
+        return zstandard.ZstdCompressor(level=19 if level is None else level).compress(data)
+    raise ValueError(f"Unknown codec id: {codec}")
+
+
+def decompress(data, codec):
+    """Reverse `compress` for the given codec id."""
+    if codec == CODEC_NONE:
+        return data
+    if codec == CODEC_ZLIB:
+        return zlib.decompress(data, -15)
+    if codec == CODEC_LZMA:
+        return lzma.decompress(data, format=lzma.FORMAT_ALONE)
+    if codec == CODEC_ZSTD:
+        if zstandard is None:
+            raise ValueError("Payload is zstd-compressed but the 'zstandard' package is not installed")
+        # A decompressobj also reads frames written by a streaming compressor,
+        # which carry no content size
+        return zstandard.ZstdDecompressor().decompressobj().decompress(data)
+    raise ValueError(f"Unknown codec id: {codec}")
+
+
+def compressor(codec, level=None):
+    """Incremental form of `compress`: an object with compress(data) and flush()."""
+    if codec == CODEC_ZLIB:
+        return zlib.compressobj(9 if level is None else level, zlib.DEFLATED, -15)
+    if codec == CODEC_LZMA:
+        return lzma.LZMACompressor(format=lzma.FORMAT_ALONE, preset=6 if level is None else level)
+    if codec == CODEC_ZSTD:
+        if zstandard is None:
+            raise ValueError("zstd compression requires the 'zstandard' package")
+        return zstandard.ZstdCompressor(level=19 if level is None else level).compressobj()
+    raise ValueError(f"Unknown codec id: {codec}")
+
+
+def decompressor(codec):
+    """Incremental form of `decompress`: an object with decompress(data)."""
+    if codec == CODEC_ZLIB:
+        return zlib.decompressobj(-15)
+    if codec == CODEC_LZMA:
+        return lzma.LZMADecompressor(format=lzma.FORMAT_ALONE)
+    if codec == CODEC_ZSTD:
+        if zstandard is None:
+            raise ValueError("Payload is zstd-compressed but the 'zstandard' package is not installed")
+        return zstandard.ZstdDecompressor().decompressobj()
+    raise ValueError(f"Unknown codec id: {codec}")
+
+
+def pick_codec(data, compression, level=None):
+    """Resolve a compression choice to (codec id, compressed bytes).
+
+    'auto' tries every available codec and keeps the smallest result, which
+    may be no compression at all for short or already compressed payloads.
+    """
+    if not compression or compression == 'none':
+        return CODEC_NONE, data
+    if compression != 'auto':
+        codec = CODECS[compression]
+        return codec, compress(data, codec, level)
+    best = (CODEC_NONE, data)
+    for name in available_codecs():
+        codec = CODECS[name]
+        if codec == CODEC_NONE:
+            continue
+        packed = compress(data, codec, level)
+        if len(packed) < len(best[1]):
+            best = (codec, packed)
+    return best
+
+
+def pack_header(flags, cipher, codec, body):
+    """Build the fixed-size frame header for a body."""
+    return header_for(flags, cipher, codec, len(body), zlib.crc32(body) & 0xFFFFFFFF)
+
+
+def header_for(flags, cipher, codec, length, crc):
+    """Build a frame header from a body's length and CRC32 (for bodies built in pieces)."""
+    head = HEADER.pack(MAGIC, VERSION, flags, cipher, codec, length, crc, 0)[:-4]
+    return head + struct.pack('>I', zlib.crc32(head) & 0xFFFFFFFF)
+
+
+def parse_header(data):
+    """Parse a frame header.
+
+    Returns a FrameHeader, or None if `data` does not start with a valid frame
+    header (wrong magic, unsupported version or a header checksum mismatch).
+    """
+    if len(data) < HEADER_SIZE:
+        return None
+    magic, version, flags, cipher, codec, length, crc, header_crc = HEADER.unpack(bytes(data[:HEADER_SIZE]))
+    if magic != MAGIC or version != VERSION:
+        return None
+    if zlib.crc32(bytes(data[:HEADER_SIZE - 4])) & 0xFFFFFFFF != header_crc:
+        return None
+    return FrameHeader(version, flags, cipher, codec, length, crc)
+
+
+def is_frame(data):
+    """Check whether `data` starts with a compact payload frame."""
+    return parse_header(data) is not None
+
+
+def frame_size(length, cipher='aesgcm', passphrase=False):
+    """Size of the frame `build_frame` makes for an uncompressed `length`-byte message.
+
+    Args:
+        length: Message size in bytes
+        cipher: 'aesgcm', 'fernet' or 'none' (unencrypted)
+        passphrase: Whether the key is derived from a passphrase (adds the KDF preamble)
+    """
+    cipher_id = CIPHERS[cipher]
+    body = length
+    if cipher_id == CIPHER_AESGCM:
+        body += NONCE_SIZE + 16  # nonce and GCM tag
+    elif cipher_id == CIPHER_FERNET:
+        # version, timestamp, IV, PKCS7-padded ciphertext, HMAC
+        body = 1 + 8 + 16 + (length // 16 + 1) * 16 + 32
+    if passphrase:
+        body += KDF_PREAMBLE.size
+    return HEADER_SIZE + body
+
+
+def build_frame(data, key=None, cipher='aesgcm', compression=None, level=None,
+                passphrase=None, salt=None, kdf_params=kdf.DEFAULT_PARAMS):
+    """Wrap a message into a binary payload frame.
+
+    Args:
+        data: Message as str or bytes
+        key: Fernet key (if None, the body is stored unencrypted)
+        cipher: 'aesgcm' or 'fernet', used only when a key is given
+        compression: 'zlib', 'lzma', 'zstd', 'auto' or None, applied before encryption
+        level: Compression level passed to the codec (codec default if None)
+        passphrase: Derive the key from this passphrase instead of using `key`
+        salt: KDF salt (a fresh random salt per payload if None)
+        kdf_params: (log2(N), r, p) scrypt cost parameters
+    """
+    if isinstance(data, str):
+        data = data.encode()
+    if compression:
+        with metrics.stage('compress'):
+            codec, data = pick_codec(data, compression, level)
+    else:
+        codec = CODEC_NONE
+    flags = 0
+    preamble = b''
+    if passphrase:
+        salt = kdf.generate_salt() if salt is None else bytes(salt)
+        if len(salt) != kdf.SALT_SIZE:
+            raise ValueError(f"Salt must be {kdf.SALT_SIZE} bytes")
+        with metrics.stage('kdf'):
+            key = kdf.derive_key(passphrase, salt, kdf_params)
+        flags |= FLAG_KDF
+        preamble = KDF_PREAMBLE.pack(salt, *kdf_params)
+    cipher_id = CIPHERS[cipher] if key else CIPHER_NONE
+    with metrics.stage('encrypt'):
+        body = preamble + encrypt(data, key, cipher_id, flags, codec)
+    with metrics.stage('frame'):
+        return pack_header(flags, cipher_id, codec, body) + body
+
+
+def open_frame(frame, key=None, passphrase=None):
+    """Verify and decrypt a payload frame, returning the original message bytes."""
+    header = parse_header(frame)
+    if header is None:
+        raise ValueError("Not a payload frame")
+    body = bytes(frame[HEADER_SIZE:HEADER_SIZE + header.length])
+    if len(body) != header.length:
+        raise ValueError(f"Truncated payload: expected {header.length} bytes, got {len(body)}")
+    if zlib.crc32(body) & 0xFFFFFFFF != header.crc:
+        raise ValueError("Payload CRC32 mismatch")
+    if header.flags & FLAG_KDF:
+        if not passphrase:
+            raise ValueError("Payload key was derived from a passphrase but no passphrase was provided")
+        salt, log_n, r, p = KDF_PREAMBLE.unpack(body[:KDF_PREAMBLE.size])
+        with metrics.stage('kdf'):
+            key = kdf.derive_key(passphrase, salt, (log_n, r, p))
+        body = body[KDF_PREAMBLE.size:]
+    with metrics.stage('decrypt'):
+        data = decrypt(body, key, header.cipher, header.flags, header.codec)
+    if header.codec == CODEC_NONE:
+        return data
+    with metrics.stage('decompress'):
+        return decompress(data, header.codec)
+
+
+def extract_frame_lsb(carrier, offset=0):
+    """Read a payload frame from the LSBs of a flat carrier array.
+
+    Returns the frame bytes, or None if the carrier does not start with one.
+    """
+    header = parse_header(extract_lsb(carrier, HEADER_SIZE, offset))
+    if header is None:
+        return None
+    return extract_lsb(carrier, HEADER_SIZE + header.length, offset)
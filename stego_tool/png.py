@@ -0,0 +1,227 @@
+# stego_tool/png.py
+import os
+import struct
+import zlib
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import nullcontext
+
+import numpy as np
+
+# A PNG writer for 8-bit pixel arrays that deflates bands of rows on several
+# threads (zlib releases the GIL while it compresses).
+#
+# Each band is filtered and compressed on its own. A band is primed with the
+# last 32 KB of filtered data before it, like pigz does, so matches can still
+# reach back across the boundary. Bands end on a byte boundary (sync flush),
+# the last one finishes the stream, and their Adler-32 checksums are
+# combined. The result is a single, ordinary zlib stream: any PNG reader
+# opens it, and it is barely larger than a single-threaded one.
+#
+# `first_rows` goes the other way for readers that only need the top of an
+# image: it inflates just the rows asked for and repacks them, still
+# filtered, as a smaller PNG.
+
+DEFAULT_LEVEL = 6
+DEFAULT_FILTER = 'adaptive'
+BAND_BYTES = 1 << 21   # filtered bytes per band
+WINDOW = 1 << 15       # deflate window, the most a match can reach back
+
+SIGNATURE = b'\x89PNG\r\n\x1a\n'
+COLOR_TYPES = {1: 0, 2: 4, 3: 2, 4: 6}  # channels -> gray, gray+alpha, RGB, RGBA
+CHANNELS = {0: 1, 2: 3, 3: 1, 4: 2, 6: 4}  # color type -> samples per pixel (3 is palette)
+
+# PNG filter types. 'adaptive' picks one per row: the one whose output has
+# the smallest sum of absolute (signed) bytes, the heuristic libpng uses.
+FILTERS = {'none': 0, 'sub': 1, 'up': 2, 'average': 3, 'paeth': 4, 'adaptive': None}
+
+# zlib strategies. 'filtered' is what libpng and Pillow use on filtered rows.
+# Pixels whose low bits carry a payload leave deflate few long matches, so
+# 'huffman' and 'rle' are often both faster and smaller on stego outputs.
+STRATEGIES = {'default': zlib.Z_DEFAULT_STRATEGY, 'filtered': zlib.Z_FILTERED,
+              'rle': zlib.Z_RLE, 'huffman': zlib.Z_HUFFMAN_ONLY}
+
+ADLER_BASE = 65521
+
+
+def _adler32_combine(adler1, adler2, length2):
+    """Adler-32 of two concatenated blocks from the checksums of each."""
+    a1, b1 = adler1 & 0xFFFF, adler1 >> 16
+    a2, b2 = adler2 & 0xFFFF, adler2 >> 16
+    a = (a1 + a2 - 1) % ADLER_BASE
+    b = (b1 + b2 + length2 * (a1 - 1)) % ADLER_BASE
+    return (b << 16) | a
+
+
+def _shift(rows, bpp):
+    """The byte `bpp` to the left of each byte of every row (0 before the first pixel)."""
+    left = np.zeros_like(rows)
+    left[:, bpp:] = rows[:, :-bpp]
+    return left
+
+
+def _paeth(rows, left, up, upleft):
+    a, b, c = (x.astype(np.int16) for x in (left, up, upleft))
+    pa, pb, pc = np.abs(b - c), np.abs(a - c), np.abs(a + b - 2 * c)
+    predictor = np.where((pa <= pb) & (pa <= pc), left, np.where(pb <= pc, up, upleft))
+    return rows - predictor
+
+
+def filter_rows(rows, previous, filter, bpp):
+    """Filter scanlines for PNG.
+
+    Args:
+        rows: (N, row bytes) uint8 array of raw scanlines
+        previous: The raw scanline above the first row, or None at the top
+        filter: A key of FILTERS
+        bpp: Bytes per pixel
+
+    Returns:
+        (N, 1 + row bytes) uint8 array, each row prefixed with its filter type.
+    """
+    up = np.empty_like(rows)
+    up[0] = 0 if previous is None else previous
+    up[1:] = rows[:-1]
+    kind = FILTERS[filter]
+    candidates = {}
+    if kind in (0, None):
+        candidates[0] = lambda: rows
+    if kind in (1, None):
+        candidates[1] = lambda: rows - _shift(rows, bpp)
+    if kind in (2, None):
+        candidates[2] = lambda: rows - up
+    if kind in (3, None):
+        candidates[3] = lambda: rows - ((_shift(rows, bpp).astype(np.uint16) + up) >> 1).astype(np.uint8)
+    if kind in (4, None):
+        candidates[4] = lambda: _paeth(rows, _shift(rows, bpp), up, _shift(up, bpp))
+
+    out = np.empty((rows.shape[0], rows.shape[1] + 1), dtype=np.uint8)
+    if kind is not None:
+        out[:, 0] = kind
+        out[:, 1:] = candidates[kind]()
+        return out
+    best = np.full(rows.shape[0], np.iinfo(np.int64).max)
+    for kind, make in candidates.items():
+        filtered = make()
+        cost = np.abs(filtered.view(np.int8).astype(np.int16)).sum(axis=1, dtype=np.int64)
+        better = cost < best
+        best[better] = cost[better]
+        out[better, 0] = kind
+        out[better, 1:] = filtered[better]
+    return out
+
+
+def _compress_band(scanlines, start, stop, filter, bpp, level, strategy, last):
+    """Filter and deflate rows start..stop; returns (compressed, adler32, length)."""
+    row_bytes = scanlines.shape[1]
+    # Rows before the band are filtered again to prime the window
+    context = min(start, -(-WINDOW // (row_bytes + 1)))
+    first = start - context
+    filtered = filter_rows(scanlines[first:stop], scanlines[first - 1] if first else None, filter, bpp)
+    data = filtered[context:].tobytes()
+    if context:
+        zdict = filtered[:context].tobytes()[-WINDOW:]
+        compressor = zlib.compressobj(level, zlib.DEFLATED, -15, 9, strategy, zdict)
+    else:
+        compressor = zlib.compressobj(level, zlib.DEFLATED, -15, 9, strategy)
+    compressed = compressor.compress(data) + compressor.flush(zlib.Z_FINISH if last else zlib.Z_SYNC_FLUSH)
+    return compressed, zlib.adler32(data), len(data)
+
+
+def _chunk(kind, data):
+    return struct.pack('>I', len(data)) + kind + data + struct.pack('>I', zlib.crc32(kind + data))
+
+
+def write_png(pixels, output, level=None, filter=None, strategy=None, threads=None):
+    """Write an 8-bit pixel array as a PNG file.
+
+    Args:
+        pixels: uint8 array, HxW (gray) or HxWxC with 1-4 channels (RGB, RGBA, ...)
+        output: File path or binary file object
+        level: zlib compression level, 0 (store) to 9 (default 6)
+        filter: A key of FILTERS (default 'adaptive')
+        strategy: A key of STRATEGIES (default 'filtered', or 'default' with no filter)
+        threads: Compression threads (default: CPU count)
+    """
+    level = DEFAULT_LEVEL if level is None else level
+    filter = filter or DEFAULT_FILTER
+    strategy = strategy or ('default' if filter == 'none' else 'filtered')
+    if not 0 <= level <= 9:
+        raise ValueError("PNG compression level must be between 0 and 9")
+    if filter not in FILTERS:
+        raise ValueError(f"Unknown PNG filter {filter!r}, expected one of {', '.join(FILTERS)}")
+    if strategy not in STRATEGIES:
+        raise ValueError(f"Unknown zlib strategy {strategy!r}, expected one of {', '.join(STRATEGIES)}")
+    pixels = np.ascontiguousarray(pixels, dtype=np.uint8)
+    height, width = pixels.shape[:2]
+    channels = 1 if pixels.ndim == 2 else pixels.shape[2]
+    if channels not in COLOR_TYPES:
+        raise ValueError(f"Cannot write {channels}-channel images as PNG")
+    scanlines = pixels.reshape(height, width * channels)
+
+    rows_per_band = max(1, BAND_BYTES // (width * channels + 1))
+    bands = [(start, min(start + rows_per_band, height)) for start in range(0, height, rows_per_band)]
+    threads = min(threads or os.cpu_count() or 1, len(bands))
+
+    def compress(band):
+        start, stop = band
+        return _compress_band(scanlines, start, stop, filter, channels, level,
+                              STRATEGIES[strategy], stop == height)
+
+    # zlib header: deflate with a 32 KB window, FLEVEL from the level; FCHECK makes it a multiple of 31
+    cmf = 0x78
+    flevel = 0 if level < 2 else 1 if level < 6 else 2 if level == 6 else 3
+    flg = flevel << 6
+    flg += 31 - (cmf * 256 + flg) % 31
+
+    with open(output, 'wb') if isinstance(output, (str, os.PathLike)) else nullcontext(output) as f:
+        f.write(SIGNATURE)
+        f.write(_chunk(b'IHDR', struct.pack('>IIBBBBB', width, height, 8, COLOR_TYPES[channels], 0, 0, 0)))
+        adler = 1
+        with ThreadPoolExecutor(max_workers=threads) as pool:
+            for index, (compressed, band_adler, length) in enumerate(pool.map(compress, bands)):
+                adler = _adler32_combine(adler, band_adler, length)
+                if index == 0:
+                    compressed = bytes((cmf, flg)) + compressed
+                if index == len(bands) - 1:
+                    compressed += struct.pack('>I', adler)
+                f.write(_chunk(b'IDAT', compressed))
+        f.write(_chunk(b'IEND', b''))
+
+
+def first_rows(source, rows):
+    """The first `rows` rows of a PNG file, as the bytes of a PNG of that height.
+
+    Only the compressed data those rows need is read and inflated. The
+    chunks before the image data (palette, transparency, ...) are kept, so
+    the result decodes like the top of the original. Returns None for
+    interlaced PNGs, whose first pass spans the whole image.
+    """
+    chunks = []
+    raw = bytearray()
+    needed = None
+    inflater = zlib.decompressobj()
+    with open(source, 'rb') as f:
+        if f.read(len(SIGNATURE)) != SIGNATURE:
+            raise ValueError("Not a PNG file")
+        while needed is None or len(raw) < needed:
+            head = f.read(8)
+            if len(head) < 8:
+                raise ValueError("Truncated PNG file")
+            length, kind = struct.unpack('>I4s', head)
+            data = f.read(length)
+            f.read(4)  # CRC, checked by the decoder of the result
+            if kind == b'IHDR':
+                width, height, depth, color, compression, filtering, interlace = struct.unpack('>IIBBBBB', data)
+                if interlace:
+                    return None
+                rows = min(rows, height)
+                needed = rows * (1 + -(-width * CHANNELS[color] * depth // 8))
+                data = struct.pack('>IIBBBBB', width, rows, depth, color, compression, filtering, 0)
+            elif kind == b'IDAT':
+                raw += inflater.decompress(inflater.unconsumed_tail + data, needed - len(raw))
+                continue
+            elif kind == b'IEND':
+                break
+            chunks.append(_chunk(kind, data))
+    return (SIGNATURE + b''.join(chunks) + _chunk(b'IDAT', zlib.compress(bytes(raw[:needed]), 1))
+            + _chunk(b'IEND', b''))
@@ -0,0 +1,60 @@
+# stego_tool/progress.py
+import contextvars
+import threading
+from contextlib import contextmanager
+
+# Long-running backend calls report progress and check for cancellation at
+# every metrics stage boundary and once per video frame. A caller (such as
+# the GUI) opts in by running the call inside `tracking(Progress(...))`:
+#
+#   progress = Progress(lambda stage, done, total: ...)
+#   with tracking(progress):
+#       VideoStego.encode_video(...)   # raises OperationCancelled after progress.cancel()
+#
+# `done`/`total` count frames for video loops; for plain stage boundaries they
+# are None. Without a tracker, reporting is a no-op.
+
+_current = contextvars.ContextVar('stego_progress', default=None)
+
+
+class OperationCancelled(Exception):
+    """Raised inside a backend call whose Progress was cancelled."""
+
+
+class Progress:
+    """Progress callback plus a thread-safe cancellation flag for one operation."""
+
+    def __init__(self, callback=None):
+        self.callback = callback
+        self._cancelled = threading.Event()
+
+    def cancel(self):
+        """Ask the operation to stop at its next checkpoint."""
+        self._cancelled.set()
+
+    @property
+    def cancelled(self):
+        return self._cancelled.is_set()
+
+    def update(self, stage, done=None, total=None):
+        if self._cancelled.is_set():
+            raise OperationCancelled(f"Cancelled during {stage}")
+        if self.callback:
+            self.callback(stage, done, total)
+
+
+@contextmanager
+def tracking(progress):
+    """Report the progress of backend calls made inside the block to `progress`."""
+    token = _current.set(progress)
+    try:
+        yield progress
+    finally:
+        _current.reset(token)
+
+
+def report(stage, done=None, total=None):
+    """Checkpoint called by the backends; raises OperationCancelled if cancelled."""
+    progress = _current.get()
+    if progress is not None:
+        progress.update(stage, done, total)
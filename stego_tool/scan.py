@@ -0,0 +1,195 @@
+# stego_tool/scan.py
+import functools
+import io
+import wave
+import zlib
+from concurrent.futures import ProcessPoolExecutor
+from contextlib import closing
+
+import numpy as np
+
+from .payload import CIPHERS, CODECS, FLAG_KDF, HEADER_SIZE, parse_header
+from .utils import detect_modality, iter_media
+
+# A scan tells which files carry a payload without decoding them. Each probe
+# reads only the start of the carrier: the first rows of a PNG, the first WAV
+# frames, or the first keyframes of a video. It then checks for
+#
+#   compact  A frame header with the right magic and a valid header CRC32.
+#            The record gives the payload size, cipher and codec. With
+#            `verify`, the whole frame is read and the body CRC32 checked too.
+#   legacy   The base64 Fernet token written by the original mode when a key
+#            was given. Unencrypted legacy messages have no signature and
+#            cannot be told apart from cover noise.
+#
+# Results are plain dicts, one per file:
+#
+#   {"path": ..., "modality": "image", "hit": true, "format": "compact",
+#    "payload_bytes": 1234, "cipher": "aesgcm", "codec": "zlib", "kdf": false}
+
+# base64(urlsafe Fernet token) always starts with base64('gAAAAA')
+LEGACY_SIGNATURE = b'Z0FBQUFB'
+
+CIPHER_NAMES = {value: name for name, value in CIPHERS.items()}
+CODEC_NAMES = {value: name for name, value in CODECS.items()}
+
+# video_stego.HEADER_BITS and len(TERMINATION_MARKER), repeated here so that
+# scanning images and audio never imports OpenCV
+VIDEO_HEADER_BITS = 16
+VIDEO_MARKER_BITS = 24
+
+
+def _image_bits(path, count):
+    """LSBs of the first `count` RGB values of an image."""
+    from PIL import Image
+    from . import png
+
+    with Image.open(path) as img:
+        if img.format == 'JPEG':
+            # JPEG outputs carry their payload in DCT coefficients, not pixels
+            from .jpeg import carrier_bits
+            return carrier_bits(img, count)
+        from . import multiframe
+        if multiframe.is_multiframe(img):
+            # Frames are only decoded as far as `count` reaches
+            return multiframe.carrier_bits(img, count)
+        width, height = img.size
+        rows = min(height, -(-count // (width * 3)))
+        # PNG rows are stored top to bottom, so only the rows needed are
+        # inflated; interlaced PNGs are decoded in full
+        head = png.first_rows(path, rows) if img.format == 'PNG' else None
+        if head is None:
+            pixels = np.asarray(img.convert('RGB'))
+    if head is not None:
+        with Image.open(io.BytesIO(head)) as top:
+            pixels = np.asarray(top.convert('RGB'))
+    return pixels[:rows].reshape(-1)[:count] & 1
+
+
+def _audio_bits(path, count):
+    """LSBs of the first `count` samples (interleaved channels) of a WAV file."""
+    with wave.open(path, 'rb') as audio:
+        width = audio.getsampwidth()
+        raw = audio.readframes(-(-count // audio.getnchannels()))
+    # Samples are little-endian, so every `width`-th byte holds a sample's LSB
+    return np.frombuffer(raw, dtype=np.uint8)[::width][:count] & 1
+
+
+def _is_lossless_video(path):
+    """Whether a video was written in lossless mode (FFV1), with its payload in the LSBs."""
+    import cv2
+    from .video_stego import VideoStego
+
+    cap = cv2.VideoCapture(path)
+    try:
+        return cap.isOpened() and VideoStego._is_lossless(cap)
+    finally:
+        cap.release()
+
+
+def _video_bits(path, count):
+    """The first `count` block-shift bits of a video, length header included.
+
+    Lossless videos have no length header; their bits are the LSBs of the frames.
+    """
+    import cv2
+    from .video_stego import BIT_THRESHOLD, HEADER_THRESHOLD, VideoStego, calibrate
+
+    cap = cv2.VideoCapture(path)
+    if not cap.isOpened():
+        raise ValueError("Could not open video file")
+    if VideoStego._is_lossless(cap):
+        try:
+            chunks = []
+            collected = 0
+            for frame in VideoStego.read_frames(cap):
+                chunks.append(frame.reshape(-1)[:count - collected] & 1)
+                collected += len(chunks[-1])
+                if collected >= count:
+                    break
+        finally:
+            cap.release()
+        return np.concatenate(chunks) if chunks else np.zeros(0, dtype=np.uint8)
+    diffs = []
+    collected = 0
+    try:
+        with closing(VideoStego._capture_diffs(cap)) as frame_diffs:
+            for block_diffs in frame_diffs:
+                diffs.append(block_diffs)
+                collected += len(block_diffs)
+                if collected >= count:
+                    break
+    finally:
+        cap.release()
+    if not diffs:
+        return np.zeros(0, dtype=np.uint8)
+    diffs = np.concatenate(diffs)[:count]
+    # Same thresholds as the decoders: calibrated when the diffs show two
+    # modes, otherwise fixed and stricter for the length header
+    threshold, _ = calibrate(diffs)
+    if threshold is not None:
+        return (diffs > threshold).astype(np.uint8)
+    bits = (diffs > BIT_THRESHOLD).astype(np.uint8)
+    bits[:VIDEO_HEADER_BITS] = diffs[:VIDEO_HEADER_BITS] > HEADER_THRESHOLD
+    return bits
+
+
+_READERS = {'image': _image_bits, 'audio': _audio_bits, 'video': _video_bits}
+
+
+def _to_bytes(bits):
+    return np.packbits(bits[:len(bits) - len(bits) % 8]).tobytes()
+
+
+def probe(path, verify=False):
+    """Check whether a single file carries a payload; returns a result record."""
+    result = {'path': path, 'modality': None, 'hit': False}
+    try:
+        modality = result['modality'] = detect_modality(path)
+        read_bits = _READERS[modality]
+        # Video payloads sit behind the length header of the block-shift scheme,
+        # except in lossless videos
+        skip = VIDEO_HEADER_BITS if modality == 'video' and not _is_lossless_video(path) else 0
+        bits = read_bits(path, skip + HEADER_SIZE * 8)
+        data = _to_bytes(bits[skip:])
+        header = parse_header(data)
+        if header is not None and skip:
+            # The length header covers the frame plus the termination marker
+            length_field = int(''.join(map(str, bits[:skip])), 2)
+            if length_field != (HEADER_SIZE + header.length) * 8 + VIDEO_MARKER_BITS:
+                header = None
+        if header is not None:
+            result.update(hit=True, format='compact', payload_bytes=HEADER_SIZE + header.length,
+                          cipher=CIPHER_NAMES.get(header.cipher), codec=CODEC_NAMES.get(header.codec),
+                          kdf=bool(header.flags & FLAG_KDF))
+            if verify:
+                bits = read_bits(path, skip + (HEADER_SIZE + header.length) * 8)
+                body = _to_bytes(bits[skip:])[HEADER_SIZE:]
+                result['verified'] = len(body) == header.length and zlib.crc32(body) & 0xFFFFFFFF == header.crc
+                result['hit'] = result['verified']
+        elif data.startswith(LEGACY_SIGNATURE):
+            result.update(hit=True, format='legacy', payload_bytes=None)
+    except Exception as e:
+        result['error'] = f"{type(e).__name__}: {e}"
+    return result
+
+
+def scan(paths, workers=None, verify=False, chunksize=32):
+    """Probe every media file under `paths` in a process pool.
+
+    Args:
+        paths: Files and/or directories (searched recursively)
+        workers: Number of worker processes (default: CPU count; 1 probes inline)
+        verify: Also read each compact payload in full and check its CRC32
+        chunksize: Files handed to a worker at a time
+
+    Yields:
+        One result record per file, in path order (see `probe`).
+    """
+    files = list(iter_media(paths))
+    check = functools.partial(probe, verify=verify)
+    if workers == 1 or len(files) <= 1:
+        yield from map(check, files)
+        return
+    with ProcessPoolExecutor(max_workers=workers) as pool:
+        yield from pool.map(check, files, chunksize=chunksize)
@@ -0,0 +1,238 @@
+# stego_tool/shard.py
+import contextlib
+import io
+import os
+import struct
+import zlib
+from concurrent.futures import ProcessPoolExecutor
+
+from . import kdf
+from .dispatch import backend_for
+from .payload import CODEC_NONE, decompress, frame_size, pick_codec
+from .stream import is_stream, iter_chunks
+from .utils import detect_modality, guess_modality, init_worker, iter_media
+
+# A payload too large for one carrier is split into shards, one per carrier.
+# The payload is compressed once as a whole, then cut into pieces sized to
+# each carrier's capacity. Every piece is prefixed with a shard header and
+# hidden as an ordinary compact frame, so each shard is encrypted and
+# CRC-checked on its own:
+#
+#   magic(4) | version(1) | codec(1) | set id(8) | index(2) | total(2) | crc32(4)
+#
+# The set id is random per payload, so shards of different payloads are never
+# mixed up. `crc32` covers the whole (compressed) payload and is checked after
+# reassembly. Carriers may be of any modality and are encoded and decoded in
+# parallel; decoding sorts the shards by index, whatever order they come in.
+
+SHARD_MAGIC = b'STSH'
+SHARD_VERSION = 1
+SHARD_HEADER = struct.Struct('>4sBB8sHHI')
+SET_ID_SIZE = 8
+MAX_SHARDS = 0xFFFF
+
+# Output extension per modality: lossless containers the backends write
+OUTPUT_EXTENSIONS = {'image': '.png', 'audio': '.wav'}
+VIDEO_EXTENSIONS = ('.avi', '.mp4')
+
+
+def shard_budget(cover_path, cipher='aesgcm', passphrase=False):
+    """Payload bytes a cover can hold as one shard (shard header and encryption excluded)."""
+    capacity = backend_for(guess_modality(cover_path)).capacity(cover_path)['capacity']
+    return capacity_budget(capacity, cipher, passphrase)
+
+
+def capacity_budget(capacity, cipher='aesgcm', passphrase=False):
+    """Payload bytes a shard can hold in a frame of at most `capacity` bytes."""
+    budget = capacity - frame_size(SHARD_HEADER.size, cipher, passphrase)
+    # Fernet pads to 16 bytes, so the overhead is not quite constant
+    while budget > 0 and frame_size(SHARD_HEADER.size + budget, cipher, passphrase) > capacity:
+        budget -= 1
+    return budget
+
+
+def split_sizes(length, budgets):
+    """Split `length` bytes across carriers in proportion to their budgets.
+
+    Spreading the payload keeps the embedding density equal in every carrier
+    instead of filling the first ones to the brim.
+    """
+    total = sum(budgets)
+    if length > total:
+        raise ValueError(f"Payload needs {length} bytes, the carriers hold only {total}")
+    sizes = [length * budget // total if total else 0 for budget in budgets]
+    spare = sorted(range(len(budgets)), key=lambda i: budgets[i] - sizes[i], reverse=True)
+    for i in spare[:length - sum(sizes)]:
+        sizes[i] += 1
+    return sizes
+
+
+def fill_sizes(length, budgets):
+    """Split `length` bytes across carriers by filling them in order; later ones may get nothing."""
+    if length > sum(budgets):
+        raise ValueError(f"Payload needs {length} bytes, the carriers hold only {sum(budgets)}")
+    sizes = []
+    for budget in budgets:
+        sizes.append(min(budget, length))
+        length -= sizes[-1]
+    return sizes
+
+
+def make_shards(payload, budgets, compression=None, level=None, fill=False):
+    """Compress `payload` once and cut it into one shard per budget.
+
+    With `fill`, the carriers are filled in order (see fill_sizes) instead
+    of sharing the payload in proportion to their budgets.
+
+    Returns:
+        The shard plaintexts (shard header + piece), in index order.
+    """
+    if is_stream(payload):
+        payload = b''.join(iter_chunks(payload))
+    elif isinstance(payload, str):
+        payload = payload.encode()
+    if len(budgets) > MAX_SHARDS:
+        raise ValueError(f"At most {MAX_SHARDS} carriers can share a payload")
+    codec, data = pick_codec(payload, compression, level) if compression else (CODEC_NONE, payload)
+    crc = zlib.crc32(data) & 0xFFFFFFFF
+    set_id = os.urandom(SET_ID_SIZE)
+    shards = []
+    start = 0
+    for index, size in enumerate((fill_sizes if fill else split_sizes)(len(data), budgets)):
+        head = SHARD_HEADER.pack(SHARD_MAGIC, SHARD_VERSION, codec, set_id, index, len(budgets), crc)
+        shards.append(head + data[start:start + size])
+        start += size
+    return shards
+
+
+def parse_shard(data):
+    """Split a decoded payload into (set id, index, total, codec, crc, piece), or None if it is no shard."""
+    if len(data) < SHARD_HEADER.size:
+        return None
+    magic, version, codec, set_id, index, total, crc = SHARD_HEADER.unpack(data[:SHARD_HEADER.size])
+    if magic != SHARD_MAGIC or version != SHARD_VERSION or index >= total:
+        return None
+    return set_id, index, total, codec, crc, data[SHARD_HEADER.size:]
+
+
+def shard_output(cover_path, directory):
+    """Output path for a cover's shard: same name in `directory`, in a lossless container."""
+    stem, ext = os.path.splitext(os.path.basename(cover_path))
+    modality = guess_modality(cover_path)
+    if modality == 'video':
+        ext = ext if ext.lower() in VIDEO_EXTENSIONS else '.avi'
+    else:
+        ext = OUTPUT_EXTENSIONS[modality]
+    return os.path.join(directory, stem + ext)
+
+
+def _encode_shard(job):
+    """Hide one shard in a cover (runs in a worker process)."""
+    cover, output, shard, key, cipher, passphrase, salt = job
+    modality = guess_modality(cover)
+    log = io.StringIO()
+    with contextlib.redirect_stdout(log):
+        written = getattr(backend_for(modality), f'encode_{modality}')(
+            cover, shard, output, key, True, cipher, None, None, passphrase, salt)
+    if written is None or not os.path.exists(written):
+        lines = log.getvalue().strip().splitlines()
+        raise RuntimeError(f"Encoding {cover} failed: {lines[-1] if lines else 'see log'}")
+    return written
+
+
+def _read_shard(job):
+    """Recover the shard hidden in one file (runs in a worker process)."""
+    path, key, passphrase = job
+    modality = detect_modality(path)
+    backend = backend_for(modality)
+    if modality == 'video':
+        import cv2
+
+        # Only the frames: decode_to_file would take a shard for the first
+        # half of a hybrid payload and look for the rest in the audio track
+        cap = cv2.VideoCapture(path)
+        if not cap.isOpened():
+            raise ValueError(f"Could not open video file {path}")
+        try:
+            data = backend.decode_frames(backend.read_frames(cap), key, passphrase)
+        finally:
+            cap.release()
+    else:
+        buffer = io.BytesIO()
+        backend.decode_to_file(path, buffer, key, passphrase)
+        data = buffer.getvalue()
+    shard = parse_shard(bytes(data))
+    if shard is None:
+        raise ValueError(f"{path} does not carry a shard")
+    return shard
+
+
+def _map(func, jobs, workers):
+    if workers == 1 or len(jobs) <= 1:
+        return list(map(func, jobs))
+    with ProcessPoolExecutor(max_workers=workers, initializer=init_worker) as pool:
+        return list(pool.map(func, jobs))
+
+
+def encode_shards(payload, jobs, key=None, cipher='aesgcm', compression=None, level=None,
+                  passphrase=None, salt=None, workers=None):
+    """Split a payload across several covers and encode them in parallel.
+
+    Args:
+        payload: Message as str or bytes, or a binary file object or iterator
+        jobs: (cover_path, output_path) pairs; covers may be images, audio or video
+        key: Fernet key (if None and no passphrase, shards are stored unencrypted)
+        cipher: 'aesgcm' or 'fernet'
+        compression: 'zlib', 'lzma', 'zstd', 'auto' or None, applied to the whole payload
+        level: Compression level passed to the codec
+        passphrase: Derive the key from this passphrase (one salt for all shards)
+        salt: KDF salt (random if None)
+        workers: Number of worker processes (default: CPU count; 1 encodes inline)
+
+    Returns:
+        The output paths, in job order.
+    """
+    jobs = list(jobs)
+    encrypted = bool(key or passphrase)
+    budgets = [shard_budget(cover, cipher if encrypted else 'none', bool(passphrase)) for cover, _ in jobs]
+    for (cover, _), budget in zip(jobs, budgets):
+        if budget < 0:
+            raise ValueError(f"{cover} is too small to carry a shard")
+    shards = make_shards(payload, budgets, compression, level)
+    if passphrase and salt is None:
+        # Shared by every shard, so each worker derives the key only once
+        salt = kdf.generate_salt()
+    return _map(_encode_shard, [(cover, output, shard, key, cipher, passphrase, salt)
+                                for (cover, output), shard in zip(jobs, shards)], workers)
+
+
+def decode_shards(paths, key=None, passphrase=None, workers=None):
+    """Read the shards hidden in `paths` (files and/or directories) and reassemble the payload.
+
+    Shards may come in any order. Raises ValueError when a file carries no
+    shard, when shards of different payloads are mixed, when shards are
+    missing, or when the reassembled payload fails its CRC32.
+    """
+    files = list(iter_media(paths))
+    return join_shards(_map(_read_shard, [(path, key, passphrase) for path in files], workers))
+
+
+def join_shards(shards):
+    """Reassemble a payload from parsed shards (see parse_shard), given in any order.
+
+    Raises ValueError when shards of different payloads are mixed, when
+    shards are missing, or when the reassembled payload fails its CRC32.
+    """
+    if not shards:
+        raise ValueError("No shards found")
+    if len({shard[0] for shard in shards}) > 1:
+        raise ValueError("The files carry shards of more than one payload")
+    _, _, total, codec, crc, _ = shards[0]
+    pieces = {shard[1]: shard[5] for shard in shards}
+    missing = [index for index in range(total) if index not in pieces]
+    if missing:
+        raise ValueError(f"Missing {len(missing)} of {total} shards (indexes {', '.join(map(str, missing))})")
+    data = b''.join(pieces[index] for index in range(total))
+    if zlib.crc32(data) & 0xFFFFFFFF != crc:
+        raise ValueError("Reassembled payload CRC32 mismatch")
+    return data if codec == CODEC_NONE else decompress(data, codec)
@@ -0,0 +1,368 @@
+# stego_tool/stream.py
+import base64
+import os
+import shutil
+import struct
+import tempfile
+import time
+import zlib
+from contextlib import contextmanager
+
+from cryptography.exceptions import InvalidSignature
+from cryptography.fernet import InvalidToken
+from cryptography.hazmat.primitives import hashes, hmac, padding
+from cryptography.hazmat.primitives.ciphers import Cipher, algorithms, modes
+
+from . import kdf, metrics
+from .payload import (CIPHER_AESGCM, CIPHER_FERNET, CIPHER_NONE, CIPHERS, CODEC_NONE, CODECS,
+                      FLAG_KDF, HEADER_SIZE, KDF_PREAMBLE, NONCE_SIZE, _aad, _key_bytes,
+                      compressor, decompressor, header_for, parse_header)
+from .utils import embed_lsb, extract_lsb
+
+# Payloads given as a binary file object or an iterator of byte chunks are
+# framed chunk by chunk. They pass through compression and encryption as they
+# are read, so memory stays bounded whatever the payload size.
+#
+# The frames are identical to those of `payload.build_frame`:
+#   - AES-GCM runs as a stream cipher, with its tag appended at the end.
+#   - Fernet tokens are assembled from AES-CBC and HMAC-SHA256, following the
+#     Fernet spec.
+# The header needs the length and CRC32 of the whole body, so carriers with
+# random access (pixel and sample arrays) get the body first and the header
+# last.
+#
+# Decoding streams the other way: body chunks are checked, decrypted and
+# decompressed into a file. Plaintext reaches the file before the GCM tag or
+# the Fernet HMAC is checked at the end, so `atomic_output` only puts the file
+# in place (or copies the payload to an open stream such as stdout) once the
+# whole payload has been verified.
+
+CHUNK_SIZE = 1 << 20
+# Payloads bound for an open stream are held in memory up to this size, then in a temp file
+SPOOL_SIZE = 16 << 20
+
+FERNET_VERSION = 0x80
+FERNET_PREFIX_SIZE = 1 + 8 + 16  # version, timestamp, IV
+
+# Cipher bytes before and after the ciphertext proper
+CIPHER_PREFIX = {CIPHER_NONE: 0, CIPHER_AESGCM: NONCE_SIZE, CIPHER_FERNET: FERNET_PREFIX_SIZE}
+CIPHER_SUFFIX = {CIPHER_NONE: 0, CIPHER_AESGCM: 16, CIPHER_FERNET: 32}
+
+
+def is_stream(payload):
+    """Whether a payload is a file object or iterator rather than str/bytes."""
+    return not isinstance(payload, (str, bytes, bytearray, memoryview))
+
+
+def iter_chunks(payload, chunk_size=CHUNK_SIZE):
+    """Yield a payload (file object, iterable of chunks, str or bytes) as bytes chunks."""
+    if isinstance(payload, str):
+        yield payload.encode()
+    elif not is_stream(payload):
+        yield bytes(payload)
+    elif hasattr(payload, 'read'):
+        for chunk in iter(lambda: payload.read(chunk_size), b''):
+            yield chunk
+    else:
+        for chunk in payload:
+            yield chunk.encode() if isinstance(chunk, str) else bytes(chunk)
+
+
+def _encryptor(key, cipher, flags, codec):
+    """Start encrypting a stream; returns (prefix bytes, update, finalize)."""
+    if cipher == CIPHER_NONE:
+        return b'', lambda data: data, lambda: b''
+    key = base64.urlsafe_b64decode(_key_bytes(key))
+    if cipher == CIPHER_AESGCM:
+        nonce = os.urandom(NONCE_SIZE)
+        encryptor = Cipher(algorithms.AES(key), modes.GCM(nonce)).encryptor()
+        encryptor.authenticate_additional_data(_aad(flags, cipher, codec))
+        return nonce, encryptor.update, lambda: encryptor.finalize() + encryptor.tag
+    if cipher == CIPHER_FERNET:
+        iv = os.urandom(16)
+        prefix = bytes([FERNET_VERSION]) + struct.pack('>Q', int(time.time())) + iv
+        encryptor = Cipher(algorithms.AES(key[16:]), modes.CBC(iv)).encryptor()
+        padder = padding.PKCS7(128).padder()
+        signature = hmac.HMAC(key[:16], hashes.SHA256())
+        signature.update(prefix)
+
+        def update(data):
+            data = encryptor.update(padder.update(data))
+            signature.update(data)
+            return data
+
+        def finalize():
+            data = encryptor.update(padder.finalize()) + encryptor.finalize()
+            signature.update(data)
+            return data + signature.finalize()
+
+        return prefix, update, finalize
+    raise ValueError(f"Unknown cipher id: {cipher}")
+
+
+def _decryptor(key, cipher, flags, codec, prefix):
+    """Start decrypting a stream; returns (update, finalize(suffix bytes))."""
+    if cipher == CIPHER_NONE:
+        return lambda data: data, lambda suffix: b''
+    if not key:
+        raise ValueError("Payload is encrypted but no key was provided")
+    key = base64.urlsafe_b64decode(_key_bytes(key))
+    if cipher == CIPHER_AESGCM:
+        decryptor = Cipher(algorithms.AES(key), modes.GCM(prefix)).decryptor()
+        decryptor.authenticate_additional_data(_aad(flags, cipher, codec))
+        return decryptor.update, decryptor.finalize_with_tag
+    if cipher == CIPHER_FERNET:
+        if prefix[0] != FERNET_VERSION:
+            raise InvalidToken
+        decryptor = Cipher(algorithms.AES(key[16:]), modes.CBC(prefix[9:])).decryptor()
+        unpadder = padding.PKCS7(128).unpadder()
+        signature = hmac.HMAC(key[:16], hashes.SHA256())
+        signature.update(prefix)
+
+        def update(data):
+            signature.update(data)
+            return unpadder.update(decryptor.update(data))
+
+        def finalize(suffix):
+            try:
+                signature.verify(suffix)
+            except InvalidSignature:
+                raise InvalidToken
+            return unpadder.update(decryptor.finalize()) + unpadder.finalize()
+
+        return update, finalize
+    raise ValueError(f"Unknown cipher id: {cipher}")
+
+
+class FrameEncoder:
+    """Build a compact payload frame from a streamed payload.
+
+    Iterating yields the frame body in chunks. Once it is exhausted, `header`
+    holds the frame header and `size` the size of the whole frame.
+    Arguments match `payload.build_frame`, except that 'auto' compression is
+    not available: it needs the whole payload to compare codecs.
+    """
+
+    def __init__(self, payload, key=None, cipher='aesgcm', compression=None, level=None,
+                 passphrase=None, salt=None, kdf_params=kdf.DEFAULT_PARAMS, chunk_size=CHUNK_SIZE):
+        if compression == 'auto':
+            raise ValueError("'auto' compression needs the whole payload, pick a codec for streamed payloads")
+        self.payload = payload
+        self.codec = CODECS[compression] if compression else CODEC_NONE
+        self.level = level
+        self.chunk_size = chunk_size
+        self.flags = 0
+        self.preamble = b''
+        if passphrase:
+            salt = kdf.generate_salt() if salt is None else bytes(salt)
+            if len(salt) != kdf.SALT_SIZE:
+                raise ValueError(f"Salt must be {kdf.SALT_SIZE} bytes")
+            with metrics.stage('kdf'):
+                key = kdf.derive_key(passphrase, salt, kdf_params)
+            self.flags |= FLAG_KDF
+            self.preamble = KDF_PREAMBLE.pack(salt, *kdf_params)
+        self.key = key
+        self.cipher = CIPHERS[cipher] if key else CIPHER_NONE
+        self.header = None
+        self.size = None
+
+    def __iter__(self):
+        timer = metrics.StageTimer()
+        packer = compressor(self.codec, self.level) if self.codec != CODEC_NONE else None
+        prefix, encrypt, finalize = _encryptor(self.key, self.cipher, self.flags, self.codec)
+        length = 0
+        crc = 0
+        first = self.preamble + prefix
+        for chunk in iter_chunks(self.payload, self.chunk_size):
+            if packer:
+                with timer('compress'):
+                    chunk = packer.compress(chunk)
+            with timer('encrypt'):
+                chunk = first + encrypt(chunk)
+            first = b''
+            if chunk:
+                length += len(chunk)
+                crc = zlib.crc32(chunk, crc)
+                yield chunk
+        with timer('encrypt'):
+            tail = first + encrypt(packer.flush()) if packer else first
+            tail += finalize()
+        length += len(tail)
+        crc = zlib.crc32(tail, crc)
+        timer.flush()
+        yield tail
+        with metrics.stage('frame'):
+            self.header = header_for(self.flags, self.cipher, self.codec, length, crc & 0xFFFFFFFF)
+        self.size = HEADER_SIZE + length
+
+    def to_bytes(self, limit=None):
+        """The whole frame as bytes, for carriers that need the header first.
+
+        Raises ValueError as soon as the frame grows beyond `limit` bytes.
+        """
+        body = bytearray()
+        for chunk in self:
+            body += chunk
+            if limit is not None and HEADER_SIZE + len(body) > limit:
+                raise ValueError(f"Payload frame exceeds the carrier limit of {limit} bytes")
+        return self.header + bytes(body)
+
+
+class FrameDecoder:
+    """Verify, decrypt and decompress a frame body fed in chunks.
+
+    `feed` returns the plaintext available so far. `finish` returns the rest,
+    after checking the body CRC32 and the cipher's tag or HMAC.
+    """
+
+    def __init__(self, header, key=None, passphrase=None):
+        if header.flags & FLAG_KDF and not passphrase:
+            raise ValueError("Payload key was derived from a passphrase but no passphrase was provided")
+        self.header = header
+        self.key = key
+        self.passphrase = passphrase
+        self._prefix_end = (KDF_PREAMBLE.size if header.flags & FLAG_KDF else 0) + CIPHER_PREFIX[header.cipher]
+        self._suffix_start = header.length - CIPHER_SUFFIX[header.cipher]
+        if self._suffix_start < self._prefix_end:
+            raise ValueError("Payload frame is too short for its cipher")
+        self._position = 0
+        self._prefix = b''
+        self._suffix = b''
+        self._crc = 0
+        self._decrypt = None
+        self._unpacker = decompressor(header.codec) if header.codec != CODEC_NONE else None
+        self._timer = metrics.StageTimer()
+        if self._prefix_end == 0:
+            self._start()
+
+    def _start(self):
+        prefix = self._prefix
+        key = self.key
+        if self.header.flags & FLAG_KDF:
+            salt, log_n, r, p = KDF_PREAMBLE.unpack(prefix[:KDF_PREAMBLE.size])
+            with metrics.stage('kdf'):
+                key = kdf.derive_key(self.passphrase, salt, (log_n, r, p))
+            prefix = prefix[KDF_PREAMBLE.size:]
+        self._decrypt, self._finalize = _decryptor(key, self.header.cipher, self.header.flags,
+                                                   self.header.codec, prefix)
+
+    def _plain(self, data):
+        with self._timer('decrypt'):
+            data = self._decrypt(data)
+        if self._unpacker and data:
+            with self._timer('decompress'):
+                data = self._unpacker.decompress(data)
+        return data
+
+    def feed(self, data):
+        """Take the next body chunk; returns the plaintext it completes."""
+        if self._position + len(data) > self.header.length:
+            raise ValueError("More payload data than the frame header announces")
+        self._crc = zlib.crc32(data, self._crc)
+        out = []
+        while data:
+            if self._position < self._prefix_end:
+                take = min(len(data), self._prefix_end - self._position)
+                self._prefix += data[:take]
+                if self._position + take == self._prefix_end:
+                    self._start()
+            elif self._position < self._suffix_start:
+                take = min(len(data), self._suffix_start - self._position)
+                out.append(self._plain(data[:take]))
+            else:
+                take = len(data)
+                self._suffix += data
+            self._position += take
+            data = data[take:]
+        return b''.join(out)
+
+    def finish(self):
+        """Check the whole body and return the remaining plaintext."""
+        if self._position != self.header.length:
+            raise ValueError(f"Truncated payload: expected {self.header.length} bytes, got {self._position}")
+        if self._crc & 0xFFFFFFFF != self.header.crc:
+            raise ValueError("Payload CRC32 mismatch")
+        with self._timer('decrypt'):
+            data = self._finalize(self._suffix)
+        if self._unpacker:
+            with self._timer('decompress'):
+                # LZMA refuses input, even empty, once its stream has ended
+                if data:
+                    data = self._unpacker.decompress(data)
+                if hasattr(self._unpacker, 'flush'):
+                    data += self._unpacker.flush()
+        self._timer.flush()
+        return data
+
+
+def embed_frame_lsb(carrier, frame, offset=0):
+    """Embed a frame (bytes or a FrameEncoder) in the LSBs of a flat carrier array.
+
+    A FrameEncoder is embedded as it is produced: body first, header last.
+    Returns the index of the first carrier element after the frame.
+    """
+    if not isinstance(frame, FrameEncoder):
+        with metrics.stage('embed'):
+            return embed_lsb(carrier, frame, offset)
+    timer = metrics.StageTimer()
+    end = offset + HEADER_SIZE * 8
+    for chunk in frame:
+        with timer('embed'):
+            end = embed_lsb(carrier, chunk, end)
+    with timer('embed'):
+        embed_lsb(carrier, frame.header, offset)
+    timer.flush()
+    return end
+
+
+def extract_frame_lsb_to(carrier, out, key=None, passphrase=None, offset=0, chunk_size=CHUNK_SIZE):
+    """Stream the message of a frame in a carrier's LSBs to a binary file object.
+
+    Returns the number of bytes written, or None if the carrier does not start
+    with a frame.
+    """
+    header = parse_header(extract_lsb(carrier, HEADER_SIZE, offset))
+    if header is None:
+        return None
+    decoder = FrameDecoder(header, key, passphrase)
+    timer = metrics.StageTimer()
+    position = offset + HEADER_SIZE * 8
+    remaining = header.length
+    written = 0
+    while remaining:
+        take = min(chunk_size, remaining)
+        with timer('extract'):
+            data = extract_lsb(carrier, take, position)
+        if len(data) < take:
+            raise ValueError(f"Truncated payload: expected {header.length} bytes")
+        written += out.write(decoder.feed(data))
+        position += take * 8
+        remaining -= take
+    timer.flush()
+    written += out.write(decoder.finish())
+    return written
+
+
+@contextmanager
+def atomic_output(path):
+    """Open `path` for binary writing; the file only appears if the block succeeds.
+
+    For an already open binary file object (e.g. stdout) the output is
+    spooled and only copied to it if the block succeeds, so nothing from an
+    unverified payload is ever written there.
+    """
+    if hasattr(path, 'write'):
+        with tempfile.SpooledTemporaryFile(max_size=SPOOL_SIZE) as spool:
+            yield spool
+            spool.seek(0)
+            shutil.copyfileobj(spool, path)
+        return
+    directory = os.path.dirname(os.path.abspath(path))
+    fd, temp_path = tempfile.mkstemp(dir=directory, prefix='.' + os.path.basename(path), suffix='.part')
+    try:
+        with os.fdopen(fd, 'wb') as out:
+            yield out
+        os.replace(temp_path, path)
+    except BaseException:
+        os.remove(temp_path)
+        raise
@@ -1,6 +1,154 @@
-# stego_tool/utils.py
-def to_binary(data):
-    return ''.join(format(ord(char), '08b') for char in data)
-
-def from_binary(binary_data):
-    return ''.join(chr(int(binary_data[i:i+8], 2)) for i in range(0, len(binary_data), 8))
\ No newline at end of file
+# stego_tool/utils.py
+import csv
+import io
+import json
+import os
+import sys
+
+import numpy as np
+
+def to_binary(data):
+    return ''.join(format(ord(char), '08b') for char in data)
+
+def from_binary(binary_data):
+    return ''.join(chr(int(binary_data[i:i+8], 2)) for i in range(0, len(binary_data), 8))
+
+def embed_lsb(carrier, data, offset=0):
+    """Write the bits of `data` into the LSBs of a flat integer array, in place.
+
+    Bits are stored MSB first, one per element, starting at element `offset`.
+    """
+    bits = np.unpackbits(np.frombuffer(bytes(data), dtype=np.uint8))
+    end = offset + len(bits)
+    if end > carrier.size:
+        raise ValueError(f"Payload needs {end} carrier elements, only {carrier.size} available")
+    region = carrier[offset:end]
+    region &= ~carrier.dtype.type(1)
+    region |= bits.astype(carrier.dtype)
+    return end
+
+def extract_lsb(carrier, nbytes, offset=0):
+    """Read `nbytes` bytes back from the LSBs of a flat integer array."""
+    bits = (carrier[offset:offset + nbytes * 8] & 1).astype(np.uint8)
+    return np.packbits(bits).tobytes()
+
+IMAGE_EXTENSIONS = ('.png', '.jpg', '.jpeg', '.bmp', '.tiff', '.tif', '.gif', '.webp')
+AUDIO_EXTENSIONS = ('.wav', '.mp3', '.ogg', '.flac')
+VIDEO_EXTENSIONS = ('.mp4', '.avi', '.mkv', '.mov')
+
+def guess_modality(path):
+    """Return 'image', 'audio' or 'video' based on a file extension."""
+    ext = os.path.splitext(path)[1].lower()
+    if ext in IMAGE_EXTENSIONS:
+        return 'image'
+    if ext in AUDIO_EXTENSIONS:
+        return 'audio'
+    if ext in VIDEO_EXTENSIONS:
+        return 'video'
+    raise ValueError(f"Cannot tell the media type of {path}")
+
+MEDIA_EXTENSIONS = IMAGE_EXTENSIONS + AUDIO_EXTENSIONS + VIDEO_EXTENSIONS
+
+# Leading bytes of each supported format: (offset, signature, modality)
+SIGNATURES = (
+    (0, b'\x89PNG\r\n\x1a\n', 'image'),
+    (0, b'\xff\xd8\xff', 'image'),  # JPEG
+    (0, b'GIF87a', 'image'),
+    (0, b'GIF89a', 'image'),
+    (0, b'BM', 'image'),
+    (0, b'II*\x00', 'image'),  # TIFF, little endian
+    (0, b'MM\x00*', 'image'),  # TIFF, big endian
+    (8, b'WEBP', 'image'),  # RIFF container
+    (8, b'WAVE', 'audio'),
+    (8, b'AVI ', 'video'),
+    (0, b'ID3', 'audio'),  # MP3 with an ID3v2 tag
+    (0, b'OggS', 'audio'),
+    (0, b'fLaC', 'audio'),
+    (0, b'\x1a\x45\xdf\xa3', 'video'),  # Matroska/WebM (EBML)
+    (4, b'ftyp', 'video'),  # MP4/MOV, unless the brand says audio (see AUDIO_BRANDS)
+)
+# ISO base media brands of audio-only files
+AUDIO_BRANDS = (b'M4A ', b'M4B ', b'M4P ')
+SNIFF_SIZE = 12
+
+def sniff_modality(source):
+    """Return 'image', 'audio' or 'video' from the first bytes of a file, or None if unrecognised.
+
+    `source` is a path or a seekable binary file object, which is left at the
+    position it had. Only SNIFF_SIZE bytes are read; nothing is decoded.
+    """
+    if isinstance(source, (str, os.PathLike)):
+        with open(source, 'rb') as f:
+            head = f.read(SNIFF_SIZE)
+    else:
+        position = source.tell()
+        head = source.read(SNIFF_SIZE)
+        source.seek(position)
+    for offset, signature, modality in SIGNATURES:
+        if head[offset:offset + len(signature)] == signature:
+            if signature == b'ftyp' and head[8:12] in AUDIO_BRANDS:
+                return 'audio'
+            return modality
+    # Bare MPEG audio frames start with an 11-bit sync word
+    if len(head) >= 2 and head[0] == 0xFF and head[1] & 0xE0 == 0xE0:
+        return 'audio'
+    return None
+
+def detect_modality(source):
+    """Like sniff_modality, falling back to guess_modality for unrecognised paths."""
+    modality = sniff_modality(source)
+    if modality is None:
+        if not isinstance(source, (str, os.PathLike)):
+            raise ValueError("Cannot tell the media type of the input")
+        modality = guess_modality(source)
+    return modality
+
+def iter_media(paths):
+    """Yield the media files among `paths`, walking directories recursively.
+
+    Files named explicitly are always included; inside directories only files
+    with a known image, audio or video extension are.
+    """
+    for path in paths:
+        if not os.path.isdir(path):
+            yield path
+            continue
+        for root, dirs, files in os.walk(path):
+            dirs.sort()
+            for name in sorted(files):
+                if name.lower().endswith(MEDIA_EXTENSIONS):
+                    yield os.path.join(root, name)
+
+# Console output of the backends in a worker process (see init_worker)
+_worker_log = None
+
+def init_worker():
+    """Process pool initializer: import every backend once so jobs start warm.
+
+    The worker's stdout is replaced by a buffer once, for the life of the
+    process, so each job's console output can be collected with
+    take_worker_log without swapping sys.stdout around every job.
+    """
+    global _worker_log
+    from . import image_stego, audio_stego, video_stego  # noqa: F401
+    _worker_log = sys.stdout = io.StringIO()
+
+def take_worker_log():
+    """The console output since the last call, in a worker process ('' elsewhere)."""
+    if _worker_log is None:
+        return ''
+    text = _worker_log.getvalue()
+    _worker_log.seek(0)
+    _worker_log.truncate()
+    return text
+
+def read_manifest(path):
+    """Read a job manifest as a list of dicts.
+
+    JSON Lines (one object per line, `.jsonl`/`.json`) and CSV with a header
+    row are supported. Blank lines are skipped.
+    """
+    with open(path, newline='', encoding='utf-8') as f:
+        if path.lower().endswith(('.jsonl', '.json')):
+            return [json.loads(line) for line in f if line.strip()]
+        return [row for row in csv.DictReader(f) if any(row.values())]
@@ -1,11 +1,140 @@
+import contextvars
 import cv2
 import numpy as np
 import os
+import shutil
 import subprocess
 import tempfile
+import time
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import closing
 from cryptography.fernet import Fernet
 import base64
 import re
+from . import metrics, progress, yuv
+from .payload import HEADER_SIZE, build_frame, is_frame, open_frame, parse_header
+from .stream import FrameEncoder, atomic_output, is_stream
+
+# Block-shift scheme parameters, shared by the file and in-memory APIs
+BLOCK_SIZE = 16  # 16×16 pixel blocks, one bit each
+COLOR_SHIFT = 12  # red/blue shift applied to a block
+KEYFRAME_INTERVAL = 2  # every 2nd frame carries data
+HEADER_BITS = 16  # length header in front of the message bits
+TERMINATION_MARKER = '101010101010101010101010'
+# The length header counts the message and marker bits, which caps the payload
+MAX_MESSAGE_BYTES = ((1 << HEADER_BITS) - 1 - len(TERMINATION_MARKER)) // 8
+# Fixed red-minus-blue thresholds for header and message bits, used when the
+# block diffs cannot be calibrated (see calibrate)
+HEADER_THRESHOLD = 5
+BIT_THRESHOLD = 0
+# A calibrated threshold is only trusted when the split explains this share
+# of the diffs' variance (a single Gaussian mode gives about 0.64) and the
+# two modes are this many of their own standard deviations apart. Codecs
+# shrink the gap well below the embedded 4 * COLOR_SHIFT (XVID to about
+# 19), so it is measured, not assumed
+MIN_CONFIDENCE = 0.7
+MIN_SEPARATION = 4
+# The same shift on the chroma planes of the YUV path: raising red and lowering
+# blue by COLOR_SHIFT moves Cr up and Cb down (BT.601, limited range), which
+# changes red minus blue by the same amount as the BGR path
+CR_SHIFT = round(COLOR_SHIFT * (0.439 + 0.071))  # 6
+CB_SHIFT = round(COLOR_SHIFT * (0.148 + 0.439))  # 7
+# Lossless mode: FFV1 in Matroska keeps every value, so a compact frame sits
+# in the LSBs of the BGR values of whole frames, frame after frame
+LOSSLESS_FOURCC = 'FFV1'
+LOSSLESS_EXTENSION = '.mkv'
+# Hybrid mode: the audio track, decoded to 16-bit PCM, carries most of the
+# payload as a second shard (see shard.py) and is re-encoded losslessly
+HYBRID_AUDIO_CODECS = {'.mp4': 'alac', '.m4v': 'alac'}  # MP4 takes no PCM
+HYBRID_AUDIO_CODEC = 'pcm_s16le'
+# Set while encode_video embeds the frames half of a hybrid payload: the
+# hybrid encoder muxes the audio track and reports the output itself
+_HYBRID_FRAMES = contextvars.ContextVar('hybrid_frames', default=False)
+
+
+def calibrate(diffs):
+    """Pick the bit threshold for red-minus-blue block diffs from their two modes.
+
+    Uses Otsu's method: the split of the sorted diffs (a histogram with one
+    bin per value) that maximises the variance between the two classes. A
+    color cast moves both modes, and the threshold moves with them.
+
+    Returns:
+        (threshold, confidence). `confidence` is the share of the variance
+        the split explains, from 0 to 1. `threshold` is None when the diffs
+        do not show two distinct modes.
+    """
+    values = np.sort(np.asarray(diffs, dtype=np.float64))
+    if len(values) < 2 or values[0] == values[-1]:
+        return None, 0.0
+    count = len(values)
+    below = np.arange(1, count)
+    sums = np.cumsum(values)[:-1]
+    low_mean = sums / below
+    high_mean = (sums[-1] + values[-1] - sums) / (count - below)
+    between = below * (count - below) / count ** 2 * (high_mean - low_mean) ** 2
+    split = int(np.argmax(between))
+    confidence = float(between[split] / values.var())
+    # The variance not explained by the split is the spread within the modes
+    spread = np.sqrt(values.var() * (1 - confidence))
+    if confidence < MIN_CONFIDENCE or high_mean[split] - low_mean[split] < MIN_SEPARATION * spread:
+        return None, confidence
+    return float(values[split] + values[split + 1]) / 2, confidence
+
+
+class _BlockBuffers:
+    """Preallocated buffers to embed and read the block grid of one frame size.
+
+    Embedding and reading work in place in these buffers, so a frame loop
+    that reads into a reused frame buffer allocates nothing per frame. The
+    diffs returned by `diffs` are overwritten by the next call.
+    """
+
+    def __init__(self, grid):
+        start_x, start_y, grid_width, grid_height = grid
+        self.shape = (grid_height, BLOCK_SIZE, grid_width, BLOCK_SIZE)
+        self.window = (slice(start_y, start_y + grid_height * BLOCK_SIZE),
+                       slice(start_x, start_x + grid_width * BLOCK_SIZE))
+        self.pattern = np.zeros(grid_width * grid_height, dtype=np.int16)
+        self.shift = np.empty((grid_height * BLOCK_SIZE, grid_width * BLOCK_SIZE), dtype=np.int16)
+        self.scratch = np.empty_like(self.shift)
+        # Blocks laid out one per row, for in-place medians
+        self.blocks = np.empty((grid_height, grid_width, BLOCK_SIZE, BLOCK_SIZE), dtype=np.uint8)
+        self.red = np.empty(grid_width * grid_height)
+        self.blue = np.empty(grid_width * grid_height)
+        self.diff = np.empty(grid_width * grid_height)
+
+    def embed(self, frame, bits):
+        """Shift red/blue in the grid blocks of `frame` in place; return the number of bits used."""
+        count = min(len(bits), len(self.pattern))
+        # +COLOR_SHIFT for bit 1 (red up, blue down), -COLOR_SHIFT for bit 0, 0 for unused blocks
+        np.multiply(bits[:count], 2 * COLOR_SHIFT, out=self.pattern[:count], casting='unsafe')
+        self.pattern[:count] -= COLOR_SHIFT
+        self.pattern[count:] = 0
+        grid_height, _, grid_width, _ = self.shape
+        self.shift.reshape(self.shape)[...] = self.pattern.reshape(grid_height, 1, grid_width, 1)
+        region = frame[self.window]
+        for channel, shift in ((2, np.add), (0, np.subtract)):
+            plane = region[:, :, channel]
+            # Saturating add in the int16 scratch buffer
+            shift(plane, self.shift, out=self.scratch)
+            np.clip(self.scratch, 0, 255, out=self.scratch)
+            np.copyto(plane, self.scratch, casting='unsafe')
+        return count
+
+    def diffs(self, frame):
+        """Median red minus median blue of every grid block, in bit order."""
+        region = frame[self.window]
+        middle = BLOCK_SIZE * BLOCK_SIZE // 2
+        rows = self.blocks.reshape(len(self.diff), BLOCK_SIZE * BLOCK_SIZE)
+        for channel, medians in ((2, self.red), (0, self.blue)):
+            np.copyto(self.blocks.transpose(0, 2, 1, 3), region[:, :, channel].reshape(self.shape))
+            # The median of an even count is the mean of the two middle values
+            rows.partition((middle - 1, middle), axis=1)
+            np.add(rows[:, middle - 1], rows[:, middle], out=medians, dtype=np.float64)
+            medians *= 0.5
+        return np.subtract(self.red, self.blue, out=self.diff)
+
 
 class VideoStego:
     """A more subtle video steganography approach that minimizes visual artifacts
@@ -17,7 +146,46 @@ class VideoStego:
         return Fernet.generate_key()
     
     @staticmethod
-    def encode_video(video_path, secret_data, output_path, key=None):
+    def capacity(video_path):
+        """Describe a cover video from its container metadata, without decoding frames.
+        
+        Returns a dict with the codec, dimensions, frame count and rate, the
+        block grid, `raw_bytes` (size of the decoded frames) and `capacity`: the
+        largest compact frame, in bytes, the block-shift scheme can hold.
+        `lossless_capacity` is the same for the lossless LSB mode.
+        """
+        cap = cv2.VideoCapture(video_path)
+        if not cap.isOpened():
+            raise ValueError(f"Could not open video file {video_path}")
+        width = int(cap.get(cv2.CAP_PROP_FRAME_WIDTH))
+        height = int(cap.get(cv2.CAP_PROP_FRAME_HEIGHT))
+        frames = int(cap.get(cv2.CAP_PROP_FRAME_COUNT))
+        fps = cap.get(cv2.CAP_PROP_FPS)
+        fourcc = int(cap.get(cv2.CAP_PROP_FOURCC))
+        cap.release()
+        _, _, grid_width, grid_height = VideoStego._grid(width, height)
+        # Every keyframe carries one bit per block; the length header and the
+        # termination marker take their share
+        bits = (frames // KEYFRAME_INTERVAL) * grid_width * grid_height - HEADER_BITS - len(TERMINATION_MARKER)
+        bits = min(bits, MAX_MESSAGE_BYTES * 8)
+        return {
+            'modality': 'video',
+            'format': fourcc.to_bytes(4, 'little').decode('latin-1').strip('\x00 ') or None,
+            'width': width,
+            'height': height,
+            'frames': frames,
+            'fps': fps,
+            'grid': (grid_width, grid_height),
+            'raw_bytes': width * height * 3 * frames,
+            'capacity': max(bits, 0) // 8,
+            'lossless_capacity': width * height * 3 * frames // 8,
+        }
+    
+    @staticmethod
+    @metrics.operation('video', 'encode')
+    def encode_video(video_path, secret_data, output_path, key=None, compact=False, cipher='aesgcm',
+                     compression=None, level=None, passphrase=None, salt=None, yuv=False, lossless=False,
+                     hybrid=False):
         """Encode a secret message into a video with minimal visual artifacts.
         
         Args:
@@ -25,10 +193,44 @@ class VideoStego:
             secret_data: Secret message to encode
             output_path: Path to save the output video
             key: Fernet encryption key (if None, plaintext is used)
+            compact: Embed a binary payload frame instead of base64 text
+            cipher: Cipher used by the compact frame ('aesgcm' or 'fernet')
+            compression: Codec applied before encryption ('zlib', 'lzma', 'zstd' or 'auto');
+                implies compact mode
+            level: Compression level (codec default if None)
+            passphrase: Derive the key from a passphrase (implies compact mode)
+            salt: KDF salt bytes, random per payload if None
+            yuv: Read and write raw YUV 4:2:0 frames through ffmpeg pipes and
+                shift the chroma planes directly, skipping the BGR conversions
+            lossless: Write FFV1 video in Matroska (.mkv) and hide the payload in
+                the LSBs of whole frames (implies compact mode)
+            hybrid: Split the payload between the audio track and the frames
+                (implies compact mode, needs ffmpeg and an audio track)
         """
+        if yuv and lossless:
+            print("Error: The YUV path and lossless mode cannot be combined")
+            return
+        if hybrid:
+            return VideoStego._encode_hybrid(video_path, secret_data, output_path, key, cipher, compression,
+                                             level, passphrase, salt, yuv=yuv, lossless=lossless)
         # Encrypt the message if a key is provided
         original_data = secret_data
-        if key:
+        if compact or compression or passphrase or lossless or is_stream(secret_data):
+            # Compact mode: raw ciphertext inside a binary frame, no base64
+            if is_stream(secret_data):
+                # The length header caps block-shift payloads and the frames cap lossless
+                # ones, so a stream is read only up to that cap
+                try:
+                    limit = VideoStego.capacity(video_path)['lossless_capacity'] if lossless else MAX_MESSAGE_BYTES
+                    secret_data = FrameEncoder(secret_data, key, cipher, compression, level,
+                                               passphrase, salt).to_bytes(limit)
+                except ValueError as e:
+                    print(f"Error: {str(e)}")
+                    return
+            else:
+                secret_data = build_frame(secret_data, key, cipher, compression, level, passphrase, salt)
+            print(f"Payload framed in compact mode (length: {len(secret_data)} bytes)")
+        elif key:
             try:
                 # Convert string key to bytes if needed
                 if isinstance(key, str):
@@ -40,17 +242,23 @@ class VideoStego:
                 # Encrypt the message
                 if isinstance(secret_data, str):
                     secret_data = secret_data.encode()
-                encrypted_data = fernet.encrypt(secret_data)
-                
-                # Convert to base64 string for encoding
-                secret_data = base64.b64encode(encrypted_data).decode()
+                with metrics.stage('encrypt'):
+                    encrypted_data = fernet.encrypt(secret_data)
+                    # Convert to base64 string for encoding
+                    secret_data = base64.b64encode(encrypted_data).decode()
                 print(f"Message encrypted using Fernet (length: {len(secret_data)} characters)")
             except Exception as e:
                 print(f"Encryption error: {str(e)}. Proceeding with plaintext.")
                 secret_data = original_data  # Revert to original data on error
         
+        if yuv:
+            return VideoStego._encode_yuv(video_path, secret_data, output_path, key)
+        if lossless:
+            return VideoStego._encode_lossless(video_path, secret_data, output_path, key)
+        
         # Open the video file
-        cap = cv2.VideoCapture(video_path)
+        with metrics.stage('load'):
+            cap = cv2.VideoCapture(video_path)
         if not cap.isOpened():
             print(f"Error: Could not open video file {video_path}")
             return
@@ -61,327 +269,526 @@ class VideoStego:
         fps = cap.get(cv2.CAP_PROP_FPS)
         total_frames = int(cap.get(cv2.CAP_PROP_FRAME_COUNT))
         
-        # Create a temporary file for the video without audio
-        temp_output_path = tempfile.gettempdir() + os.path.sep + "temp_encoded_video.avi"
+        # Create a temporary file for the video without audio, one per call so
+        # that concurrent encodes (batch, shard) do not overwrite each other
+        temp_output_path = VideoStego._temp_video('.avi')
+        try:
+            # Always use AVI container with XVID codec - most reliable
+            fourcc = cv2.VideoWriter_fourcc(*'XVID')
+            out = cv2.VideoWriter(temp_output_path, fourcc, fps, (frame_width, frame_height))
         
-        # Always use AVI container with XVID codec - most reliable
-        fourcc = cv2.VideoWriter_fourcc(*'XVID')
-        out = cv2.VideoWriter(temp_output_path, fourcc, fps, (frame_width, frame_height))
+            if not out.isOpened():
+                print(f"Error: Could not create output video file {temp_output_path}")
+                cap.release()
+                return
         
-        if not out.isOpened():
-            print(f"Error: Could not create output video file {temp_output_path}")
-            cap.release()
-            return
+            # One 0/1 entry per bit: 16-bit length header, message, 24-bit termination marker
+            try:
+                binary_message = VideoStego._message_bits(VideoStego._message_bytes(secret_data))
+            except ValueError:
+                print(f"Error: Message too large for the {HEADER_BITS}-bit length header "
+                      f"(max {MAX_MESSAGE_BYTES} bytes)")
+                cap.release()
+                out.release()
+                return
         
-        # Convert the secret message to binary
-        binary_message = ''
-        for char in secret_data:
-            binary_message += format(ord(char), '08b')
+            print(f"Message length: {len(secret_data)} characters")
+            print(f"Binary length: {len(binary_message) - HEADER_BITS} bits")
         
-        # Add a unique marker pattern that's unlikely to occur naturally (24 bits)
-        # Using a more distinctive pattern for better detection
-        termination_marker = '101010101010101010101010'
-        binary_message += termination_marker
+            # The grid of blocks in the center of keyframes, shared with the decoder
+            grid = VideoStego._grid(frame_width, frame_height)
+            start_x, start_y, encoding_width, encoding_height = grid
+            blocks_per_frame = encoding_width * encoding_height
         
-        print(f"Message length: {len(secret_data)} characters")
-        print(f"Binary length: {len(binary_message)} bits")
+            # Warn if the message is too large
+            max_bits = (total_frames // KEYFRAME_INTERVAL) * blocks_per_frame
+            if len(binary_message) > max_bits:
+                print(f"Warning: Message may be too large. Max capacity: ~{max_bits//8} characters")
         
-        # Use fewer frames and larger changes for better robustness
-        # We'll use a grid of blocks in the center of keyframes
+            # Track our progress
+            bit_index = 0
+            frame_count = 0
+            modified_frames = 0
         
-        # Define encoding parameters
-        block_size = 16  # 16×16 pixel blocks for better robustness
-        encoding_margin = 50  # Stay away from frame borders
+            # Report encoding parameters
+            print(f"Encoding grid: {encoding_width}x{encoding_height} blocks, {blocks_per_frame} blocks per frame")
+            print(f"Color shift: {COLOR_SHIFT}, Keyframe interval: {KEYFRAME_INTERVAL}")
         
-        # Calculate encoding grid dimensions (in the center of the frame)
-        encoding_width = (frame_width // 3) // block_size
-        encoding_height = (frame_height // 3) // block_size
-        blocks_per_frame = encoding_width * encoding_height
+            # Copy all frames, modifying only keyframes. Every frame is read into
+            # the same buffer and modified in place: the writer has encoded it
+            # before the next one is read, so the loop allocates nothing per frame
+            frame = np.empty((frame_height, frame_width, 3), dtype=np.uint8)
+            buffers = _BlockBuffers(grid)
+            timer = metrics.StageTimer()
+            while cap.isOpened():
+                with timer('read'):
+                    ret, frame = cap.read(image=frame)
+                if not ret:
+                    break
+                
+                frame_count += 1
+                VideoStego._report_frame(frame_count, total_frames, cap, out)
+            
+                # Only encode data in keyframes
+                if frame_count % KEYFRAME_INTERVAL == 0 and bit_index < len(binary_message):
+                    embed_started = time.perf_counter()
+                    # For bit 1: Increase red, decrease blue
+                    # For bit 0: Increase blue, decrease red
+                    bits_in_this_frame = buffers.embed(frame, binary_message[bit_index:])
+                
+                    # Debug first few bits
+                    if modified_frames < 3:
+                        for i in range(min(3, bits_in_this_frame)):
+                            x = start_x + (i % encoding_width) * BLOCK_SIZE
+                            y = start_y + (i // encoding_width) * BLOCK_SIZE
+                            print(f"Frame {frame_count}, Bit {bit_index + i}: '{binary_message[bit_index + i]}' at position ({x},{y})")
+                
+                    # Update bit index
+                    bit_index += bits_in_this_frame
+                    modified_frames += 1
+                    timer.add('embed', time.perf_counter() - embed_started)
+            
+                with timer('write'):
+                    out.write(frame)
+            
+                # Check if we've encoded all data
+                if bit_index >= len(binary_message):
+                    # Just copy the rest of the frames
+                    copied = 0
+                    while cap.isOpened():
+                        with timer('read'):
+                            ret, frame = cap.read(image=frame)
+                        if not ret:
+                            break
+                        copied += 1
+                        VideoStego._report_frame(frame_count + copied, total_frames, cap, out)
+                        with timer('write'):
+                            out.write(frame)
+                    break
+                
+                # Progress indicator for long videos
+                if frame_count % 100 == 0:
+                    print(f"Processing frame {frame_count}/{total_frames} - {frame_count/total_frames*100:.1f}%")
         
-        # Starting position of encoding grid (centered)
-        start_x = (frame_width - (encoding_width * block_size)) // 2
-        start_y = (frame_height - (encoding_height * block_size)) // 2
+            # Release resources
+            cap.release()
+            out.release()
+            timer.flush()
         
-        # Increase changes for better robustness in longer videos
-        color_shift = 12  # Increased from 8 to make changes more detectable
+            # Make sure the output has the same extension as input to preserve format
+            if not output_path.lower().endswith('.mp4') and not output_path.lower().endswith('.avi'):
+                output_path = os.path.splitext(output_path)[0] + os.path.splitext(video_path)[1]
         
-        # Select keyframes for encoding (every 2nd frame)
-        keyframe_interval = 2  # Reduced from 3 to store more data across more frames
+            # Now use ffmpeg to copy the audio from the original video to our encoded video
+            if _HYBRID_FRAMES.get():
+                # The hybrid encoder writes its own audio track
+                shutil.move(temp_output_path, output_path)
+            else:
+                try:
+                    print(f"Copying audio from original video to the encoded video...")
+            
+                    # Construct the ffmpeg command
+                    # -c:v copy = copy video stream without re-encoding
+                    # -c:a copy = copy audio stream without re-encoding
+                    ffmpeg_cmd = [
+                        'ffmpeg', '-y',               # Force overwrite
+                        '-i', temp_output_path,       # Input: our encoded video without audio
+                        '-i', video_path,             # Input: original video with audio
+                        '-c:v', 'copy',               # Copy video stream
+                        '-c:a', 'copy',               # Copy audio stream
+                        '-map', '0:v:0',              # Use video from first input
+                        '-map', '1:a:0',              # Use audio from second input
+                        output_path                   # Output file
+                    ]
+            
+                    # Execute the command
+                    with metrics.stage('mux'):
+                        subprocess.run(ffmpeg_cmd, check=True)
+            
+                    print(f"Successfully merged audio into the output video: {output_path}")
+            
+                except Exception as e:
+                    print(f"Warning: Failed to copy audio track: {str(e)}")
+                    print(f"Fallback: Using the video-only output: {temp_output_path}")
+            
+                    # If we can't use ffmpeg, just move the temp file to the output path
+                    if os.path.exists(temp_output_path):
+                        shutil.move(temp_output_path, output_path)
         
-        # Calculate max capacity and distribute data more evenly
-        total_keyframes = total_frames // keyframe_interval
-        bits_per_keyframe = min(blocks_per_frame, (len(binary_message) + total_keyframes - 1) // total_keyframes)
+            if not os.path.exists(output_path):
+                print(f"Error: The encoded video was not written to {output_path}")
+                return
         
-        # Warn if the message is too large
-        max_bits = total_keyframes * blocks_per_frame
-        if len(binary_message) > max_bits:
-            print(f"Warning: Message may be too large. Max capacity: ~{max_bits//8} characters")
+            # If we encoded all bits, display success message
+            if bit_index >= len(binary_message):
+                print(f"Data encoded successfully in {modified_frames} frames")
+                print(f"Total frames processed: {frame_count}")
+                print(f"Total bits encoded: {bit_index}")
+                if not _HYBRID_FRAMES.get():
+                    print(f"To decode this video, run: python main.py decode-video -i {output_path}" + 
+                         (f" -k \"{key.decode() if isinstance(key, bytes) else key}\"" if key else ""))
+                return output_path
+            else:
+                print(f"Warning: Only encoded {bit_index}/{len(binary_message)} bits")
+        finally:
+            # Done encodes have moved it; cancelled or failed ones leave nothing behind
+            if os.path.exists(temp_output_path):
+                os.remove(temp_output_path)
+    
+    @staticmethod
+    def _temp_video(suffix):
+        """A new, empty temporary file for an encoder to write to before muxing."""
+        fd, path = tempfile.mkstemp(suffix=suffix, prefix='stego-video-')
+        os.close(fd)
+        return path
+    
+    @staticmethod
+    def _encode_yuv(video_path, secret_data, output_path, key):
+        """The encode_video loop on raw YUV frames: ffmpeg decodes, the chroma planes are shifted, ffmpeg encodes."""
+        try:
+            bits = VideoStego._message_bits(VideoStego._message_bytes(secret_data))
+            width, height, fps, total_frames = VideoStego._properties(video_path)
+        except ValueError as e:
+            print(f"Error: {str(e)}")
+            return
+        # Make sure the output has the same extension as input to preserve format
+        if not output_path.lower().endswith(('.mp4', '.avi')):
+            output_path = os.path.splitext(output_path)[0] + os.path.splitext(video_path)[1]
+        grid = VideoStego._grid(width, height)
+        print(f"Binary length: {len(bits)} bits")
+        print(f"Encoding grid: {grid[2]}x{grid[3]} blocks on the chroma planes, Keyframe interval: {KEYFRAME_INTERVAL}")
         
-        # Track our progress
         bit_index = 0
         frame_count = 0
         modified_frames = 0
+        timer = metrics.StageTimer()
+        try:
+            # The audio track is copied by the encoding ffmpeg, so there is no separate mux step
+            with yuv.YuvReader(video_path, width, height) as reader, \
+                    yuv.YuvWriter(output_path, width, height, fps, audio_from=video_path) as writer:
+                frames = iter(reader)
+                while True:
+                    with timer('read'):
+                        planes = next(frames, None)
+                    if planes is None:
+                        break
+                    frame_count += 1
+                    VideoStego._report_frame(frame_count, total_frames, reader, writer)
+                    if frame_count % KEYFRAME_INTERVAL == 0 and bit_index < len(bits):
+                        with timer('embed'):
+                            bit_index += VideoStego._embed_chroma(planes[1], planes[2], bits[bit_index:], grid)
+                        modified_frames += 1
+                    with timer('write'):
+                        writer.write(reader.buffer)
+        except RuntimeError as e:
+            print(f"Error: {str(e)}")
+            return
+        finally:
+            timer.flush()
         
-        # Add a header with data length for more reliable decoding
-        header = f"{len(binary_message):016b}"  # 16-bit length header
-        binary_message = header + binary_message
+        if bit_index < len(bits):
+            print(f"Warning: Only encoded {bit_index}/{len(bits)} bits")
+            return
+        print(f"Data encoded successfully in {modified_frames} frames")
+        print(f"Total frames processed: {frame_count}")
+        if not _HYBRID_FRAMES.get():
+            print(f"To decode this video, run: python main.py decode-video -i {output_path} --yuv" + 
+                  (f" -k \"{key.decode() if isinstance(key, bytes) else key}\"" if key else ""))
+        return output_path
+    
+    @staticmethod
+    def _encode_lossless(video_path, payload, output_path, key):
+        """Hide a compact frame in the LSBs of whole frames and write FFV1 video."""
+        with metrics.stage('load'):
+            cap = cv2.VideoCapture(video_path)
+        if not cap.isOpened():
+            print(f"Error: Could not open video file {video_path}")
+            return
+        frame_width = int(cap.get(cv2.CAP_PROP_FRAME_WIDTH))
+        frame_height = int(cap.get(cv2.CAP_PROP_FRAME_HEIGHT))
+        fps = cap.get(cv2.CAP_PROP_FPS)
+        total_frames = int(cap.get(cv2.CAP_PROP_FRAME_COUNT))
         
-        # Record debug info for decoding
-        debug_info = {
-            "total_bits": len(binary_message),
-            "block_size": block_size,
-            "keyframe_interval": keyframe_interval,
-            "grid_width": encoding_width,
-            "grid_height": encoding_height,
-            "start_x": start_x,
-            "start_y": start_y
-        }
+        bits = np.unpackbits(np.frombuffer(payload, dtype=np.uint8))
+        bits_per_frame = frame_width * frame_height * 3
+        if len(bits) > bits_per_frame * total_frames:
+            print(f"Error: Payload needs {len(bits)} bits, the {total_frames} frames hold only "
+                  f"{bits_per_frame * total_frames}")
+            cap.release()
+            return
         
-        # Report encoding parameters
-        print(f"Encoding grid: {encoding_width}x{encoding_height} blocks, {blocks_per_frame} blocks per frame")
-        print(f"Color shift: {color_shift}, Keyframe interval: {keyframe_interval}")
+        # FFV1 needs a container that takes any codec
+        if not output_path.lower().endswith(LOSSLESS_EXTENSION):
+            output_path = os.path.splitext(output_path)[0] + LOSSLESS_EXTENSION
+        temp_output_path = VideoStego._temp_video(LOSSLESS_EXTENSION)
+        try:
+            out = cv2.VideoWriter(temp_output_path, cv2.VideoWriter_fourcc(*LOSSLESS_FOURCC), fps,
+                                  (frame_width, frame_height))
+            if not out.isOpened():
+                print(f"Error: Could not create output video file {temp_output_path}")
+                cap.release()
+                return
+            print(f"Binary length: {len(bits)} bits, {bits_per_frame} bits per frame")
         
-        # Copy all frames, modifying only keyframes
-        while cap.isOpened():
-            ret, frame = cap.read()
-            if not ret:
-                break
-                
-            frame_count += 1
-            
-            # Only encode data in keyframes
-            if frame_count % keyframe_interval == 0 and bit_index < len(binary_message):
-                modified_frame = frame.copy()
-                
-                # Encode bits in this frame
-                bits_in_this_frame = min(blocks_per_frame, len(binary_message) - bit_index)
-                
-                for i in range(bits_in_this_frame):
-                    # Calculate block position in the grid
-                    block_x = i % encoding_width
-                    block_y = i // encoding_width
-                    
-                    # Calculate pixel coordinates
-                    x = start_x + (block_x * block_size)
-                    y = start_y + (block_y * block_size)
-                    
-                    # Make sure we don't go out of bounds
-                    if x+block_size > frame_width or y+block_size > frame_height:
-                        continue
-                    
-                    # Get the bit to encode
-                    bit = int(binary_message[bit_index + i])
-                    
-                    # Extract the block
-                    block = modified_frame[y:y+block_size, x:x+block_size].copy()
-                    
-                    # Apply a more robust modification:
-                    # For bit 1: Increase red, decrease blue
-                    # For bit 0: Increase blue, decrease red
-                    if bit == 1:
-                        # Increase red, decrease blue
-                        block[:, :, 2] = np.clip(block[:, :, 2].astype(int) + color_shift, 0, 255)  # Red +12
-                        block[:, :, 0] = np.clip(block[:, :, 0].astype(int) - color_shift, 0, 255)  # Blue -12
-                    else:
-                        # Increase blue, decrease red
-                        block[:, :, 0] = np.clip(block[:, :, 0].astype(int) + color_shift, 0, 255)  # Blue +12
-                        block[:, :, 2] = np.clip(block[:, :, 2].astype(int) - color_shift, 0, 255)  # Red -12
-                    
-                    # Place the modified block back
-                    modified_frame[y:y+block_size, x:x+block_size] = block
-                    
-                    # Debug first few bits
-                    if modified_frames < 3 and i < 3:
-                        print(f"Frame {frame_count}, Bit {bit_index + i}: '{bit}' at position ({x},{y})")
-                
-                # Update bit index
-                bit_index += bits_in_this_frame
-                modified_frames += 1
-                
-                # Write the modified frame
-                out.write(modified_frame)
-            else:
-                # Write unmodified frame
-                out.write(frame)
-            
-            # Check if we've encoded all data
-            if bit_index >= len(binary_message):
-                # Just copy the rest of the frames
-                while cap.isOpened():
-                    ret, frame = cap.read()
+            bit_index = 0
+            frame_count = 0
+            modified_frames = 0
+            frame = np.empty((frame_height, frame_width, 3), dtype=np.uint8)
+            timer = metrics.StageTimer()
+            try:
+                while True:
+                    with timer('read'):
+                        ret, frame = cap.read(image=frame)
                     if not ret:
                         break
-                    out.write(frame)
-                break
-                
-            # Progress indicator for long videos
-            if frame_count % 100 == 0:
-                print(f"Processing frame {frame_count}/{total_frames} - {frame_count/total_frames*100:.1f}%")
+                    frame_count += 1
+                    VideoStego._report_frame(frame_count, total_frames, cap, out)
+                    if bit_index < len(bits):
+                        with timer('embed'):
+                            chunk = bits[bit_index:bit_index + bits_per_frame]
+                            values = frame.reshape(-1)[:len(chunk)]
+                            values &= 0xFE
+                            values |= chunk
+                        bit_index += len(chunk)
+                        modified_frames += 1
+                    with timer('write'):
+                        out.write(frame)
+            finally:
+                cap.release()
+                out.release()
+                timer.flush()
         
-        # Release resources
-        cap.release()
-        out.release()
+            if bit_index < len(bits):
+                print(f"Warning: Only encoded {bit_index}/{len(bits)} bits")
+                return
+            VideoStego._mux_audio(temp_output_path, video_path, output_path)
+            if not os.path.exists(output_path):
+                print(f"Error: The encoded video was not written to {output_path}")
+                return
+            print(f"Data encoded successfully in {modified_frames} frames")
+            print(f"Total frames processed: {frame_count}")
+            return output_path
+        finally:
+            # Done encodes have moved it; cancelled or failed ones leave nothing behind
+            if os.path.exists(temp_output_path):
+                os.remove(temp_output_path)
+    
+    @staticmethod
+    def _encode_hybrid(video_path, payload, output_path, key, cipher, compression, level, passphrase, salt,
+                       **options):
+        """Split a payload between the audio track and the frames, and embed both concurrently.
+
+        The audio track is filled first, so a larger payload does not touch
+        more frames. Each part is a shard (see shard.py) in its own compact
+        frame; the frames always carry one, which is how decoders know to
+        read the audio track too. `options` are passed to encode_video.
+        """
+        from . import kdf
+        from .audio_stego import AudioStego
+        from .shard import capacity_budget, make_shards
         
-        # Now use ffmpeg to copy the audio from the original video to our encoded video
-        try:
-            # Make sure the output has the same extension as input to preserve format
-            if not output_path.lower().endswith('.mp4') and not output_path.lower().endswith('.avi'):
-                output_path = os.path.splitext(output_path)[0] + os.path.splitext(video_path)[1]
-                
-            print(f"Copying audio from original video to the encoded video...")
+        if shutil.which('ffmpeg') is None:
+            print("Error: Hybrid mode needs ffmpeg on the PATH to read and write the audio track")
+            return
+        encrypted = bool(key or passphrase)
+        with tempfile.TemporaryDirectory() as scratch:
+            track = os.path.join(scratch, 'track.wav')
+            try:
+                VideoStego._extract_track(video_path, track)
+                video_info = VideoStego.capacity(video_path)
+            except ValueError as e:
+                print(f"Error: {str(e)}")
+                return
+            audio_capacity = AudioStego.capacity(track)['capacity']
+            video_capacity = video_info['lossless_capacity' if options.get('lossless') else 'capacity']
+            budgets = [capacity_budget(capacity, cipher if encrypted else 'none', bool(passphrase))
+                       for capacity in (audio_capacity, video_capacity)]
+            for carrier, budget in zip(('audio track', 'frames'), budgets):
+                if budget < 0:
+                    print(f"Error: {video_path} is too small to carry a shard in its {carrier}")
+                    return
+            try:
+                audio_shard, video_shard = make_shards(payload, budgets, compression, level, fill=True)
+            except ValueError as e:
+                print(f"Error: {str(e)}")
+                return
+            print(f"Payload split between the audio track ({len(audio_shard)} bytes) and the frames "
+                  f"({len(video_shard)} bytes)")
+            if passphrase and salt is None:
+                # Shared by both shards, so the key is derived only once
+                salt = kdf.generate_salt()
             
-            # Construct the ffmpeg command
-            # -c:v copy = copy video stream without re-encoding
-            # -c:a copy = copy audio stream without re-encoding
-            ffmpeg_cmd = [
-                'ffmpeg', '-y',               # Force overwrite
-                '-i', temp_output_path,       # Input: our encoded video without audio
-                '-i', video_path,             # Input: original video with audio
-                '-c:v', 'copy',               # Copy video stream
-                '-c:a', 'copy',               # Copy audio stream
-                '-map', '0:v:0',              # Use video from first input
-                '-map', '1:a:0',              # Use audio from second input
-                output_path                   # Output file
-            ]
+            stego_track = os.path.join(scratch, 'stego.wav')
             
-            # Execute the command
-            subprocess.run(ffmpeg_cmd, check=True)
+            def embed_audio():
+                """Embed the audio shard; returns an error message, or None."""
+                try:
+                    with open(track, 'rb') as f:
+                        encoded = AudioStego.encode_bytes(f, audio_shard, key, cipher, None, None, passphrase, salt)
+                except ValueError as e:
+                    return str(e)
+                with open(stego_track, 'wb') as f:
+                    f.write(encoded)
             
-            print(f"Successfully merged audio into the output video: {output_path}")
+            # The audio shard is embedded on a worker thread (encode_bytes prints
+            # nothing) while this one embeds the frames
+            with ThreadPoolExecutor(max_workers=1) as pool:
+                audio_job = pool.submit(contextvars.copy_context().run, embed_audio)
+                token = _HYBRID_FRAMES.set(True)
+                try:
+                    video_output = VideoStego.encode_video(
+                        video_path, video_shard, os.path.join(scratch, 'video' + os.path.splitext(output_path)[1]),
+                        key, True, cipher, None, None, passphrase, salt, **options)
+                finally:
+                    _HYBRID_FRAMES.reset(token)
+                audio_error = audio_job.result()
+            if audio_error:
+                print(f"Error: {audio_error}")
+                return
+            if video_output is None:
+                # The frame encoder has printed why
+                return
             
-            # Remove the temporary file
+            # Keep the container the video was written in (lossless mode writes .mkv)
+            output_path = os.path.splitext(output_path)[0] + os.path.splitext(video_output)[1]
+            codec = HYBRID_AUDIO_CODECS.get(os.path.splitext(output_path)[1].lower(), HYBRID_AUDIO_CODEC)
+            ffmpeg_cmd = [
+                'ffmpeg', '-y', '-v', 'error',
+                '-i', video_output,
+                '-i', stego_track,
+                '-map', '0:v:0',
+                '-map', '1:a:0',
+                '-c:v', 'copy',
+                '-c:a', codec,                # Lossless, so the sample LSBs survive
+                output_path
+            ]
+            try:
+                with metrics.stage('mux'):
+                    subprocess.run(ffmpeg_cmd, check=True)
+            except (OSError, subprocess.CalledProcessError) as e:
+                print(f"Error: Could not write the audio track: {str(e)}")
+                return
+        print(f"Hybrid payload encoded into {output_path}")
+        print(f"To decode this video, run: python main.py decode-video -i {output_path}" +
+              (" --yuv" if options.get('yuv') else "") +
+              (f" -k \"{key.decode() if isinstance(key, bytes) else key}\"" if key else ""))
+        return output_path
+    
+    @staticmethod
+    def _extract_track(video_path, track_path):
+        """Decode the first audio track of a video to a 16-bit PCM WAV file with ffmpeg."""
+        ffmpeg_cmd = ['ffmpeg', '-y', '-v', 'error', '-i', video_path, '-map', '0:a:0', '-c:a', 'pcm_s16le', track_path]
+        try:
+            with metrics.stage('demux'):
+                subprocess.run(ffmpeg_cmd, check=True, stderr=subprocess.PIPE)
+        except FileNotFoundError:
+            raise ValueError("Reading the audio track of a video needs ffmpeg") from None
+        except subprocess.CalledProcessError as e:
+            error = e.stderr.decode(errors='replace').strip()
+            raise ValueError(f"Could not read the audio track of {video_path}: {error}") from None
+    
+    @staticmethod
+    def _join_audio_shard(video_path, data, key=None, passphrase=None):
+        """Complete a hybrid payload: if the frames carry a shard, read the rest from the audio track."""
+        from .shard import join_shards, parse_shard
+        shard = parse_shard(bytes(data))
+        if shard is None:
+            return data
+        from .audio_stego import AudioStego
+        with tempfile.TemporaryDirectory() as scratch:
+            track = os.path.join(scratch, 'track.wav')
+            VideoStego._extract_track(video_path, track)
+            with open(track, 'rb') as f:
+                audio_shard = parse_shard(bytes(AudioStego.decode_bytes(f, key, passphrase)))
+        if audio_shard is None:
+            raise ValueError("The audio track does not carry the rest of the payload")
+        return join_shards([shard, audio_shard])
+    
+    @staticmethod
+    def _mux_audio(temp_output_path, video_path, output_path):
+        """Move an encoded video to `output_path`, with the audio track of `video_path` if ffmpeg can copy it."""
+        if _HYBRID_FRAMES.get():
+            # The hybrid encoder writes its own audio track
+            shutil.move(temp_output_path, output_path)
+            return
+        ffmpeg_cmd = [
+            'ffmpeg', '-y', '-v', 'error',
+            '-i', temp_output_path,
+            '-i', video_path,
+            '-c:v', 'copy',
+            '-c:a', 'copy',
+            '-map', '0:v:0',
+            '-map', '1:a:0?',             # Covers without audio are fine
+            output_path
+        ]
+        try:
+            with metrics.stage('mux'):
+                subprocess.run(ffmpeg_cmd, check=True)
             os.remove(temp_output_path)
-            
+            print(f"Successfully merged audio into the output video: {output_path}")
         except Exception as e:
             print(f"Warning: Failed to copy audio track: {str(e)}")
-            print(f"Fallback: Using the video-only output: {temp_output_path}")
-            
-            # If we can't use ffmpeg, just rename the temp file to the output path
-            if os.path.exists(temp_output_path):
-                if os.path.exists(output_path):
-                    os.remove(output_path)
-                os.rename(temp_output_path, output_path)
-        
-        # If we encoded all bits, display success message
-        if bit_index >= len(binary_message):
-            print(f"Data encoded successfully in {modified_frames} frames")
-            print(f"Total frames processed: {frame_count}")
-            print(f"Total bits encoded: {bit_index}")
-            print(f"To decode this video, run: python main.py decode-video -i {output_path}" + 
-                 (f" -k \"{key.decode() if isinstance(key, bytes) else key}\"" if key else ""))
-        else:
-            print(f"Warning: Only encoded {bit_index}/{len(binary_message)} bits")
+            shutil.move(temp_output_path, output_path)
+            print(f"Fallback: Wrote the video without audio: {output_path}")
     
     @staticmethod
-    def decode_video(video_path, key=None):
-        """Decode a secret message from a video using the subtle approach."""
-        cap = cv2.VideoCapture(video_path)
+    @metrics.operation('video', 'decode')
+    def decode_video(video_path, key=None, passphrase=None, yuv=False):
+        """Decode a secret message from a video using the subtle approach.
+        
+        With `yuv`, frames are read as raw YUV 4:2:0 through an ffmpeg pipe and
+        the bits are read from the chroma planes, skipping the BGR conversion.
+        Lossless (FFV1) videos are recognised and read from their LSBs.
+        """
+        if yuv:
+            try:
+                data = VideoStego._decode_yuv(video_path, key, passphrase)
+                extracted_message = VideoStego._join_audio_shard(video_path, data, key, passphrase).decode(errors='replace')
+            except Exception as e:
+                print(f"Error: {str(e)}. Payload could not be read.")
+                return ''
+            print(f"Final extracted message: '{extracted_message}'")
+            return extracted_message
+        
+        with metrics.stage('load'):
+            cap = cv2.VideoCapture(video_path)
         if not cap.isOpened():
             print(f"Error: Could not open video file {video_path}")
             return "Error: Could not open video file"
+        if VideoStego._is_lossless(cap):
+            try:
+                data = VideoStego._decode_lossless(cap, key, passphrase)
+                extracted_message = VideoStego._join_audio_shard(video_path, data, key, passphrase).decode(errors='replace')
+            except Exception as e:
+                print(f"Error: {str(e)}. Payload could not be read.")
+                extracted_message = ''
+            finally:
+                cap.release()
+            print(f"Final extracted message: '{extracted_message}'")
+            return extracted_message
             
-        frame_width = int(cap.get(cv2.CAP_PROP_FRAME_WIDTH))
-        frame_height = int(cap.get(cv2.CAP_PROP_FRAME_HEIGHT))
-        total_frames = int(cap.get(cv2.CAP_PROP_FRAME_COUNT))
-
-        block_size = 16
-        encoding_width = (frame_width // 3) // block_size
-        encoding_height = (frame_height // 3) // block_size
-        blocks_per_frame = encoding_width * encoding_height
-
-        start_x = (frame_width - (encoding_width * block_size)) // 2
-        start_y = (frame_height - (encoding_height * block_size)) // 2
-
-        keyframe_interval = 2
-        termination_marker = '101010101010101010101010'
-
-        binary_message = ''
-        frame_count = 0
-        header_bits = ''
-
-        # First pass to get header
-        while cap.isOpened() and len(header_bits) < 16:
-            ret, frame = cap.read()
-            if not ret:
-                break
-            frame_count += 1
-            if frame_count % keyframe_interval == 0:
-                for i in range(min(blocks_per_frame, 16 - len(header_bits))):
-                    block_x = i % encoding_width
-                    block_y = i // encoding_width
-                    x = start_x + (block_x * block_size)
-                    y = start_y + (block_y * block_size)
-                    if x+block_size > frame_width or y+block_size > frame_height:
-                        continue
-                    block = frame[y:y+block_size, x:x+block_size]
-                    median_red = np.median(block[:, :, 2])
-                    median_blue = np.median(block[:, :, 0])
-                    diff = median_red - median_blue
-                    bit = 1 if diff > 5 else 0  # ใช้ threshold สัก 5-10
-                    header_bits += str(bit)
-                if len(header_bits) >= 16:
-                    break
-
-        cap.release()
-        cap = cv2.VideoCapture(video_path)
-        frame_count = 0
-        message_length = None
-
+        # One pass: the bit threshold is calibrated on the first keyframes
         try:
-            message_length = int(header_bits, 2)
-            print(f"Detected message length: {message_length} bits")
-        except ValueError:
-            message_length = None
-
-        # Extract the main message
-        while cap.isOpened():
-            ret, frame = cap.read()
-            if not ret:
-                break
-            frame_count += 1
-            if frame_count % keyframe_interval == 0:
-                for i in range(blocks_per_frame):
-                    block_x = i % encoding_width
-                    block_y = i // encoding_width
-                    x = start_x + (block_x * block_size)
-                    y = start_y + (block_y * block_size)
-                    if x+block_size > frame_width or y+block_size > frame_height:
-                        continue
-                    block = frame[y:y+block_size, x:x+block_size]
-                    median_red = np.median(block[:, :, 2])
-                    median_blue = np.median(block[:, :, 0])
-                    diff = median_red - median_blue
-                    bit = 1 if diff > 0 else 0
-                    binary_message += str(bit)
-                    # Debug output omitted for brevity
-                if message_length and len(binary_message) >= message_length:
-                    break
-                # Check for termination marker
-                if termination_marker in binary_message:
-                    termination_index = binary_message.rfind(termination_marker)
-                    binary_message = binary_message[:termination_index]
-                    break
+            extracted_bytes, threshold, confidence = VideoStego._read_message(VideoStego._capture_diffs(cap))
+        finally:
+            cap.release()
+        if threshold is None:
+            print(f"Threshold calibration inconclusive (confidence {confidence:.2f}), using the fixed thresholds")
+        else:
+            print(f"Calibrated bit threshold: {threshold:.1f} (confidence {confidence:.2f})")
 
-        cap.release()
-        if len(binary_message) >= 16:
-            binary_message = binary_message[16:]
-
-        termination_index = binary_message.find(termination_marker)
-        if termination_index != -1:
-            binary_message = binary_message[:termination_index]
-            print(f"Termination marker found after {termination_index} bits")
-
-        # Convert binary to bytes
-        extracted_bytes = bytearray()
-        for i in range(0, len(binary_message), 8):
-            if i+8 > len(binary_message):
-                break
-            byte_str = binary_message[i:i+8]
+        # Videos written in compact mode carry a binary payload frame
+        if is_frame(extracted_bytes):
             try:
-                byte_val = int(byte_str, 2)
-                extracted_bytes.append(byte_val)
-            except ValueError:
-                print(f"Invalid byte at position {i}: {byte_str}")
+                data = VideoStego._join_audio_shard(video_path, open_frame(extracted_bytes, key, passphrase), key, passphrase)
+                extracted_message = data.decode(errors='replace')
+                if key or passphrase:
+                    print(f"Message successfully decrypted from compact frame")
+            except Exception as e:
+                print(f"Decryption error: {str(e)}. Compact payload could not be read.")
+                extracted_message = ''
+            print(f"Final extracted message: '{extracted_message}'")
+            return extracted_message
 
         extracted_message = extracted_bytes.decode('latin-1', errors='replace')
         extracted_message = VideoStego._fix_base64_padding(extracted_message)
@@ -390,8 +797,9 @@ class VideoStego:
         if key and extracted_message:
             try:
                 fernet = Fernet(key.encode() if isinstance(key, str) else key)
-                encrypted_data = base64.b64decode(extracted_message)
-                decrypted_data = fernet.decrypt(encrypted_data)
+                with metrics.stage('decrypt'):
+                    encrypted_data = base64.b64decode(extracted_message)
+                    decrypted_data = fernet.decrypt(encrypted_data)
                 extracted_message = decrypted_data.decode()
             except Exception as e:
                 print(f"Decryption error: {str(e)}. Returning raw data.")
@@ -399,6 +807,16 @@ class VideoStego:
         print(f"Final extracted message: '{extracted_message}'")
         return extracted_message
 
+    @staticmethod
+    def _report_frame(frame_count, total_frames, *captures):
+        """Per-frame progress checkpoint; releases the open capture/writer if cancelled."""
+        try:
+            progress.report('frames', frame_count, total_frames)
+        except progress.OperationCancelled:
+            for capture in captures:
+                capture.release()
+            raise
+
     @staticmethod
     def _fix_base64_padding(data):
         data = re.sub(r'[^A-Za-z0-9+/=]', '', data)
@@ -406,3 +824,403 @@ class VideoStego:
         if padding_needed:
             data += '=' * (4 - padding_needed)
         return data
+
+    @staticmethod
+    @metrics.operation('video', 'encode')
+    def encode_frames(frames, payload, key=None, cipher='aesgcm', compression=None, level=None,
+                      passphrase=None, salt=None):
+        """Hide a payload in a sequence of BGR frames.
+        
+        Generator yielding the output frames; modified keyframes are copies. Works
+        in memory with no file I/O or console output and uses the same bit layout
+        as `encode_video` in compact mode. Raises ValueError once the frames are
+        exhausted if the payload did not fit.
+        
+        Args:
+            frames: Iterable of HxWx3 uint8 BGR frames
+            payload: Message as str or bytes, or a binary file object or iterator of
+                bytes chunks (read up to the MAX_MESSAGE_BYTES cap)
+            key, cipher, compression, level, passphrase, salt: See `build_frame`
+        """
+        if is_stream(payload):
+            frame = FrameEncoder(payload, key, cipher, compression, level, passphrase,
+                                 salt).to_bytes(MAX_MESSAGE_BYTES)
+        else:
+            frame = build_frame(payload, key, cipher, compression, level, passphrase, salt)
+        bits = VideoStego._message_bits(frame)
+        bit_index = 0
+        buffers = None
+        timer = metrics.StageTimer()
+        for frame_count, frame in enumerate(frames, start=1):
+            progress.report('frames', frame_count)
+            if frame_count % KEYFRAME_INTERVAL == 0 and bit_index < len(bits):
+                if buffers is None:
+                    buffers = _BlockBuffers(VideoStego._grid(frame.shape[1], frame.shape[0]))
+                with timer('embed'):
+                    frame = frame.copy()
+                    bit_index += buffers.embed(frame, bits[bit_index:])
+            yield frame
+        timer.flush()
+        if bit_index < len(bits):
+            raise ValueError(f"Payload needs {len(bits)} blocks, only {bit_index} available")
+
+    @staticmethod
+    @metrics.operation('video', 'decode')
+    def decode_frames(frames, key=None, passphrase=None):
+        """Recover the payload bytes hidden in a sequence of BGR frames.
+        
+        Reads compact frames as well as the original base64 format, and stops
+        pulling frames as soon as the whole message has been read.
+        """
+        return VideoStego._decode_diffs(VideoStego._frame_diffs(frames), key, passphrase)
+
+    @staticmethod
+    def _frame_diffs(frames):
+        """Yield the block diffs of every keyframe of a sequence of BGR frames."""
+        timer = metrics.StageTimer()
+        buffers = None
+        try:
+            for frame_count, frame in enumerate(frames, start=1):
+                progress.report('frames', frame_count)
+                if frame_count % KEYFRAME_INTERVAL != 0:
+                    continue
+                if buffers is None:
+                    buffers = _BlockBuffers(VideoStego._grid(frame.shape[1], frame.shape[0]))
+                with timer('extract'):
+                    # The buffers are reused, and the caller keeps every keyframe's diffs
+                    diffs = buffers.diffs(frame).copy()
+                yield diffs
+        finally:
+            timer.flush()
+
+    @staticmethod
+    def _yuv_diffs(video_path):
+        """Yield the block diffs of every keyframe, read from the chroma planes of raw YUV frames."""
+        width, height, _, total_frames = VideoStego._properties(video_path)
+        grid = VideoStego._grid(width, height)
+        timer = metrics.StageTimer()
+        try:
+            with yuv.YuvReader(video_path, width, height) as reader:
+                frames = iter(reader)
+                frame_count = 0
+                while True:
+                    with timer('read'):
+                        planes = next(frames, None)
+                    if planes is None:
+                        return
+                    frame_count += 1
+                    VideoStego._report_frame(frame_count, total_frames, reader)
+                    if frame_count % KEYFRAME_INTERVAL != 0:
+                        continue
+                    with timer('extract'):
+                        diffs = VideoStego._chroma_diffs(planes[1], planes[2], grid)
+                    yield diffs
+        finally:
+            timer.flush()
+
+    @staticmethod
+    def _decode_yuv(video_path, key=None, passphrase=None):
+        """Recover the payload bytes of a video through the YUV path (see decode_frames)."""
+        return VideoStego._decode_diffs(VideoStego._yuv_diffs(video_path), key, passphrase)
+
+    @staticmethod
+    def _is_lossless(cap):
+        """Whether an open capture holds the FFV1 stream of a lossless-mode video."""
+        # FFmpeg reports the codec tag in lower case
+        fourcc = int(cap.get(cv2.CAP_PROP_FOURCC)).to_bytes(4, 'little').decode('latin-1')
+        return fourcc.upper() == LOSSLESS_FOURCC
+
+    @staticmethod
+    def _decode_lossless(cap, key=None, passphrase=None):
+        """Recover the payload bytes from the LSBs of a lossless video's frames.
+
+        Frames are read only until the whole compact frame has been read.
+        Raises ValueError if the video carries none.
+        """
+        total_frames = int(cap.get(cv2.CAP_PROP_FRAME_COUNT))
+        chunks = []
+        available = 0
+        needed = HEADER_SIZE * 8
+        header = None
+        timer = metrics.StageTimer()
+        for frame_count, frame in enumerate(VideoStego.read_frames(cap), start=1):
+            VideoStego._report_frame(frame_count, total_frames, cap)
+            values = frame.reshape(-1)
+            with timer('extract'):
+                chunks.append(values[:needed - available] & 1)
+            available += len(chunks[-1])
+            if header is None and available >= needed:
+                header = parse_header(np.packbits(np.concatenate(chunks)).tobytes())
+                if header is None:
+                    break
+                taken = len(chunks[-1])
+                needed = (HEADER_SIZE + header.length) * 8
+                # The rest of this frame holds the start of the body
+                with timer('extract'):
+                    chunks.append(values[taken:taken + needed - available] & 1)
+                available += len(chunks[-1])
+            if available >= needed:
+                break
+        timer.flush()
+        if header is None or available < needed:
+            raise ValueError("No payload found in the lossless video")
+        with metrics.stage('extract'):
+            data = np.packbits(np.concatenate(chunks)).tobytes()
+        return open_frame(data, key, passphrase)
+
+    @staticmethod
+    def _decode_diffs(frame_diffs, key=None, passphrase=None):
+        """Recover the payload bytes from an iterator of per-keyframe block diffs (see _read_message)."""
+        data, _, _ = VideoStego._read_message(frame_diffs)
+        if is_frame(data):
+            return open_frame(data, key, passphrase)
+        if key and data:
+            fernet = Fernet(key.encode() if isinstance(key, str) else key)
+            message = VideoStego._fix_base64_padding(data.decode('latin-1'))
+            with metrics.stage('decrypt'):
+                return fernet.decrypt(base64.b64decode(message))
+        return data
+
+    @staticmethod
+    def _read_message(frame_diffs):
+        """Read the raw message bytes from an iterator of per-keyframe block diffs, in one pass.
+
+        The length header is read with the fixed HEADER_THRESHOLD, with a
+        threshold calibrated on its own blocks and with BIT_THRESHOLD. A
+        reading is only accepted when it is self-consistent: whole message
+        bytes, and the termination marker exactly where it says the message
+        ends. The message bits are read with a threshold calibrated on the
+        message's blocks (header to marker), which are all embedded. The
+        iterator is only advanced until the message has been read, then
+        closed. If no header is consistent, the first reading is used as is,
+        and if it runs past the end of the video the message ends at the
+        termination marker instead.
+
+        Returns:
+            (data, threshold, confidence), see calibrate; `threshold` is None
+            when the fixed thresholds were used.
+        """
+        diffs = []
+        collected = 0
+        candidates = None
+        chosen = None
+        with closing(frame_diffs):
+            for block_diffs in frame_diffs:
+                diffs.append(block_diffs)
+                collected += len(block_diffs)
+                if candidates is None and collected >= HEADER_BITS:
+                    candidates = VideoStego._header_candidates(np.concatenate(diffs)[:HEADER_BITS])
+                    fallback = candidates[0]
+                    candidates = [needed for needed in candidates
+                                  if needed >= HEADER_BITS + len(TERMINATION_MARKER)
+                                  and (needed - HEADER_BITS - len(TERMINATION_MARKER)) % 8 == 0]
+                # A marker in place is a strong check (24 bits), so the first
+                # reading it confirms wins; longer ones may need more keyframes
+                for needed in [needed for needed in candidates or () if needed <= collected]:
+                    candidates.remove(needed)
+                    reading = VideoStego._read_bits(np.concatenate(diffs)[:needed])
+                    if reading[0][-len(TERMINATION_MARKER):] == TERMINATION_MARKER:
+                        chosen = needed, reading
+                        break
+                if chosen or candidates == []:
+                    break
+        if candidates is None:
+            return b'', None, 0.0
+        values = np.concatenate(diffs)
+        if chosen:
+            needed, (bits, threshold, confidence) = chosen
+            bits = bits[HEADER_BITS:needed - len(TERMINATION_MARKER)]
+        elif collected >= fallback:
+            bits, threshold, confidence = VideoStego._read_bits(values[:fallback])
+            bits = bits[HEADER_BITS:fallback - len(TERMINATION_MARKER)]
+        else:
+            bits, threshold, confidence = VideoStego._read_bits(values)
+            bits = bits[HEADER_BITS:]
+            marker = bits.find(TERMINATION_MARKER)
+            if marker != -1:
+                bits = bits[:marker]
+        bits = np.frombuffer(bits.encode('ascii'), dtype=np.uint8) - ord('0')
+        return np.packbits(bits[:len(bits) - len(bits) % 8]).tobytes(), threshold, confidence
+
+    @staticmethod
+    def _header_candidates(header):
+        """Message lengths (header included) the 16 header diffs may encode, most likely first."""
+        thresholds = [HEADER_THRESHOLD]
+        threshold, _ = calibrate(header)
+        if threshold is not None:
+            thresholds.append(threshold)
+        thresholds.append(BIT_THRESHOLD)
+        candidates = []
+        for threshold in thresholds:
+            needed = HEADER_BITS + int(''.join('1' if diff > threshold else '0' for diff in header), 2)
+            if needed not in candidates:
+                candidates.append(needed)
+        return candidates
+
+    @staticmethod
+    def _read_bits(values):
+        """Read embedded block diffs as a '0'/'1' string, with a threshold calibrated on them.
+
+        Returns:
+            (bits, threshold, confidence), see calibrate.
+        """
+        threshold, confidence = VideoStego._calibrate(values)
+        bits = values > (BIT_THRESHOLD if threshold is None else threshold)
+        return ''.join('1' if bit else '0' for bit in bits), threshold, confidence
+
+    @staticmethod
+    def _calibrate(diffs):
+        """calibrate(), timed and reported as the 'calibrate' stage."""
+        started = time.perf_counter()
+        threshold, confidence = calibrate(diffs)
+        metrics.record('calibrate', time.perf_counter() - started, threshold=threshold, confidence=confidence)
+        return threshold, confidence
+
+    @staticmethod
+    def _capture_diffs(cap):
+        """Yield the block diffs of every keyframe of an open VideoCapture.
+
+        Only keyframes are decoded to BGR, into one reused buffer; the other
+        frames are only grabbed.
+        """
+        frame_width = int(cap.get(cv2.CAP_PROP_FRAME_WIDTH))
+        frame_height = int(cap.get(cv2.CAP_PROP_FRAME_HEIGHT))
+        total_frames = int(cap.get(cv2.CAP_PROP_FRAME_COUNT))
+        frame = np.empty((frame_height, frame_width, 3), dtype=np.uint8)
+        buffers = _BlockBuffers(VideoStego._grid(frame_width, frame_height))
+        timer = metrics.StageTimer()
+        try:
+            frame_count = 0
+            while True:
+                with timer('read'):
+                    ret = cap.grab()
+                if not ret:
+                    return
+                frame_count += 1
+                VideoStego._report_frame(frame_count, total_frames, cap)
+                if frame_count % KEYFRAME_INTERVAL != 0:
+                    continue
+                with timer('read'):
+                    ret, frame = cap.retrieve(image=frame)
+                if not ret:
+                    return
+                with timer('extract'):
+                    # The buffers are reused, and the caller keeps every keyframe's diffs
+                    diffs = buffers.diffs(frame).copy()
+                yield diffs
+        finally:
+            timer.flush()
+
+    @staticmethod
+    @metrics.operation('video', 'decode')
+    def decode_to_file(video_path, output_path, key=None, passphrase=None, yuv=False):
+        """Write the payload hidden in a video to a file and return its size in bytes.
+        
+        Video payloads are capped at MAX_MESSAGE_BYTES, so the message is read in
+        one go; the file only appears once it has been verified. Raises
+        ValueError (or a cryptography exception) if it cannot be read. `yuv`
+        reads the frames as in decode_video.
+        """
+        if yuv:
+            data = VideoStego._decode_yuv(video_path, key, passphrase)
+        else:
+            with metrics.stage('load'):
+                cap = cv2.VideoCapture(video_path)
+            if not cap.isOpened():
+                raise ValueError(f"Could not open video file {video_path}")
+            try:
+                if VideoStego._is_lossless(cap):
+                    data = VideoStego._decode_lossless(cap, key, passphrase)
+                else:
+                    data = VideoStego._decode_diffs(VideoStego._capture_diffs(cap), key, passphrase)
+            finally:
+                cap.release()
+        data = VideoStego._join_audio_shard(video_path, data, key, passphrase)
+        with atomic_output(output_path) as out:
+            return out.write(data)
+
+    @staticmethod
+    def read_frames(cap):
+        """Yield the frames of an open VideoCapture, e.g. to pass to decode_frames.
+
+        Every frame is read into the same buffer, so a frame is only valid
+        until the next one is read.
+        """
+        frame = None
+        while True:
+            ret, frame = cap.read(image=frame)
+            if not ret:
+                return
+            yield frame
+
+    @staticmethod
+    def _properties(video_path):
+        """Width, height, frame rate and frame count of a video, from its container metadata."""
+        cap = cv2.VideoCapture(video_path)
+        if not cap.isOpened():
+            raise ValueError(f"Could not open video file {video_path}")
+        try:
+            return (int(cap.get(cv2.CAP_PROP_FRAME_WIDTH)), int(cap.get(cv2.CAP_PROP_FRAME_HEIGHT)),
+                    cap.get(cv2.CAP_PROP_FPS), int(cap.get(cv2.CAP_PROP_FRAME_COUNT)))
+        finally:
+            cap.release()
+
+    @staticmethod
+    def _message_bytes(secret_data):
+        """The bytes embedded for a message: str as latin-1 where possible (UTF-8 otherwise)."""
+        if isinstance(secret_data, str):
+            try:
+                return secret_data.encode('latin-1')
+            except UnicodeEncodeError:
+                return secret_data.encode()
+        return bytes(secret_data)
+
+    @staticmethod
+    def _message_bits(data):
+        """Bit array for `data`: 16-bit length header, data bits, termination marker."""
+        marker = np.frombuffer(TERMINATION_MARKER.encode('ascii'), dtype=np.uint8) - ord('0')
+        body = np.concatenate([np.unpackbits(np.frombuffer(data, dtype=np.uint8)), marker])
+        if len(body) >= 1 << HEADER_BITS:
+            raise ValueError(f"Payload too large for the {HEADER_BITS}-bit length header")
+        header = np.unpackbits(np.frombuffer(len(body).to_bytes(2, 'big'), dtype=np.uint8))
+        return np.concatenate([header, body])
+
+    @staticmethod
+    def _grid(frame_width, frame_height):
+        """Position and size of the block grid: (start_x, start_y, grid_width, grid_height)."""
+        grid_width = (frame_width // 3) // BLOCK_SIZE
+        grid_height = (frame_height // 3) // BLOCK_SIZE
+        start_x = (frame_width - (grid_width * BLOCK_SIZE)) // 2
+        start_y = (frame_height - (grid_height * BLOCK_SIZE)) // 2
+        return start_x, start_y, grid_width, grid_height
+
+    @staticmethod
+    def _embed_chroma(u, v, bits, grid):
+        """Shift Cr/Cb in the grid blocks of yuv420p chroma planes in place; return the number of bits used.
+
+        Chroma planes have half the resolution, so a 16x16 block is 8x8 there.
+        """
+        start_x, start_y, grid_width, grid_height = grid
+        count = min(len(bits), grid_width * grid_height)
+        pattern = np.zeros(grid_width * grid_height, dtype=np.int16)
+        pattern[:count] = bits[:count].astype(np.int16) * 2 - 1
+        half = BLOCK_SIZE // 2
+        x, y = start_x // 2, start_y // 2
+        shift = np.kron(pattern.reshape(grid_height, grid_width), np.ones((half, half), dtype=np.int16))
+        for plane, step in ((v, CR_SHIFT), (u, -CB_SHIFT)):
+            region = plane[y:y + grid_height * half, x:x + grid_width * half]
+            region[:] = np.clip(region.astype(np.int16) + shift * step, 0, 255)
+        return count
+
+    @staticmethod
+    def _chroma_diffs(u, v, grid):
+        """Median red minus blue of every grid block, from the chroma planes (luma cancels out)."""
+        start_x, start_y, grid_width, grid_height = grid
+        half = BLOCK_SIZE // 2
+        x, y = start_x // 2, start_y // 2
+        cb = u[y:y + grid_height * half, x:x + grid_width * half].astype(np.float32) - 128
+        cr = v[y:y + grid_height * half, x:x + grid_width * half].astype(np.float32) - 128
+        # R - B per chroma sample (BT.601, limited range)
+        diff = 1.596 * cr - 2.018 * cb
+        blocks = diff.reshape(grid_height, half, grid_width, half).transpose(0, 2, 1, 3)
+        return np.median(blocks.reshape(grid_height * grid_width, half * half), axis=1)
@@ -0,0 +1,147 @@
+# stego_tool/yuv.py
+import os
+import subprocess
+
+import numpy as np
+
+# Raw YUV 4:2:0 video through ffmpeg pipes.
+#
+# ffmpeg decodes the cover straight to planar yuv420p on a pipe, and a
+# second ffmpeg encodes the frames written to its stdin, copying the audio
+# track of the cover in the same pass. No frame is ever converted to BGR:
+# the block-shift scheme only touches the Cb and Cr planes, which hold a
+# quarter of the luma resolution each. Frames are read into one buffer that
+# is reused for every frame.
+
+FFMPEG = 'ffmpeg'
+
+# Video codec arguments per output extension; anything else is written as XVID like the OpenCV path
+CODECS = {
+    '.mp4': ['-c:v', 'libx264', '-crf', '18', '-pix_fmt', 'yuv420p'],
+    '.mov': ['-c:v', 'libx264', '-crf', '18', '-pix_fmt', 'yuv420p'],
+    '.mkv': ['-c:v', 'libx264', '-crf', '18', '-pix_fmt', 'yuv420p'],
+}
+DEFAULT_CODEC = ['-c:v', 'mpeg4', '-vtag', 'XVID', '-q:v', '2']
+
+
+def plane_shapes(width, height):
+    """Shapes of the Y, U (Cb) and V (Cr) planes of a yuv420p frame."""
+    chroma = ((height + 1) // 2, (width + 1) // 2)
+    return (height, width), chroma, chroma
+
+
+def frame_size(width, height):
+    return sum(rows * cols for rows, cols in plane_shapes(width, height))
+
+
+def _run(args, **kwargs):
+    try:
+        return subprocess.Popen([FFMPEG, '-v', 'error', '-nostdin'] + args, **kwargs)
+    except FileNotFoundError:
+        raise RuntimeError(f"The YUV video path needs ffmpeg ({FFMPEG}) on the PATH") from None
+
+
+class YuvReader:
+    """Iterate over the frames of a video as (Y, U, V) plane arrays decoded by ffmpeg.
+
+    Every frame is read into the same buffer (`buffer`), and the planes are
+    views of it, so a frame is only valid until the next one is read.
+    """
+
+    def __init__(self, path, width, height):
+        self.process = _run(['-i', path, '-map', '0:v:0', '-f', 'rawvideo', '-pix_fmt', 'yuv420p', '-'],
+                            stdout=subprocess.PIPE, stderr=subprocess.PIPE)
+        self.buffer = bytearray(frame_size(width, height))
+        flat = np.frombuffer(self.buffer, dtype=np.uint8)
+        planes, start = [], 0
+        for shape in plane_shapes(width, height):
+            planes.append(flat[start:start + shape[0] * shape[1]].reshape(shape))
+            start += shape[0] * shape[1]
+        self.planes = tuple(planes)
+
+    def __iter__(self):
+        view = memoryview(self.buffer)
+        while True:
+            filled = 0
+            while filled < len(view):
+                count = self.process.stdout.readinto(view[filled:])
+                if not count:
+                    # End of the video (a partial last frame is dropped)
+                    if self.process.wait():
+                        error = self.process.stderr.read().decode(errors='replace').strip()
+                        raise RuntimeError(f"ffmpeg could not decode the video: {error}")
+                    return
+                filled += count
+            yield self.planes
+
+    def release(self):
+        self.process.stdout.close()
+        if self.process.poll() is None:
+            self.process.kill()
+        self.process.wait()
+        self.process.stderr.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.release()
+        return False
+
+
+class YuvWriter:
+    """Encode yuv420p frames written to ffmpeg's stdin into a video file.
+
+    Args:
+        output_path: Output file; its extension picks the codec (see CODECS)
+        width, height, fps: Frame geometry and rate
+        audio_from: Copy the audio track of this file, if it has one
+    """
+
+    def __init__(self, output_path, width, height, fps, audio_from=None):
+        args = ['-y', '-f', 'rawvideo', '-pix_fmt', 'yuv420p', '-s', f'{width}x{height}',
+                '-r', str(fps), '-i', '-']
+        if audio_from:
+            args += ['-i', audio_from, '-map', '0:v:0', '-map', '1:a:0?', '-c:a', 'copy']
+        args += CODECS.get(os.path.splitext(output_path)[1].lower(), DEFAULT_CODEC)
+        self.output_path = output_path
+        self.process = _run(args + [output_path], stdin=subprocess.PIPE, stderr=subprocess.PIPE)
+
+    def write(self, frame):
+        try:
+            self.process.stdin.write(frame)
+        except BrokenPipeError:
+            # ffmpeg gave up; report why
+            self.process.wait()
+            error = self.process.stderr.read().decode(errors='replace').strip()
+            raise RuntimeError(f"ffmpeg could not write {self.output_path}: {error}") from None
+
+    def release(self):
+        """Stop the encoder without finishing the file (e.g. when cancelled)."""
+        if self.process.poll() is None:
+            self.process.kill()
+        self.process.wait()
+        for pipe in (self.process.stdin, self.process.stderr):
+            try:
+                pipe.close()
+            except OSError:
+                pass  # unflushed frames for a dead process
+        if os.path.exists(self.output_path):
+            os.remove(self.output_path)
+
+    def close(self):
+        """Finish the file; raises RuntimeError if ffmpeg failed."""
+        self.process.stdin.close()
+        error = self.process.stderr.read().decode(errors='replace').strip()
+        if self.process.wait():
+            raise RuntimeError(f"ffmpeg could not write {self.output_path}: {error}")
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, *exc):
+        if exc_type is None:
+            self.close()
+        else:
+            self.release()
+        return False